@@ -0,0 +1,58 @@
+# benchmarks/bench_association.py
+"""
+Per-frame association time versus crowd size.
+
+Compares the dense IoU + single assignment solve with the spatially gated,
+per-component solve used by ObjectTracker for large crowds.
+
+    python benchmarks/bench_association.py --sizes 25 50 100 200 400
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+from src.tracker import associate_detections_to_trackers
+
+def make_crowd(n, rng, width=1920, height=1080, box=(40, 100), jitter=4.0):
+    """Predicted track boxes for n people and slightly perturbed detections of them."""
+    x = rng.uniform(0, width - box[0], n)
+    y = rng.uniform(0, height - box[1], n)
+    trks = np.stack([x, y, x + box[0], y + box[1]], axis=1)
+    dets = trks + rng.normal(0, jitter, trks.shape)
+    return dets[rng.permutation(n)], trks
+
+def time_association(dets, trks, gate_min_size, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        associate_detections_to_trackers(dets, trks, 0.3, gate_min_size)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000.0
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    print(f"{'people':>8} {'dense ms':>10} {'gated ms':>10} {'speedup':>8}")
+    for n in args.sizes:
+        dets, trks = make_crowd(n, rng)
+        dense = time_association(dets, trks, gate_min_size=n + 1, repeats=args.repeats)
+        gated = time_association(dets, trks, gate_min_size=1, repeats=args.repeats)
+        print(f"{n:>8} {dense:>10.3f} {gated:>10.3f} {dense / gated:>7.1f}x")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Association benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 25, 50, 100, 150, 200, 400, 800],
+                      help='Crowd sizes to benchmark')
+    parser.add_argument('--repeats', type=int, default=5,
+                      help='Timed repeats per size; the fastest is reported (default: 5)')
+    parser.add_argument('--seed', type=int, default=0,
+                      help='Random seed (default: 0)')
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,91 @@
+# benchmarks/bench_backends.py
+"""
+Per-frame latency, FPS and counts of each inference backend on one video.
+
+Every backend runs the same counts-only pipeline; the first one listed is the
+reference the others' counts are compared to. Latency is the detector's time
+per frame at --batch-size, measured separately on the first --frames frames.
+Exports are made on first use and cached in models/.
+
+    python benchmarks/bench_backends.py --input input/test_video.mp4 --backends ultralytics onnx onnx-int8 openvino
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+from src.detector import PersonDetector
+from src.tracker import ObjectTracker
+from src.counter import PersonCounter
+from src.pipeline import build_video_pipeline
+
+def latency(detector, path, frames, batch_size):
+    """Median and 95th percentile milliseconds per frame of detect_batch on the first frames."""
+    cap = cv2.VideoCapture(path)
+    images = []
+    while len(images) < frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        images.append(frame)
+    cap.release()
+
+    detector.detect_batch(images[:batch_size])  # warm-up
+    times = []
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        t = time.perf_counter()
+        detector.detect_batch(batch)
+        times.append((time.perf_counter() - t) * 1000 / len(batch))
+    return np.median(times), np.percentile(times, 95)
+
+def run(detector, path, line):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"Error: Couldn't open video source {path}")
+    line_y = line if line else int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) * 0.5)
+
+    counter = PersonCounter(line_y)
+    pipeline = build_video_pipeline(cap, detector, ObjectTracker(), counter, line_y, annotate=False)
+    pipeline.run()
+    cap.release()
+    return counter, pipeline.stats()
+
+def main(args):
+    baseline = None
+    print(f"{'backend':>16} {'ms p50':>7} {'ms p95':>7} {'in':>5} {'out':>5} {'err':>5} {'fps':>8} {'speedup':>8}")
+    for name in args.backends:
+        backend, int8 = name.removesuffix('-int8'), name.endswith('-int8')
+        detector = PersonDetector(model_path=args.model, backend=backend, int8=int8, batch_size=args.batch_size)
+        p50, p95 = latency(detector, args.input, args.frames, args.batch_size)
+        counter, stats = run(detector, args.input, args.line)
+        if baseline is None:
+            baseline = (counter.count_in, counter.count_out, stats['fps'])
+        error = abs(counter.count_in - baseline[0]) + abs(counter.count_out - baseline[1])
+        print(f"{name:>16} {p50:>7.1f} {p95:>7.1f} {counter.count_in:>5} {counter.count_out:>5} {error:>5} "
+              f"{stats['fps']:>8.1f} {stats['fps'] / baseline[2]:>7.2f}x")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Inference backend benchmark')
+    parser.add_argument('--input', type=str, required=True,
+                      help='Path to the reference video')
+    parser.add_argument('--model', type=str, default='yolov8n.pt',
+                      help='Path to YOLOv8 model file (default: yolov8n.pt)')
+    parser.add_argument('--line', type=int,
+                      help='Y-coordinate of counting line (default: middle of frame)')
+    parser.add_argument('--backends', type=str, nargs='+', default=['ultralytics', 'onnx', 'openvino'],
+                      help='Backends to compare, optionally with an -int8 suffix (default: ultralytics onnx openvino)')
+    parser.add_argument('--batch-size', type=int, default=8,
+                      help='Frames per inference call (default: 8)')
+    parser.add_argument('--frames', type=int, default=200,
+                      help='Frames timed for the latency columns (default: 200)')
+
+    args = parser.parse_args()
+    main(args)
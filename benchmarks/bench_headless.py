@@ -0,0 +1,80 @@
+# benchmarks/bench_headless.py
+"""
+FPS of the full annotated path versus counts-only processing.
+
+The annotated runs draw overlays and encode an XVID file to a temporary
+directory, once with cv2.VideoWriter on the pipeline's annotate thread and
+once with the background VideoEncoder. The counts-only run does neither and
+frees frames after detection. FPS include flushing the encoder.
+
+    python benchmarks/bench_headless.py --input input/test_video.mp4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+from src.detector import PersonDetector
+from src.tracker import ObjectTracker
+from src.counter import PersonCounter
+from src.pipeline import build_video_pipeline
+from src.encoder import VideoEncoder
+
+def run(detector, path, mode, output_dir):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"Error: Couldn't open video source {path}")
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    line_y = int(height * 0.5)
+
+    out = None
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    if mode == 'sync encode':
+        out = cv2.VideoWriter(os.path.join(output_dir, 'sync.avi'), cv2.VideoWriter_fourcc(*'XVID'),
+                              fps, (width, height))
+    elif mode == 'async encode':
+        out = VideoEncoder(os.path.join(output_dir, 'async.avi'), fps, (width, height))
+
+    counter = PersonCounter(line_y)
+    pipeline = build_video_pipeline(cap, detector, ObjectTracker(), counter, line_y,
+                                    writer=out, annotate=out is not None, keep_annotated=False)
+    start = time.perf_counter()
+    pipeline.run()
+    cap.release()
+    if out is not None:
+        out.release()
+    elapsed = time.perf_counter() - start
+    stats = pipeline.stats()
+    stats['fps'] = stats['frames'] / elapsed
+    return counter, stats
+
+def main(args):
+    detector = PersonDetector(model_path=args.model)
+    with tempfile.TemporaryDirectory() as output_dir:
+        results = {mode: run(detector, args.input, mode, output_dir)
+                   for mode in ('sync encode', 'async encode', 'counts-only')}
+
+    print(f"{'mode':>12} {'in':>5} {'out':>5} {'frames':>7} {'fps':>8}")
+    for name, (counter, stats) in results.items():
+        print(f"{name:>12} {counter.count_in:>5} {counter.count_out:>5} {stats['frames']:>7} {stats['fps']:>8.1f}")
+    sync_fps = results['sync encode'][1]['fps']
+    print(f"async encode speedup: {results['async encode'][1]['fps'] / sync_fps:.2f}x, "
+          f"counts-only speedup: {results['counts-only'][1]['fps'] / sync_fps:.2f}x")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Annotated vs counts-only benchmark')
+    parser.add_argument('--input', type=str, required=True,
+                      help='Path to the reference video')
+    parser.add_argument('--model', type=str, default='yolov8n.pt',
+                      help='Path to YOLOv8 model file (default: yolov8n.pt)')
+
+    args = parser.parse_args()
+    main(args)
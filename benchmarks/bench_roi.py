@@ -0,0 +1,66 @@
+# benchmarks/bench_roi.py
+"""
+Counts and FPS of full-frame detection versus detection on regions of interest.
+
+Both runs count only (no drawing or encoding); the ROI run crops each frame to
+the band around the counting line before detection.
+
+    python benchmarks/bench_roi.py --input input/test_video.mp4 --margins 60 100 160
+"""
+import argparse
+import os
+import sys
+
+import cv2
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+from src.detector import PersonDetector
+from src.tracker import ObjectTracker
+from src.counter import PersonCounter
+from src.roi import RegionDetector
+from src.pipeline import build_video_pipeline
+
+def run(detector, path, line, margin):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"Error: Couldn't open video source {path}")
+    line_y = line if line else int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) * 0.5)
+
+    counter = PersonCounter(line_y)
+    if margin is not None:
+        detector = RegionDetector(detector, counter, margin=margin)
+    pipeline = build_video_pipeline(cap, detector, ObjectTracker(), counter, line_y, annotate=False)
+    pipeline.run()
+    cap.release()
+    pixels = detector.pixel_fraction() if margin is not None else 1.0
+    return counter, pipeline.stats(), pixels
+
+def main(args):
+    detector = PersonDetector(model_path=args.model)
+    baseline = None
+    print(f"{'mode':>12} {'in':>5} {'out':>5} {'err':>5} {'pixels':>7} {'fps':>8} {'speedup':>8}")
+    for margin in [None] + args.margins:
+        counter, stats, pixels = run(detector, args.input, args.line, margin)
+        if baseline is None:
+            baseline = (counter.count_in, counter.count_out, stats['fps'])
+        error = abs(counter.count_in - baseline[0]) + abs(counter.count_out - baseline[1])
+        mode = 'full frame' if margin is None else f"roi {margin}px"
+        print(f"{mode:>12} {counter.count_in:>5} {counter.count_out:>5} {error:>5} {pixels:>7.0%} "
+              f"{stats['fps']:>8.1f} {stats['fps'] / baseline[2]:>7.2f}x")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Full-frame vs ROI detection benchmark')
+    parser.add_argument('--input', type=str, required=True,
+                      help='Path to the reference video')
+    parser.add_argument('--model', type=str, default='yolov8n.pt',
+                      help='Path to YOLOv8 model file (default: yolov8n.pt)')
+    parser.add_argument('--line', type=int,
+                      help='Y-coordinate of counting line (default: middle of frame)')
+    parser.add_argument('--margins', type=int, nargs='+', default=[60, 100, 160],
+                      help='ROI margins in pixels to compare (default: 60 100 160)')
+
+    args = parser.parse_args()
+    main(args)
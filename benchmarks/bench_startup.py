@@ -0,0 +1,98 @@
+# benchmarks/bench_startup.py
+"""
+Time to first frame of a counting job, from a cold process to a warm fork server.
+
+Measured on the same video, counts-only, --jobs times each:
+
+- import: seconds to import src.api and src.main in a fresh interpreter
+- cold: a new main.py process per job, which imports everything, loads the
+  model and runs its first inference before the first frame is counted
+- pool: JobPool's long-lived workers, warmed up once when the pool starts
+- fork server: JobPool(fork_server=True), forking a process per job from a
+  server that loaded and warmed up the model once
+
+    python benchmarks/bench_startup.py --input input/test_video.mp4 --jobs 5
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+from src.jobs import JobPool
+
+def subprocess_env():
+    """The environment with the project root on PYTHONPATH, for child interpreters run elsewhere."""
+    paths = [project_root] + [p for p in os.environ.get('PYTHONPATH', '').split(os.pathsep) if p]
+    return {**os.environ, 'PYTHONPATH': os.pathsep.join(paths)}
+
+def import_seconds(module, workdir):
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, '-c', code], cwd=workdir, env=subprocess_env(),
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+def cold_jobs(args, workdir):
+    """main.py's reported time to first frame, one new process per job."""
+    times = []
+    for i in range(args.jobs):
+        result = subprocess.run([sys.executable, os.path.join(project_root, 'src', 'main.py'),
+                                 '--input', os.path.abspath(args.input), '--model', args.model, '--counts-only',
+                                 '--events', os.path.join(workdir, f'cold{i}.json')],
+                                cwd=workdir, env=subprocess_env(), capture_output=True, text=True, check=True)
+        match = re.search(r"Time to first frame: ([0-9.]+)s", result.stdout)
+        times.append(float(match.group(1)))
+    return times
+
+def pool_jobs(args, workdir, fork_server):
+    """time_to_first_frame of jobs submitted one after another to a started JobPool."""
+    pool = JobPool(num_workers=1, model_path=args.model, output_folder=workdir, fork_server=fork_server)
+    pool.start()
+    times = []
+    try:
+        for i in range(args.jobs):
+            job_id = f"{'fork' if fork_server else 'pool'}{i}"
+            pool.submit(job_id, os.path.abspath(args.input), counts_only=True)
+            while pool.status(job_id)['status'] not in ('completed', 'failed'):
+                time.sleep(0.01)
+            status = pool.status(job_id)
+            if status['status'] == 'failed':
+                raise SystemExit(f"Error: {job_id} failed: {status['error']}")
+            times.append(status['time_to_first_frame'])
+    finally:
+        pool.shutdown()
+    return times
+
+def main(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        for module in ('src.api', 'src.main'):
+            print(f"import {module:<10} {import_seconds(module, workdir) * 1000:>8.0f} ms")
+
+        results = {'cold': cold_jobs(args, workdir),
+                   'pool': pool_jobs(args, workdir, fork_server=False),
+                   'fork server': pool_jobs(args, workdir, fork_server=True)}
+
+    print(f"\n{'time to first frame':<20} {'median ms':>10} {'max ms':>10}")
+    for mode, times in results.items():
+        print(f"{mode:<20} {np.median(times) * 1000:>10.1f} {max(times) * 1000:>10.1f}")
+    print(f"\nFork server vs cold start: {np.median(results['cold']) / np.median(results['fork server']):.0f}x faster")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Startup and time-to-first-frame benchmark')
+    parser.add_argument('--input', type=str, required=True,
+                      help='Path to the video each job counts')
+    parser.add_argument('--model', type=str, default='yolov8n.pt',
+                      help='Path to YOLOv8 model file (default: yolov8n.pt)')
+    parser.add_argument('--jobs', type=int, default=5,
+                      help='Jobs timed per mode (default: 5)')
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,78 @@
+# benchmarks/bench_stride.py
+"""
+Accuracy/throughput of detection strides on a reference clip.
+
+Runs decode -> detect -> track/count (no drawing or encoding) once per stride
+and compares counts against running the detector on every frame.
+
+    python benchmarks/bench_stride.py --input input/test_video.mp4 --strides 1 2 3 5 --adaptive
+"""
+import argparse
+import os
+import sys
+
+import cv2
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+from src.detector import PersonDetector
+from src.tracker import ObjectTracker
+from src.counter import PersonCounter
+from src.scheduler import DetectionScheduler, forget_after
+from src.pipeline import Pipeline, read_frames, detect_stage, track_stage
+
+def run(detector, path, line, every, adaptive, resize):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"Error: Couldn't open video source {path}")
+    height = 480 if resize else int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    line_y = line if line else int(height * 0.5)
+
+    tracker = ObjectTracker()
+    counter = PersonCounter(line_y, forget_after=forget_after(every))
+    scheduler = DetectionScheduler(every, adaptive=adaptive, line_y=line_y)
+    pipeline = Pipeline(read_frames(cap, (640, 480) if resize else None), [
+        detect_stage(detector, scheduler),
+        track_stage(tracker, counter, detector, scheduler),
+    ])
+    pipeline.run()
+    cap.release()
+    return counter, scheduler, pipeline.stats()
+
+def main(args):
+    detector = PersonDetector(model_path=args.model)
+    modes = [(n, False) for n in args.strides]
+    if args.adaptive:
+        modes += [(n, True) for n in args.strides if n > 1]
+
+    baseline = None
+    print(f"{'mode':>12} {'in':>5} {'out':>5} {'err':>5} {'detected':>9} {'fps':>8} {'speedup':>8}")
+    for every, adaptive in modes:
+        counter, scheduler, stats = run(detector, args.input, args.line, every, adaptive, args.resize)
+        if baseline is None:
+            baseline = (counter.count_in, counter.count_out, stats['fps'])
+        error = abs(counter.count_in - baseline[0]) + abs(counter.count_out - baseline[1])
+        mode = f"{'adaptive' if adaptive else 'every'} {every}"
+        print(f"{mode:>12} {counter.count_in:>5} {counter.count_out:>5} {error:>5} "
+              f"{scheduler.stats()['detect_ratio']:>9.1%} {stats['fps']:>8.1f} "
+              f"{stats['fps'] / baseline[2]:>7.2f}x")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Detection stride benchmark')
+    parser.add_argument('--input', type=str, required=True,
+                      help='Path to the reference video')
+    parser.add_argument('--model', type=str, default='yolov8n.pt',
+                      help='Path to YOLOv8 model file (default: yolov8n.pt)')
+    parser.add_argument('--line', type=int,
+                      help='Y-coordinate of counting line (default: middle of frame)')
+    parser.add_argument('--resize', action='store_true',
+                      help='Resize frames to 640x480')
+    parser.add_argument('--strides', type=int, nargs='+', default=[1, 2, 3, 5],
+                      help='Strides to compare; the first is the accuracy baseline (default: 1 2 3 5)')
+    parser.add_argument('--adaptive', action='store_true',
+                      help='Also run adaptive mode with each stride as its maximum')
+
+    args = parser.parse_args()
+    main(args)
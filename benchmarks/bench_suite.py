@@ -0,0 +1,239 @@
+# benchmarks/bench_suite.py
+"""
+Reproducible per-component benchmarks on a synthetic scene, written as JSON.
+
+Runs without a model or a camera: a SyntheticScene provides frames and exact
+counts and a StubDetector stands in for YOLO (see synthetic.py). Measured:
+
+- tracker: ObjectTracker.update per frame on the scene's detections
+- association: associate_detections_to_trackers per frame at several crowd sizes
+- counting: PersonCounter.update_counts per frame (line, segment and zone)
+- overlay: Visualizer.draw_overlays per frame at the scene resolution
+- end_to_end: the video pipeline on a rendered file, counts-only and annotated
+
+Counts are compared with the ground truth. Results go to --output with the
+commit they were measured on; --baseline compares them with an earlier file
+and exits with status 1 if a median time or frame rate got worse by more
+than --tolerance:
+
+    python benchmarks/bench_suite.py --output output/bench.json
+    python benchmarks/bench_suite.py --output output/bench_new.json --baseline output/bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+from src.tracker import ObjectTracker, associate_detections_to_trackers
+from src.counter import PersonCounter
+from src.visualization import Visualizer
+from src.pipeline import build_video_pipeline
+from src.encoder import VideoEncoder
+from bench_association import make_crowd
+from synthetic import SyntheticScene, StubDetector
+
+def timings(samples):
+    """Mean, median and 95th percentile of per-call seconds, in milliseconds."""
+    ms = np.asarray(samples) * 1000.0
+    return {'mean_ms': round(float(ms.mean()), 4), 'p50_ms': round(float(np.median(ms)), 4),
+            'p95_ms': round(float(np.percentile(ms, 95)), 4)}
+
+def bench_tracker(scene, detector):
+    detections = [detector.detections(index) for index in range(scene.frames)]
+    tracker, counter, samples, tracks = ObjectTracker(), PersonCounter(scene.line_y), [], []
+    for dets in detections:
+        start = time.perf_counter()
+        frame_tracks = tracker.update(dets)
+        samples.append(time.perf_counter() - start)
+        counter.update_counts(frame_tracks)
+        tracks.append(frame_tracks)
+    truth = scene.ground_truth()
+    return {**timings(samples), 'count_in': counter.count_in, 'count_out': counter.count_out,
+            'count_error': abs(counter.count_in - truth[0]) + abs(counter.count_out - truth[1])}, tracks
+
+def bench_association(sizes, repeats, seed):
+    rng = np.random.default_rng(seed)
+    results = {}
+    for n in sizes:
+        dets, trks = make_crowd(n, rng)
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            associate_detections_to_trackers(dets, trks)
+            samples.append(time.perf_counter() - start)
+        results[str(n)] = timings(samples)
+    return results
+
+def bench_counting(scene, tracks):
+    w, h, y = scene.width, scene.height, scene.line_y
+    zone = [(w // 4, h // 4), (3 * w // 4, h // 4), (3 * w // 4, 3 * h // 4), (w // 4, 3 * h // 4)]
+    counter = PersonCounter(y, lines=[((0, y - h // 8), (w, y + h // 8))], zones=[zone])
+    samples = []
+    for frame_tracks in tracks:
+        start = time.perf_counter()
+        counter.update_counts(frame_tracks)
+        samples.append(time.perf_counter() - start)
+    return timings(samples)
+
+def bench_overlay(scene, tracks, frames):
+    visualizer = Visualizer((scene.height, scene.width, 3))
+    out = np.empty((scene.height, scene.width, 3), dtype=np.uint8)
+    samples = []
+    for index in range(min(frames, scene.frames)):
+        frame = scene.render(index)
+        start = time.perf_counter()
+        visualizer.draw_overlays(frame, tracks[index], scene.line_y, 0, 0, out=out)
+        samples.append(time.perf_counter() - start)
+    return timings(samples)
+
+def bench_end_to_end(scene, detector, video_path, output_dir):
+    truth = scene.ground_truth()
+    results = {}
+    for mode in ('counts_only', 'annotated'):
+        cap = cv2.VideoCapture(video_path)
+        counter = PersonCounter(scene.line_y)
+        writer = None
+        if mode == 'annotated':
+            writer = VideoEncoder(os.path.join(output_dir, 'annotated.avi'), scene.fps, (scene.width, scene.height))
+        pipeline = build_video_pipeline(cap, detector, ObjectTracker(), counter, scene.line_y, writer=writer,
+                                        annotate=writer is not None, keep_annotated=False)
+        start = time.perf_counter()
+        pipeline.run()
+        if writer is not None:
+            writer.release()
+        elapsed = time.perf_counter() - start
+        cap.release()
+        frames = pipeline.stats()['frames']
+        results[mode] = {'fps': round(frames / elapsed, 2), 'frames': frames,
+                         'count_in': counter.count_in, 'count_out': counter.count_out,
+                         'count_error': abs(counter.count_in - truth[0]) + abs(counter.count_out - truth[1])}
+    return results
+
+def flatten(results, prefix=''):
+    """{'a': {'b': 1}} -> {'a.b': 1}"""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+def compare(results, baseline, tolerance):
+    """Print timings next to the baseline's; returns the metrics that regressed beyond tolerance."""
+    current, previous = flatten(results), flatten(baseline)
+    regressions = []
+    print(f"\n{'metric':>42} {'baseline':>10} {'now':>10} {'slowdown':>9}")
+    for name, value in current.items():
+        old = previous.get(name)
+        # Medians and frame rates only; means and tails are too noisy to gate on
+        if old is None or not name.endswith(('p50_ms', 'fps')) or not old:
+            continue
+        # Times regress upwards, frame rates downwards
+        change = value / old - 1 if name.endswith('_ms') else old / value - 1
+        flag = ''
+        if change > tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:>42} {old:>10.4g} {value:>10.4g} {change:>+8.1%}{flag}")
+    return regressions
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=project_root, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(args):
+    scene = SyntheticScene(args.walkers, args.crossing_rate, args.width, args.height, args.frames, seed=args.seed)
+    detector = StubDetector(scene, jitter=args.jitter, miss_rate=args.miss_rate, seed=args.seed)
+    truth = scene.ground_truth()
+    print(f"Scene: {args.walkers} walkers, {args.width}x{args.height}, {args.frames} frames, "
+          f"ground truth in {truth[0]} out {truth[1]}")
+
+    results = {}
+    results['tracker'], tracks = bench_tracker(scene, detector)
+    results['association'] = bench_association(args.crowd_sizes, args.repeats, args.seed)
+    results['counting'] = bench_counting(scene, tracks)
+    results['overlay'] = bench_overlay(scene, tracks, args.overlay_frames)
+    with tempfile.TemporaryDirectory() as output_dir:
+        video_path = os.path.join(output_dir, 'synthetic.avi')
+        scene.write_video(video_path)
+        results['end_to_end'] = bench_end_to_end(scene, detector, video_path, output_dir)
+
+    for name, value in flatten(results).items():
+        print(f"{name:>42} {value}")
+
+    report = {
+        'commit': commit(),
+        'created': datetime.now().isoformat(),
+        'platform': {'python': platform.python_version(), 'machine': platform.machine(),
+                     'processor': platform.processor(), 'cpus': os.cpu_count(),
+                     'numpy': np.__version__, 'opencv': cv2.__version__},
+        'scene': {**scene.params(), 'ground_truth': {'in': truth[0], 'out': truth[1]},
+                  'jitter': args.jitter, 'miss_rate': args.miss_rate},
+        'results': results,
+    }
+    output_dir = os.path.dirname(args.output)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('scene') != report['scene']:
+            print("Warning: the baseline was measured on a different scene")
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} metrics regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Synthetic per-component benchmark suite')
+    parser.add_argument('--walkers', type=int, default=40,
+                      help='People on screen at a time (default: 40)')
+    parser.add_argument('--crossing-rate', type=float, default=0.5,
+                      help='Share of walkers that cross the counting line (default: 0.5)')
+    parser.add_argument('--width', type=int, default=1280,
+                      help='Frame width (default: 1280)')
+    parser.add_argument('--height', type=int, default=720,
+                      help='Frame height (default: 720)')
+    parser.add_argument('--frames', type=int, default=600,
+                      help='Number of frames (default: 600)')
+    parser.add_argument('--jitter', type=float, default=2.0,
+                      help='Stub detector box jitter in pixels (default: 2.0)')
+    parser.add_argument('--miss-rate', type=float, default=0.0,
+                      help='Share of people the stub detector misses per frame (default: 0.0)')
+    parser.add_argument('--crowd-sizes', type=int, nargs='+', default=[50, 200, 800],
+                      help='Crowd sizes for the association benchmark (default: 50 200 800)')
+    parser.add_argument('--repeats', type=int, default=20,
+                      help='Timed repeats per association crowd size (default: 20)')
+    parser.add_argument('--overlay-frames', type=int, default=200,
+                      help='Frames drawn for the overlay benchmark (default: 200)')
+    parser.add_argument('--seed', type=int, default=0,
+                      help='Random seed (default: 0)')
+    parser.add_argument('--output', type=str, default='output/bench.json',
+                      help='JSON results path (default: output/bench.json)')
+    parser.add_argument('--baseline', type=str,
+                      help='Earlier results JSON to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                      help='Slowdown beyond which a metric counts as a regression (default: 0.2)')
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,202 @@
+# benchmarks/synthetic.py
+"""
+Synthetic crowd scenes with known counts, and a detector that reads them back.
+
+SyntheticScene places walkers on a plain background: a crossing_rate share
+of them walk vertically across the counting line, the rest wander
+horizontally on one side of it. Their boxes are known for every frame, so
+the ground-truth entries and exits at line_y are exact. render() draws a
+frame and stamps its index into the top-left corner as a row of black and
+white blocks, which StubDetector decodes to return that frame's true boxes
+(with seeded jitter, misses and false positives). Both are deterministic for
+a given seed, so runs are comparable across commits and YOLO is out of the
+loop:
+
+    python benchmarks/synthetic.py --output input/synthetic.avi --walkers 40 --frames 900
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+INDEX_BITS = 24
+INDEX_BLOCK = 8  # pixels per side of each index bit
+
+class SyntheticScene:
+    """
+    Walkers crossing (or not crossing) a horizontal counting line.
+
+    About walkers people are on screen at any time. Every walker is visible
+    for at least min_lead frames before it can reach the line, so a tracker
+    with the default min_hits has confirmed it by then.
+    """
+
+    def __init__(self, walkers=20, crossing_rate=0.5, width=1280, height=720, frames=600, fps=30.0,
+                 seed=0, line_y=None, min_lead=10):
+        self.walkers = walkers
+        self.crossing_rate = crossing_rate
+        self.width = width
+        self.height = height
+        self.frames = frames
+        self.fps = fps
+        self.seed = seed
+        self.line_y = line_y if line_y is not None else height // 2
+        self.box = (max(8, int(height * 0.055)), max(20, int(height * 0.14)))  # person width, height
+
+        rng = np.random.default_rng(seed)
+        box_w, box_h = self.box
+        speed = height / (4.0 * fps)  # a quarter of the frame height per second
+        lifetime = (height * 0.8) / speed
+        arrivals = rng.poisson(walkers / lifetime, frames)
+        arrivals[0] += walkers // 2  # start with a populated scene
+        starts = np.repeat(np.arange(frames), arrivals)
+        n = len(starts)
+
+        crossing = rng.random(n) < crossing_rate
+        down = rng.random(n) < 0.5
+        x0 = rng.uniform(0, width - box_w, n)
+        vx = rng.normal(0, speed * 0.1, n)
+        vy = rng.uniform(0.6, 1.4, n) * speed
+        lead = min_lead * vy + box_h / 2
+        y0 = np.where(down, rng.uniform(0, self.line_y - lead - box_h / 2, n),
+                      rng.uniform(self.line_y + lead, height - box_h / 2, n)) - box_h / 2
+        vy = np.where(down, vy, -vy)
+        # Non-crossing walkers stay on their side of the line, moving sideways
+        vx = np.where(crossing, vx, np.where(rng.random(n) < 0.5, 1, -1) * speed)
+        y0 = np.where(crossing, y0, np.where(down, rng.uniform(0, self.line_y - box_h * 1.5, n),
+                                             rng.uniform(self.line_y + box_h * 0.5, height - box_h, n)))
+        vy = np.where(crossing, vy, 0.0)
+
+        self.start = starts
+        self.stop = np.minimum(starts + (rng.uniform(0.7, 1.3, n) * lifetime).astype(int), frames)
+        self.origin = np.stack([x0, y0], axis=1)
+        self.velocity = np.stack([vx, vy], axis=1)
+        self.colors = rng.integers(90, 255, (n, 3))
+        self.background = np.full((height, width, 3), 40, dtype=np.uint8)
+        self.background += rng.integers(0, 12, (height, width, 1), dtype=np.uint8)
+
+    def boxes(self, index):
+        """(N, 4) [x1, y1, x2, y2] boxes of the walkers at least half inside frame index, and their IDs."""
+        alive = np.flatnonzero((self.start <= index) & (index < self.stop))
+        xy = self.origin[alive] + self.velocity[alive] * (index - self.start[alive])[:, None]
+        boxes = np.concatenate([xy, xy + self.box], axis=1)
+        cx, cy = (boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2
+        inside = (cx >= 0) & (cx < self.width) & (cy >= 0) & (cy < self.height)
+        return boxes[inside], alive[inside]
+
+    def ground_truth(self, line_y=None):
+        """(count_in, count_out) of true centroids crossing line_y, with PersonCounter's rules."""
+        line_y = self.line_y if line_y is None else line_y
+        last = {}
+        count_in = count_out = 0
+        for index in range(self.frames):
+            boxes, ids = self.boxes(index)
+            cy = ((boxes[:, 1] + boxes[:, 3]) / 2).astype(int)
+            for walker, y in zip(ids.tolist(), cy.tolist()):
+                prev = last.get(walker)
+                if prev is not None:
+                    count_in += prev < line_y <= y
+                    count_out += y < line_y <= prev
+                last[walker] = y
+        return count_in, count_out
+
+    def render(self, index):
+        """BGR frame index, with its index stamped in the top-left corner."""
+        frame = self.background.copy()
+        boxes, ids = self.boxes(index)
+        for (x1, y1, x2, y2), walker in zip(boxes.astype(int), ids):
+            cv2.rectangle(frame, (x1, y1), (x2, y2), self.colors[walker].tolist(), -1)
+        bits = (index >> np.arange(INDEX_BITS)) & 1
+        stamp = np.repeat(bits.astype(np.uint8) * 255, INDEX_BLOCK)
+        frame[:INDEX_BLOCK, :INDEX_BITS * INDEX_BLOCK] = stamp[None, :, None]
+        return frame
+
+    def write_video(self, path, codec='MJPG'):
+        """Render every frame into a video file at path."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), self.fps, (self.width, self.height))
+        for index in range(self.frames):
+            writer.write(self.render(index))
+        writer.release()
+
+    def params(self):
+        return {'walkers': self.walkers, 'crossing_rate': self.crossing_rate, 'width': self.width,
+                'height': self.height, 'frames': self.frames, 'fps': self.fps, 'seed': self.seed,
+                'line_y': self.line_y}
+
+def frame_index(frame):
+    """The index render() stamped into frame, read from the middle of each block."""
+    centres = frame[INDEX_BLOCK // 2, INDEX_BLOCK // 2:INDEX_BITS * INDEX_BLOCK:INDEX_BLOCK]
+    bits = centres.reshape(INDEX_BITS, -1).mean(axis=1) > 127
+    return int(np.sum(bits.astype(np.int64) << np.arange(INDEX_BITS)))
+
+class StubDetector:
+    """
+    Deterministic stand-in for PersonDetector on SyntheticScene frames.
+
+    Returns each frame's true boxes with Gaussian jitter of jitter pixels,
+    drops each with probability miss_rate and adds about false_positives
+    spurious boxes per frame. The noise is seeded by the frame index, so the
+    same frame always gives the same detections, whatever the call order.
+    latency seconds are slept per batch to stand in for model cost.
+    """
+
+    def __init__(self, scene, jitter=2.0, miss_rate=0.0, false_positives=0.0, conf=0.9, seed=0,
+                 latency=0.0, batch_size=8):
+        self.scene = scene
+        self.jitter = jitter
+        self.miss_rate = miss_rate
+        self.false_positives = false_positives
+        self.conf = conf
+        self.seed = seed
+        self.latency = latency
+        self.batch_size = batch_size
+
+    def detections(self, index):
+        """(N, 5) [x1, y1, x2, y2, confidence] detections of frame index."""
+        rng = np.random.default_rng((self.seed, index))
+        boxes, _ = self.scene.boxes(index)
+        boxes = boxes[rng.random(len(boxes)) >= self.miss_rate]
+        boxes = boxes + rng.normal(0, self.jitter, boxes.shape)
+        spurious = rng.poisson(self.false_positives)
+        if spurious:
+            xy = rng.uniform([0, 0], [self.scene.width, self.scene.height], (spurious, 2))
+            boxes = np.concatenate([boxes, np.concatenate([xy, xy + self.scene.box], axis=1)])
+        result = np.empty((len(boxes), 5))
+        np.trunc(boxes, out=result[:, :4])
+        result[:, 4] = self.conf
+        return result
+
+    def detect(self, frame):
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames, batch_size=None):
+        if self.latency:
+            batch_size = batch_size or self.batch_size
+            time.sleep(self.latency * -(-len(frames) // batch_size))
+        return [self.detections(frame_index(frame)) for frame in frames]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render a synthetic crowd video with known counts')
+    parser.add_argument('--output', type=str, default='input/synthetic.avi',
+                      help='Video path (default: input/synthetic.avi)')
+    parser.add_argument('--walkers', type=int, default=20,
+                      help='People on screen at a time (default: 20)')
+    parser.add_argument('--crossing-rate', type=float, default=0.5,
+                      help='Share of walkers that cross the counting line (default: 0.5)')
+    parser.add_argument('--width', type=int, default=1280,
+                      help='Frame width (default: 1280)')
+    parser.add_argument('--height', type=int, default=720,
+                      help='Frame height (default: 720)')
+    parser.add_argument('--frames', type=int, default=600,
+                      help='Number of frames (default: 600)')
+    parser.add_argument('--seed', type=int, default=0,
+                      help='Random seed (default: 0)')
+
+    args = parser.parse_args()
+    scene = SyntheticScene(args.walkers, args.crossing_rate, args.width, args.height, args.frames, seed=args.seed)
+    scene.write_video(args.output)
+    count_in, count_out = scene.ground_truth()
+    print(f"Wrote {args.frames} frames to {args.output}; line y={scene.line_y}: in {count_in} out {count_out}")
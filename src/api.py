@@ -1,16 +1,15 @@
 ﻿# src/api.py
-from flask import Flask, request, jsonify, send_file, url_for
+from flask import Flask, Response, request, jsonify, send_file
+import errno
 import os
-import cv2
-import tempfile
+import queue
+import threading
+import time
 from werkzeug.utils import secure_filename
 from datetime import datetime
-import threading
-import queue
-from src.detector import PersonDetector
-from src.tracker import ObjectTracker
-from src.counter import PersonCounter
-from src.visualization import draw_overlays
+import uuid
+from src.events import BUCKETS, EventLog
+from src.metrics import render
 
 app = Flask(__name__)
 
@@ -19,82 +18,87 @@ UPLOAD_FOLDER = 'input'
 OUTPUT_FOLDER = 'output'
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
 MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100MB max file size
+MODEL_PATH = os.environ.get('FOOTFALL_MODEL', 'yolov8n.pt')
+NUM_WORKERS = int(os.environ.get('FOOTFALL_WORKERS', 2))  # worker processes, one model each
+MAX_QUEUED_JOBS = int(os.environ.get('FOOTFALL_MAX_QUEUED_JOBS', 8))  # beyond this uploads get 429
+MOTION_GATE = os.environ.get('FOOTFALL_MOTION_GATE', '0') == '1'  # skip the detector on static frames
+BACKEND = os.environ.get('FOOTFALL_BACKEND', 'ultralytics')  # ultralytics, onnx or openvino
+INT8 = os.environ.get('FOOTFALL_INT8', '0') == '1'  # quantized export (onnx/openvino backends)
+RETRY_AFTER_SECONDS = 30
+EVENT_LOG_DIR = os.environ.get('FOOTFALL_EVENT_LOG', 'events')  # crossing history behind /counts
+CHECKPOINT_FOLDER = os.environ.get('FOOTFALL_CHECKPOINTS', 'checkpoints') or None  # '' turns resuming off
+CHECKPOINT_SECONDS = float(os.environ.get('FOOTFALL_CHECKPOINT_SECONDS', 5))  # between job checkpoints
+FORK_SERVER = os.environ.get('FOOTFALL_FORK_SERVER', '0') == '1'  # fork a warm worker per job
+STREAM_CHUNK_SIZE = 64 * 1024  # bytes read from a streamed upload at a time
+STREAM_START_TIMEOUT = 600  # seconds a streamed upload waits for a free worker
+
+app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
 # Create directories if they don't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+if CHECKPOINT_FOLDER:
+    os.makedirs(CHECKPOINT_FOLDER, exist_ok=True)
 
-# Job queue and results storage
-processing_queue = queue.Queue()
-processing_results = {}
+# Job queue and results storage, started on first use so that importing
+# this module (or Flask's reloader parent) does not spawn workers, nor
+# import OpenCV, scipy and the model runtime that only the workers need
+processing_queue = None
+event_log = None
+_pool_lock = threading.Lock()
+
+def get_event_log():
+    global event_log
+    with _pool_lock:
+        if event_log is None:
+            event_log = EventLog(EVENT_LOG_DIR)
+        return event_log
+
+def get_processing_queue():
+    global processing_queue
+    log = get_event_log()
+    with _pool_lock:
+        if processing_queue is None:
+            from src.jobs import JobPool
+            processing_queue = JobPool(NUM_WORKERS, MAX_QUEUED_JOBS, MODEL_PATH, OUTPUT_FOLDER,
+                                       motion_gate=MOTION_GATE, event_log=log, backend=BACKEND, int8=INT8,
+                                       checkpoint_dir=CHECKPOINT_FOLDER, checkpoint_every=CHECKPOINT_SECONDS,
+                                       fork_server=FORK_SERVER)
+            processing_queue.start()
+        return processing_queue
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def process_video(video_path, job_id):
-    """Process video and count people."""
+def parse_time(value):
+    """Epoch seconds from a number or an ISO 8601 string; None if value is empty, ValueError if invalid."""
+    if not value:
+        return None
     try:
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            raise ValueError("Could not open video file")
-
-        # Initialize components
-        detector = PersonDetector()
-        tracker = ObjectTracker()
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        line_y = int(height * 0.5)  # Line in the middle
-        counter = PersonCounter(line_y)
-
-        # Process video
-        frame_count = 0
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-        # Prepare output video
-        output_path = os.path.join(OUTPUT_FOLDER, f"processed_{job_id}.avi")
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        out = cv2.VideoWriter(output_path, fourcc, 30.0, 
-                            (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
-                             int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))))
-
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # Process frame
-            detections = detector.detect(frame)
-            tracks = tracker.update(detections)
-            count_in, count_out = counter.update_counts(tracks)
-            
-            # Draw visualization
-            annotated = draw_overlays(frame, tracks, line_y, count_in, count_out)
-            out.write(annotated)
-            
-            frame_count += 1
-
-        cap.release()
-        out.release()
-
-        # Save results
-        results = {
-            'status': 'completed',
-            'count_in': counter.count_in,
-            'count_out': counter.count_out,
-            'net_occupancy': counter.count_in - counter.count_out,
-            'processed_frames': frame_count,
-            'total_frames': total_frames,
-            'output_video': f"processed_{job_id}.avi",
-            'completion_time': datetime.now().isoformat()
-        }
-        
-        processing_results[job_id] = results
-        
-    except Exception as e:
-        processing_results[job_id] = {
-            'status': 'failed',
-            'error': str(e),
-            'completion_time': datetime.now().isoformat()
-        }
+        seconds = float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+    try:
+        datetime.fromtimestamp(seconds)  # in the range datetime (and so the response) can show
+    except (OverflowError, OSError, ValueError):
+        raise ValueError(f"{value} is not a time")
+    return seconds
+
+def detect_every(values):
+    """The detect_every option of an upload: run the detector on every Nth frame (default 1)."""
+    value = int(values.get('detect_every') or 1)
+    if value < 1:
+        raise ValueError("detect_every must be at least 1")
+    return value
+
+def event_info(values):
+    """Optional camera name and recording start time of an upload, for the event log."""
+    info = {}
+    if values.get('camera'):
+        info['camera'] = values['camera']
+    if values.get('recorded_at'):
+        info['recorded_at'] = parse_time(values['recorded_at'])
+    return info
 
 @app.route('/api/process-video', methods=['POST'])
 def process_video_endpoint():
@@ -109,68 +113,221 @@ def process_video_endpoint():
     if not allowed_file(file.filename):
         return jsonify({'error': f'File type not allowed. Supported types: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
 
+    # Generate unique job ID and save file
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    job_id = f"{timestamp}_{uuid.uuid4().hex[:8]}_{secure_filename(file.filename)}"
+    video_path = os.path.join(UPLOAD_FOLDER, job_id)
+    file.save(video_path)
+
+    # counts_only=1 skips drawing and encoding; only counts and events are returned
+    counts_only = request.form.get('counts_only', request.args.get('counts_only', '')).lower() in ('1', 'true', 'yes')
+
+    values = {**request.args.to_dict(), **request.form.to_dict()}
+    try:
+        info = event_info(values)
+        stride = detect_every(values)
+    except ValueError:
+        os.unlink(video_path)
+        return jsonify({'error': 'recorded_at must be epoch seconds or an ISO 8601 time, '
+                                 'detect_every a positive integer'}), 400
+
+    try:
+        get_processing_queue().submit(job_id, video_path, counts_only, stride, **info)
+    except queue.Full:
+        os.unlink(video_path)
+        response = jsonify({'error': 'Too many jobs in progress, try again later'})
+        response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+        return response, 429
+
+    return jsonify({'job_id': job_id, 'status': 'queued'}), 202
+
+def _open_stream(path, job_id):
+    """
+    Open a job's FIFO for writing once its worker has started reading it.
+
+    Returns a blocking file object, or None if the job failed first or no
+    worker picked it up within STREAM_START_TIMEOUT.
+    """
+    pool = get_processing_queue()
+    deadline = time.monotonic() + STREAM_START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError as e:
+            if e.errno != errno.ENXIO:  # ENXIO: no reader yet
+                raise
+            if pool.status(job_id)['status'] == 'failed':
+                return None
+            time.sleep(0.05)
+            continue
+        os.set_blocking(fd, True)
+        return os.fdopen(fd, 'wb')
+
+    # Give up: a worker that opens the FIFO after this finds it gone, and
+    # one already blocked in open() is woken and sees an empty stream
+    fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+    os.unlink(path)
+    os.close(fd)
+    return None
+
+@app.route('/api/stream-video', methods=['POST'])
+def stream_video_endpoint():
+    """
+    Submit a video sent as the raw request body, processed while it uploads.
+
+    The body is piped through a FIFO straight into the worker's decoder, so
+    nothing is written to disk and memory stays bounded; the upload size cap
+    does not apply. The container must be readable front to back (MKV/WebM,
+    AVI, MPEG-TS or fragmented MP4; not an MP4 with its index at the end).
+    Pass the original file name as ?filename= and optionally ?counts_only=1.
+    """
+    if not hasattr(os, 'mkfifo'):
+        return jsonify({'error': 'Streaming uploads need a POSIX server; use /api/process-video'}), 501
+    filename = request.args.get('filename', 'stream.mkv')
+    if not allowed_file(filename):
+        return jsonify({'error': f'File type not allowed. Supported types: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
+
     try:
-        # Generate unique job ID and save file
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        job_id = f"{timestamp}_{secure_filename(file.filename)}"
-        video_path = os.path.join(UPLOAD_FOLDER, job_id)
-        file.save(video_path)
+        info = event_info(request.args)
+        stride = detect_every(request.args)
+    except ValueError:
+        return jsonify({'error': 'recorded_at must be epoch seconds or an ISO 8601 time, '
+                                 'detect_every a positive integer'}), 400
+
+    request.max_content_length = None  # memory stays bounded however long the stream is
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    job_id = f"{timestamp}_{uuid.uuid4().hex[:8]}_{secure_filename(filename)}"
+    fifo_path = os.path.join(UPLOAD_FOLDER, job_id)
+    os.mkfifo(fifo_path)
+    counts_only = request.args.get('counts_only', '').lower() in ('1', 'true', 'yes')
 
+    pool = get_processing_queue()
+    upload = {'bytes_received': 0, 'content_length': request.content_length}
     try:
-        # Process video
-        cap = cv2.VideoCapture(temp_input.name)
-        if not cap.isOpened():
-            return jsonify({'error': 'Could not open video file'}), 400
-
-        detector = PersonDetector()
-        tracker = ObjectTracker()
-        line_y = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) * 0.5)  # Line at middle
-        counter = Counter(line_y)
-
-        # Prepare output video
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        out = cv2.VideoWriter(temp_output.name, fourcc, 30.0, (width, height))
-
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            detections = detector.detect(frame)
-            tracks = tracker.update(detections)
-            count_in, count_out = counter.update_counts(tracks)
-            annotated = draw_overlays(frame, tracks, line_y, count_in, count_out)
-            out.write(annotated)
-
-        cap.release()
-        out.release()
-
-        # Return processed video
-        return send_file(temp_output.name, 
-                        as_attachment=True,
-                        download_name='processed_video.avi',
-                        mimetype='video/x-msvideo')
-
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        pool.submit(job_id, fifo_path, counts_only, stride, streamed=True, upload=dict(upload), **info)
+    except queue.Full:
+        os.unlink(fifo_path)
+        response = jsonify({'error': 'Too many jobs in progress, try again later'})
+        response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+        return response, 429
 
+    try:
+        stream = _open_stream(fifo_path, job_id)
+        if stream is None:
+            return jsonify({'job_id': job_id, 'error': 'Job did not start reading the upload'}), 503
+        try:
+            with stream:
+                while True:
+                    chunk = request.stream.read(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    stream.write(chunk)
+                    upload['bytes_received'] += len(chunk)
+                    if upload['bytes_received'] % (16 * STREAM_CHUNK_SIZE) < len(chunk):
+                        pool.update(job_id, upload=dict(upload))
+        except BrokenPipeError:
+            pass  # the decoder stopped reading; the job status says why
+        upload['complete'] = True
+        pool.update(job_id, upload=dict(upload))
     finally:
-        # Clean up temporary files
-        if os.path.exists(temp_input.name):
-            os.unlink(temp_input.name)
-        if os.path.exists(temp_output.name):
-            os.unlink(temp_output.name)
+        if os.path.exists(fifo_path):
+            os.unlink(fifo_path)
+
+    return jsonify({'job_id': job_id, 'status': pool.status(job_id)['status']}), 202
+
+def _progress(status):
+    """frames processed / estimated total, from the worker's frame count and, for streams, the upload."""
+    reported = status.get('progress')
+    if reported is None:
+        return None
+    frames, total = reported['frames_processed'], reported['total_frames']
+    upload = status.get('upload')
+    if total is None and upload and upload['bytes_received']:
+        # A stream's length in frames is unknown; scale by the bytes seen so far
+        size = upload['bytes_received'] if upload.get('complete') else upload['content_length']
+        if size:
+            total = int(frames * size / upload['bytes_received'])
+    return {
+        'frames_processed': frames,
+        'estimated_total_frames': total,
+        'fraction': round(min(frames / total, 1.0), 3) if total else None,
+    }
+
+@app.route('/api/status/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Current status of a submitted job, including results once completed."""
+    status = get_processing_queue().status(job_id)
+    if status is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify({'job_id': job_id, **status, 'progress': _progress(status)})
+
+@app.route('/api/video/<job_id>', methods=['GET'])
+def job_video(job_id):
+    """Download the annotated video of a completed job."""
+    status = get_processing_queue().status(job_id)
+    if status is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if status['status'] != 'completed':
+        return jsonify({'error': f"Job is {status['status']}"}), 409
+    if status['output_video'] is None:
+        return jsonify({'error': 'Counts-only job has no video'}), 404
+    return send_file(os.path.abspath(os.path.join(OUTPUT_FOLDER, status['output_video'])),
+                    as_attachment=True,
+                    download_name=status['output_video'],
+                    mimetype='video/x-msvideo')
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    pool = get_processing_queue()
+    return jsonify({
+        'status': 'ok',
+        'workers': pool.num_workers,
+        'pending_jobs': pool.pending(),
+        'max_queued_jobs': pool.max_queued
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Stage latency histograms, skipped and dropped frames, live tracks and jobs, for Prometheus."""
+    return Response(render(get_processing_queue().metrics()), mimetype='text/plain; version=0.0.4')
 
 @app.route('/counts', methods=['GET'])
 def get_counts():
-    # In a real application, you'd want to persist these counts
+    """
+    Entries and exits per time bucket from the event log's rollups.
+
+    Query: from / to (epoch seconds or ISO 8601; default the last 24 hours),
+    bucket (minute, hour or day; default hour) and optionally camera and line.
+    """
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in BUCKETS:
+        return jsonify({'error': f'bucket must be one of {", ".join(BUCKETS)}'}), 400
+    try:
+        end = parse_time(request.args.get('to'))
+        start = parse_time(request.args.get('from'))
+        if end is None:
+            end = time.time()
+        if start is None:
+            start = end - BUCKETS['day']
+    except ValueError:
+        return jsonify({'error': 'from/to must be epoch seconds or ISO 8601 times'}), 400
+    if start > end:
+        return jsonify({'error': 'from must not be after to'}), 400
+    if (end - start) / BUCKETS[bucket] > 100000:
+        return jsonify({'error': 'Too many buckets; use a larger bucket or a shorter range'}), 400
+
+    log = get_event_log()
+    log.refresh()
+    rows = log.counts(start, end, bucket, request.args.get('camera'), request.args.get('line'))
+    count_in = sum(row[1] for row in rows)
+    count_out = sum(row[2] for row in rows)
     return jsonify({
-        'count_in': Counter.count_in if hasattr(Counter, 'count_in') else 0,
-        'count_out': Counter.count_out if hasattr(Counter, 'count_out') else 0,
-        'total': (Counter.count_in if hasattr(Counter, 'count_in') else 0) - 
-                (Counter.count_out if hasattr(Counter, 'count_out') else 0)
+        'count_in': count_in,
+        'count_out': count_out,
+        'total': count_in - count_out,
+        'bucket': bucket,
+        'buckets': [{'start': datetime.fromtimestamp(t).isoformat(), 'in': n_in, 'out': n_out}
+                    for t, n_in, n_out in rows],
     })
 
 if __name__ == '__main__':
@@ -0,0 +1,194 @@
+# src/backends.py
+"""
+Inference backends behind PersonDetector.
+
+Every backend turns a list of BGR frames into one (N, 5) array of
+[x1, y1, x2, y2, confidence] person boxes per frame. The Ultralytics backend
+runs the PyTorch model as before. The exported backends (ONNX Runtime,
+OpenVINO) run a converted YOLOv8 graph and share letterbox() and
+postprocess() below; the converted model is exported once and cached.
+"""
+import os
+import shutil
+
+import cv2
+import numpy as np
+
+BACKENDS = ('ultralytics', 'onnx', 'openvino')
+IMAGE_SIZE = 640
+NMS_IOU = 0.7  # Ultralytics' default for predict()
+MAX_DETECTIONS = 300
+
+def letterbox(frames, size=IMAGE_SIZE):
+    """
+    Resize and pad BGR frames into one (B, 3, size, size) float32 RGB batch in [0, 1].
+
+    Each frame keeps its aspect ratio and is centred on grey (114) padding,
+    as Ultralytics does. Returns the batch and a (B, 3) array of
+    [scale, pad_x, pad_y] to map boxes back to each frame.
+    """
+    batch = np.full((len(frames), size, size, 3), 114, dtype=np.uint8)
+    meta = np.zeros((len(frames), 3))
+    for i, frame in enumerate(frames):
+        h, w = frame.shape[:2]
+        scale = min(size / h, size / w)
+        new_w, new_h = int(round(w * scale)), int(round(h * scale))
+        left = int(round((size - new_w) / 2 - 0.1))
+        top = int(round((size - new_h) / 2 - 0.1))
+        batch[i, top:top + new_h, left:left + new_w] = \
+            cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR) if (new_w, new_h) != (w, h) else frame
+        meta[i] = scale, left, top
+    # BGR HWC uint8 -> RGB CHW float, for the whole batch at once
+    return np.ascontiguousarray(batch[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0, meta
+
+def postprocess(output, meta, shapes, conf_threshold, iou_threshold=NMS_IOU):
+    """
+    Person boxes from raw YOLOv8 output (B, 4 + classes, anchors).
+
+    Keeps anchors whose person (class 0) score is above conf_threshold,
+    converts them from letterboxed cx, cy, w, h to frame x1, y1, x2, y2,
+    clips them to the frame and applies NMS. Coordinates are truncated to
+    whole pixels, like the Ultralytics path.
+    """
+    output = np.asarray(output)
+    detections = []
+    for i, (scale, pad_x, pad_y) in enumerate(meta):
+        boxes, scores = output[i, :4].T, output[i, 4]
+        keep = scores > conf_threshold
+        boxes, scores = boxes[keep], scores[keep]
+        if len(boxes) == 0:
+            detections.append(np.empty((0, 5)))
+            continue
+
+        xyxy = np.empty((len(boxes), 4))
+        xyxy[:, :2] = boxes[:, :2] - boxes[:, 2:] / 2
+        xyxy[:, 2:] = boxes[:, :2] + boxes[:, 2:] / 2
+        xyxy = (xyxy - [pad_x, pad_y, pad_x, pad_y]) / scale
+        h, w = shapes[i][:2]
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, w)
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, h)
+
+        xywh = np.concatenate([xyxy[:, :2], xyxy[:, 2:] - xyxy[:, :2]], axis=1)
+        kept = np.asarray(cv2.dnn.NMSBoxes(xywh.tolist(), scores.tolist(), conf_threshold, iou_threshold),
+                          dtype=int).reshape(-1)[:MAX_DETECTIONS]
+        result = np.empty((len(kept), 5))
+        np.trunc(xyxy[kept], out=result[:, :4])
+        result[:, 4] = scores[kept]
+        detections.append(result)
+    return detections
+
+def exported_model(model_path, backend, int8=False, cache_dir='models'):
+    """
+    Path of model_path converted for backend, exporting it on first use.
+
+    Exports land in cache_dir as <name>-<backend>[-int8].onnx (ONNX) or a
+    <name>-openvino[-int8] directory, and are reused by later runs. INT8 ONNX
+    models use dynamic weight quantization, which needs no calibration
+    images; INT8 OpenVINO export is Ultralytics' calibrated quantization,
+    which downloads a small calibration dataset the first time.
+    """
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    suffix = '-int8' if int8 else ''
+    if backend == 'onnx':
+        target = os.path.join(cache_dir, f"{name}-onnx{suffix}.onnx")
+    else:
+        target = os.path.join(cache_dir, f"{name}-openvino{suffix}")
+    if os.path.exists(target):
+        return target
+
+    from ultralytics import YOLO
+    os.makedirs(cache_dir, exist_ok=True)
+    if backend == 'onnx':
+        exported = YOLO(model_path).export(format='onnx', imgsz=IMAGE_SIZE, dynamic=True)
+        if int8:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(exported, target, weight_type=QuantType.QUInt8)
+        else:
+            shutil.copy(exported, target)
+    else:
+        exported = YOLO(model_path).export(format='openvino', imgsz=IMAGE_SIZE, dynamic=True, int8=int8)
+        shutil.copytree(exported, target)
+    return target
+
+class UltralyticsBackend:
+    """The PyTorch model through ultralytics.YOLO, with its own pre- and postprocessing."""
+
+    def __init__(self, model_path):
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+
+    def detect(self, frames, conf_threshold):
+        results = self.model.predict(list(frames), classes=[0], verbose=False)  # class 0 is person
+        return [self._to_array(result, conf_threshold) for result in results]
+
+    @staticmethod
+    def _to_array(result, conf_threshold):
+        """Filter one frame's raw boxes by confidence into an (N, 5) array."""
+        if result.boxes is None or len(result.boxes) == 0:
+            return np.empty((0, 5))
+
+        data = result.boxes.data.cpu().numpy()  # x1, y1, x2, y2, conf, cls
+        keep = data[:, 4] > conf_threshold
+        boxes = np.empty((int(keep.sum()), 5))
+        np.trunc(data[keep, :4], out=boxes[:, :4])
+        boxes[:, 4] = data[keep, 4]
+        return boxes
+
+class OnnxBackend:
+    """A YOLOv8 ONNX export on ONNX Runtime's CPU execution provider."""
+
+    def __init__(self, model_path, int8=False, cache_dir='models', threads=None):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("The onnx backend needs onnxruntime: pip install onnxruntime") from None
+        path = model_path if model_path.endswith('.onnx') else exported_model(model_path, 'onnx', int8, cache_dir)
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def detect(self, frames, conf_threshold):
+        batch, meta = letterbox(frames)
+        output = self.session.run(None, {self.input_name: batch})[0]
+        return postprocess(output, meta, [frame.shape for frame in frames], conf_threshold)
+
+class OpenVinoBackend:
+    """A YOLOv8 OpenVINO export compiled for the CPU."""
+
+    def __init__(self, model_path, int8=False, cache_dir='models'):
+        try:
+            import openvino
+        except ImportError:
+            raise ImportError("The openvino backend needs OpenVINO: pip install openvino") from None
+        path = model_path if os.path.isdir(model_path) else exported_model(model_path, 'openvino', int8, cache_dir)
+        xml = next(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.xml'))
+        core = openvino.Core()
+        self.model = core.compile_model(core.read_model(xml), 'CPU', {'PERFORMANCE_HINT': 'THROUGHPUT'})
+
+    def detect(self, frames, conf_threshold):
+        batch, meta = letterbox(frames)
+        output = self.model(batch)[self.model.output(0)]
+        return postprocess(output, meta, [frame.shape for frame in frames], conf_threshold)
+
+def fork_safe(name):
+    """
+    Whether backend name's model can be loaded before fork() and used by the
+    forked processes. The PyTorch model can, on the CPU; ONNX Runtime and
+    OpenVINO start inference threads as soon as a model is loaded, and
+    threads do not survive fork().
+    """
+    return name == 'ultralytics'
+
+def create_backend(name, model_path, int8=False, cache_dir='models'):
+    """Instantiate backend name ('ultralytics', 'onnx' or 'openvino') for model_path."""
+    if name == 'ultralytics':
+        if int8:
+            raise ValueError("INT8 needs the onnx or openvino backend")
+        return UltralyticsBackend(model_path)
+    if name == 'onnx':
+        return OnnxBackend(model_path, int8, cache_dir)
+    if name == 'openvino':
+        return OpenVinoBackend(model_path, int8, cache_dir)
+    raise ValueError(f"Unknown backend {name!r}; choose from {', '.join(BACKENDS)}")
@@ -0,0 +1,138 @@
+# src/cache.py
+import hashlib
+import os
+
+import numpy as np
+
+def video_key(video_path, model_path, conf_threshold, resize=None, backend='ultralytics', int8=False):
+    """
+    Cache key for one video's detections.
+
+    Hashes the file contents rather than its name, so a renamed or copied clip
+    still hits and an edited one does not, together with everything else that
+    changes the detections: the model file, the confidence threshold, the
+    frame size the detector saw and the inference backend.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(video_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    digest.update(f"|{os.path.abspath(model_path)}|{conf_threshold!r}|{resize}|{backend}|{int8}".encode())
+    return digest.hexdigest()
+
+class CachedDetections:
+    """
+    Per-frame detections read from a cache entry.
+
+    boxes is a memory-mapped (M, 5) float32 array of every frame's boxes back
+    to back; offsets[i]:offsets[i + 1] are the rows of frame i. Only the pages
+    that are read are loaded, so long recordings cost little memory.
+    """
+
+    def __init__(self, boxes_path, offsets_path):
+        self.boxes = np.load(boxes_path, mmap_mode='r')
+        self.offsets = np.load(offsets_path)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        """(N, 5) array of [x1, y1, x2, y2, confidence] rows for frame index."""
+        return np.array(self.boxes[self.offsets[index]:self.offsets[index + 1]], dtype=float)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+class CacheWriter:
+    """Collects a run's detections frame by frame; commit() publishes them as a cache entry."""
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        self._boxes = []
+        self._counts = []
+
+    def __len__(self):
+        return len(self._counts)
+
+    def append(self, detections):
+        detections = np.asarray(detections, dtype=np.float32).reshape(-1, 5)
+        self._boxes.append(detections)
+        self._counts.append(len(detections))
+
+    def commit(self):
+        boxes = np.concatenate(self._boxes) if self._boxes else np.zeros((0, 5), dtype=np.float32)
+        offsets = np.concatenate([[0], np.cumsum(self._counts, dtype=np.int64)])
+        boxes_path, offsets_path = self.cache.paths(self.key)
+        os.makedirs(self.cache.directory, exist_ok=True)
+
+        # Write under temporary names and rename, offsets last: an entry only
+        # exists once both files are complete
+        for path, array in ((boxes_path, boxes), (offsets_path, offsets)):
+            with open(path + '.tmp', 'wb') as f:
+                np.save(f, array)
+            os.replace(path + '.tmp', path)
+        self.cache.evict(keep=self.key)
+
+class DetectionCache:
+    """
+    Directory of per-video detection files, evicted least recently used first.
+
+    Each entry is a <key>.boxes.npy / <key>.offsets.npy pair; see video_key
+    for what the key covers. Reading an entry marks it as used, and once the
+    directory holds more than max_bytes the oldest entries are deleted.
+    """
+
+    def __init__(self, directory='cache', max_bytes=1 << 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + '.boxes.npy', base + '.offsets.npy'
+
+    def get(self, key):
+        """CachedDetections for key, or None on a miss."""
+        boxes_path, offsets_path = self.paths(key)
+        if not (os.path.exists(boxes_path) and os.path.exists(offsets_path)):
+            return None
+        os.utime(offsets_path)
+        return CachedDetections(boxes_path, offsets_path)
+
+    def writer(self, key):
+        return CacheWriter(self, key)
+
+    def entries(self):
+        """(key, size in bytes, last used) of every complete entry, least recently used first."""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.offsets.npy'):
+                continue
+            key = name[:-len('.offsets.npy')]
+            paths = self.paths(key)
+            if not os.path.exists(paths[0]):
+                continue
+            size = sum(os.path.getsize(path) for path in paths)
+            entries.append((key, size, os.path.getmtime(paths[1])))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            # Offsets first, so a half-deleted entry is never read
+            for path in reversed(self.paths(key)):
+                if os.path.exists(path):
+                    os.remove(path)
+            total -= size
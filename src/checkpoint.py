@@ -0,0 +1,215 @@
+# src/checkpoint.py
+"""
+Checkpoints of a counting run, so a restarted run carries on where it stopped.
+
+A checkpoint holds everything needed to continue from a frame as if the run
+had never been interrupted: the tracker's Kalman state, hit counters and ID
+sequence, the counter's totals and the last centroids of recently seen
+tracks, and the index of the next frame. It is a single uncompressed .npz
+file of a few KB, whatever the length of the run. The crossing events are
+appended, 16 bytes each, to an events file next to it (the checkpoint's
+path plus '.events'); the checkpoint records how many of them it covers. A
+run that also appends to an event log saves how long the log was when it
+started, so a resumed run knows which crossings are already in the log.
+
+A Checkpointer is fed every frame by the track stage. Every interval seconds
+it copies that state, which takes microseconds, and a background thread
+appends the crossings since the previous checkpoint to the events file,
+then writes the copy to a temporary file and renames it over the previous
+checkpoint, so a crash while writing leaves the last good one in place.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from src.metrics import stage_histogram
+
+VERSION = 2
+_EVENT_COLUMNS = 4  # frame, track ID, 1 for in / 0 for out, line or zone number
+
+def _flatten(state, prefix=''):
+    """{'a': {'b': x}} -> {'a.b': x}, the flat names np.savez needs."""
+    flat = {}
+    for key, value in state.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+def _unflatten(flat):
+    state = {}
+    for name, value in flat.items():
+        *path, key = name.split('.')
+        target = state
+        for part in path:
+            target = target.setdefault(part, {})
+        target[key] = value
+    return state
+
+def save_checkpoint(path, state):
+    """Write state (nested dicts of arrays and scalars) to path atomically."""
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, **_flatten(state))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def load_checkpoint(path):
+    """The state saved at path, with meta decoded; None if there is no checkpoint there."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        state = _unflatten({name: data[name] for name in data.files})
+    if int(state['version']) != VERSION:
+        raise ValueError(f"{path} is a version {int(state['version'])} checkpoint, expected {VERSION}")
+    for key in ('frame', 'events', 'log_start'):
+        state[key] = int(state[key])
+    state['meta'] = json.loads(str(state['meta']))
+    if state['log_start'] < 0:
+        state['log_start'] = None
+    return state
+
+def events_path(path):
+    """The file the crossing events of the checkpoint at path are appended to."""
+    return path + '.events'
+
+def checkpoint_events(path, state, start=0):
+    """
+    The crossing events covered by the checkpoint at path, from the start-th
+    on, in the form of pipeline.crossing_events.
+    """
+    rows = np.fromfile(events_path(path), dtype=np.int32, count=state['events'] * _EVENT_COLUMNS)
+    rows = rows.reshape(-1, _EVENT_COLUMNS)[start:]
+    names = [str(name) for name in state['counter']['names']]
+    return [{'frame': frame, 'track_id': track_id, 'direction': 'in' if went_in else 'out', 'line': names[line]}
+            for frame, track_id, went_in, line in rows.tolist()]
+
+def resume(state, tracker, counter):
+    """Put tracker and counter back as they were in a checkpoint; returns the frame to continue from."""
+    tracker.restore(state['tracker'])
+    counter.restore(state['counter'])
+    return state['frame']
+
+class Checkpointer:
+    """
+    Periodic checkpoints of a tracker and counter, written on a background thread.
+
+    record(packet) is called after each frame has been tracked and counted, in
+    frame order; it keeps the frame's crossing events and, once interval
+    seconds have passed, takes a checkpoint. meta is any JSON-ready
+    description of the run saved alongside, such as the video it reads.
+    Pass the state a run resumed from as resumed to carry its events over;
+    the events file is cut back to the ones that checkpoint covers, as the
+    frames after it are processed again.
+    log_start is the number of events the run's event log held before the
+    run (first, if resumed) appended to it.
+    close() writes a final checkpoint, or with remove=True deletes it once
+    the run has finished and there is nothing left to resume.
+    """
+
+    def __init__(self, path, tracker, counter, interval=5.0, meta=None, resumed=None, log_start=None):
+        self.path = path
+        self.tracker = tracker
+        self.counter = counter
+        self.interval = interval
+        self.meta = meta or {}
+        self.log_start = log_start
+        self.frame = 0
+        self.saved = 0
+        self.write_seconds = 0.0
+        self._lines = {name: i for i, name in enumerate(counter.snapshot()['names'].tolist())}
+        self._new_events = []  # rows since the last checkpoint
+        self._unwritten = []  # arrays of rows taken by checkpoints but not yet in the events file
+        self.events = 0  # rows taken by checkpoints so far
+        if resumed is not None:
+            self.frame = resumed['frame']
+            self.events = resumed['events']
+        elif os.path.exists(path):
+            os.remove(path)  # a new run replaces an earlier checkpoint, and its events with it
+        with open(events_path(path), 'ab') as f:
+            f.truncate(self.events * _EVENT_COLUMNS * np.dtype(np.int32).itemsize)
+        self._last = time.monotonic()
+        self._pending = None
+        self._closing = False
+        self._error = None
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def record(self, packet):
+        for track_id, direction, line in packet.events:
+            self._new_events.append((packet.index, track_id, direction == 'in', self._lines[line]))
+        self.frame = packet.index + 1
+        if time.monotonic() - self._last >= self.interval:
+            self.save()
+
+    def save(self):
+        """Take a checkpoint now; it is written in the background."""
+        if self._error is not None:
+            raise self._error
+        rows = np.array(self._new_events, dtype=np.int32).reshape(-1, _EVENT_COLUMNS)
+        self._new_events = []
+        self.events += len(rows)
+        state = {'version': VERSION, 'frame': self.frame, 'meta': json.dumps(self.meta),
+                 'log_start': -1 if self.log_start is None else self.log_start,
+                 'tracker': self.tracker.snapshot(), 'counter': self.counter.snapshot(),
+                 'events': self.events}
+        with self._cond:
+            # A checkpoint not yet written is superseded, but its events are still appended
+            self._pending = state
+            if len(rows):
+                self._unwritten.append(rows)
+            self._cond.notify()
+        self._last = time.monotonic()
+
+    def _run(self):
+        seconds = stage_histogram('checkpoint')
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closing:
+                    self._cond.wait()
+                state, self._pending = self._pending, None
+                chunks, self._unwritten = self._unwritten, []
+                if state is None:
+                    return
+            try:
+                start = time.perf_counter()
+                # The events a checkpoint covers are on disk before the checkpoint itself
+                with open(events_path(self.path), 'ab') as f:
+                    for rows in chunks:
+                        f.write(rows.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                save_checkpoint(self.path, state)
+                elapsed = time.perf_counter() - start
+                seconds.observe(elapsed)
+                self.write_seconds += elapsed
+                self.saved += 1
+            except Exception as e:
+                self._error = e  # raised to the caller by the next save() or close()
+
+    def close(self, remove=False):
+        """Write a last checkpoint (or delete the checkpoint with remove) and stop the writer thread."""
+        if not remove:
+            self.save()
+        with self._cond:
+            if remove:
+                self._pending = None
+            self._closing = True
+            self._cond.notify()
+        self._thread.join()
+        if remove:
+            for path in (self.path, self.path + '.tmp', events_path(self.path)):
+                if os.path.exists(path):
+                    os.remove(path)
+        if self._error is not None:
+            raise self._error
+
+    def report(self):
+        return (f"Checkpoints: {self.saved} written to {self.path} in {self.write_seconds:.3f}s "
+                f"on their own thread, every {self.interval:g}s")
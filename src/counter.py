@@ -1,26 +1,190 @@
 # src/counter.py
 import numpy as np
 
+# Half-length of the segment standing in for an unbounded horizontal line_y
+_FAR = 1e6
+
+def _named(items, prefix):
+    """Accept a dict of name -> geometry or a plain list, which gets numbered names."""
+    if items is None:
+        return {}
+    if isinstance(items, dict):
+        return dict(items)
+    return {f"{prefix}{i}": item for i, item in enumerate(items)}
+
+def points_in_polygons(points, polygons):
+    """
+    Even-odd point-in-polygon test of (N, 2) points against (Z, K, 2) polygons.
+
+    Polygons with fewer vertices are padded by repeating their last vertex,
+    which adds only zero-length edges. Returns an (N, Z) boolean array.
+    """
+    x = points[:, 0][:, None, None]
+    y = points[:, 1][:, None, None]
+    x1, y1 = polygons[None, :, :, 0], polygons[None, :, :, 1]
+    x2, y2 = np.roll(x1, -1, axis=2), np.roll(y1, -1, axis=2)
+
+    spans = (y1 > y) != (y2 > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    return np.count_nonzero(spans & (x < x_cross), axis=2) % 2 == 1
+
+def segment_crossings(prev, cur, segments):
+    """
+    Which of N centroid steps prev -> cur cross which of L segments (L, 2, 2).
+
+    Returns (crossed_in, crossed_out), two (N, L) boolean arrays; "in" is
+    crossing from the left of the direction p1 -> p2 to its right.
+    """
+    a = segments[None, :, 0]
+    d = segments[None, :, 1] - a
+    p, c = prev[:, None], cur[:, None]
+    side_prev = d[..., 0] * (p[..., 1] - a[..., 1]) - d[..., 1] * (p[..., 0] - a[..., 0])
+    side_cur = d[..., 0] * (c[..., 1] - a[..., 1]) - d[..., 1] * (c[..., 0] - a[..., 0])
+
+    # The step must pass between the segment's endpoints, not beyond them
+    m = c - p
+    b = segments[None, :, 1]
+    end_a = m[..., 0] * (a[..., 1] - p[..., 1]) - m[..., 1] * (a[..., 0] - p[..., 0])
+    end_b = m[..., 0] * (b[..., 1] - p[..., 1]) - m[..., 1] * (b[..., 0] - p[..., 0])
+    within = end_a * end_b <= 0
+
+    crossed_in = (side_prev < 0) & (side_cur >= 0) & within
+    crossed_out = (side_prev >= 0) & (side_cur < 0) & within
+    return crossed_in, crossed_out
+
 class PersonCounter:
-    def __init__(self, line_y):
+    """
+    Counts centroid crossings of counting lines and entries/exits of zones.
+
+    line_y is the original horizontal counting line, named "line": moving down
+    across it is "in", moving up is "out". lines adds arbitrary segments ((x1, y1), (x2, y2)),
+    where "in" means crossing from the left of the direction p1 -> p2 to its
+    right (so a left-to-right horizontal segment behaves like line_y). zones are
+    polygons; entering one is "in" and leaving it is "out". lines and zones may
+    be lists or dicts keyed by name. count_in and count_out total every line
+    and zone.
+
+    All tracks are tested against all lines and zones at once. Last positions
+    are kept only for tracks seen within the last forget_after updates, so
+    memory stays bounded on a camera that runs for months; keep it above the
+    tracker's max_age + min_hits, times the detector stride when frames are
+    skipped (scheduler.forget_after), so a briefly hidden track is not
+    forgotten.
+    """
+
+    def __init__(self, line_y=None, lines=None, zones=None, forget_after=30):
         self.line_y = line_y
+        self.lines = _named(lines, 'line')
+        self.zones = _named(zones, 'zone')
+        segments = dict(self.lines)
+        if line_y is not None:
+            segments = {'line': ((-_FAR, line_y), (_FAR, line_y)), **segments}
+        self.forget_after = forget_after
+
         self.count_in = 0
         self.count_out = 0
-        self.track_history = {}
+        self.line_counts = np.zeros((len(segments), 2), dtype=int)  # [in, out] per line
+        self.zone_counts = np.zeros((len(self.zones), 2), dtype=int)  # [in, out] per zone
+        self.last_events = []  # (track_id, 'in' | 'out', line or zone name) from the latest update
+
+        self._segments = np.zeros((len(segments), 2, 2))
+        for i, segment in enumerate(segments.values()):
+            self._segments[i] = segment
+        k = max((len(polygon) for polygon in self.zones.values()), default=0)
+        self._polygons = np.zeros((len(self.zones), k, 2))
+        for i, polygon in enumerate(self.zones.values()):
+            self._polygons[i] = polygon[-1]
+            self._polygons[i, :len(polygon)] = polygon
+        self._names = list(segments) + list(self.zones)
+
+        # Last centroid of recently seen tracks, sorted by track ID
+        self.frame = 0
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._pos = np.zeros((0, 2))
+        self._seen = np.zeros(0, dtype=np.int64)
 
     def update_counts(self, tracks):
-        """Update counts based on track positions relative to counting line."""
-        for track in tracks:
-            x1, y1, x2, y2, track_id = track
-            cx = int((x1 + x2) / 2)
-            cy = int((y1 + y2) / 2)
-            prev_y = self.track_history.get(track_id, cy)
+        """Update counts based on track positions relative to the counting lines and zones."""
+        self.frame += 1
+        self.last_events = []
+        tracks = np.asarray(tracks, dtype=float).reshape(-1, 5)
+        ids = tracks[:, 4].astype(np.int64)
+        cur = np.stack([((tracks[:, 0] + tracks[:, 2]) / 2).astype(int),
+                        ((tracks[:, 1] + tracks[:, 3]) / 2).astype(int)], axis=1).astype(float)
 
-            if prev_y < self.line_y and cy >= self.line_y:
-                self.count_in += 1
-            elif prev_y >= self.line_y and cy < self.line_y:
-                self.count_out += 1
+        # Previous centroid of each track; new tracks start where they are
+        prev = cur.copy()
+        slot = np.searchsorted(self._ids, ids)
+        known = slot < len(self._ids)
+        known[known] = self._ids[slot[known]] == ids[known]
+        prev[known] = self._pos[slot[known]]
 
-            self.track_history[track_id] = cy
+        crossed_in, crossed_out = self._cross_lines(prev, cur)
+        entered, exited = self._cross_zones(prev, cur)
+        self.line_counts += np.stack([crossed_in.sum(axis=0), crossed_out.sum(axis=0)], axis=1)
+        self.zone_counts += np.stack([entered.sum(axis=0), exited.sum(axis=0)], axis=1)
+        self.count_in = int(self.line_counts[:, 0].sum() + self.zone_counts[:, 0].sum())
+        self.count_out = int(self.line_counts[:, 1].sum() + self.zone_counts[:, 1].sum())
 
+        went_in = np.concatenate([crossed_in, entered], axis=1)
+        went_out = np.concatenate([crossed_out, exited], axis=1)
+        for direction, mask in (('in', went_in), ('out', went_out)):
+            for t, place in zip(*np.nonzero(mask)):
+                self.last_events.append((int(ids[t]), direction, self._names[place]))
+
+        self._remember(ids, cur, slot, known)
         return self.count_in, self.count_out
+
+    def counts_by_name(self):
+        """{line or zone name: {'in': n, 'out': n}}."""
+        counts = np.concatenate([self.line_counts, self.zone_counts])
+        return {name: {'in': int(c[0]), 'out': int(c[1])} for name, c in zip(self._names, counts)}
+
+    def snapshot(self):
+        """Totals and the last centroids of recently seen tracks, as NumPy arrays and ints."""
+        return {'names': np.array(self._names), 'line_counts': self.line_counts.copy(),
+                'zone_counts': self.zone_counts.copy(), 'frame': self.frame,
+                'ids': self._ids.copy(), 'pos': self._pos.copy(), 'seen': self._seen.copy()}
+
+    def restore(self, state):
+        """Continue counting from a snapshot() of a counter with the same lines and zones."""
+        if [str(name) for name in state['names']] != self._names:
+            raise ValueError(f"Snapshot counts lines and zones {list(state['names'])}, not {self._names}")
+        self.line_counts = np.array(state['line_counts'], dtype=int)
+        self.zone_counts = np.array(state['zone_counts'], dtype=int)
+        self.count_in = int(self.line_counts[:, 0].sum() + self.zone_counts[:, 0].sum())
+        self.count_out = int(self.line_counts[:, 1].sum() + self.zone_counts[:, 1].sum())
+        self.frame = int(state['frame'])
+        self._ids = np.array(state['ids'], dtype=np.int64)
+        self._pos = np.array(state['pos'], dtype=float)
+        self._seen = np.array(state['seen'], dtype=np.int64)
+        self.last_events = []
+
+    def _cross_lines(self, prev, cur):
+        """(N, L) masks of tracks whose last step crossed each segment, per direction."""
+        return segment_crossings(prev, cur, self._segments)
+
+    def _cross_zones(self, prev, cur):
+        """(N, Z) masks of tracks that entered or left each zone on their last step."""
+        if len(self._polygons) == 0:
+            empty = np.zeros((len(cur), 0), dtype=bool)
+            return empty, empty
+        was_inside = points_in_polygons(prev, self._polygons)
+        is_inside = points_in_polygons(cur, self._polygons)
+        return ~was_inside & is_inside, was_inside & ~is_inside
+
+    def _remember(self, ids, cur, slot, known):
+        """Store this update's centroids and forget tracks not seen for forget_after updates."""
+        self._pos[slot[known]] = cur[known]
+        self._seen[slot[known]] = self.frame
+
+        ids = np.concatenate([self._ids, ids[~known]])
+        pos = np.concatenate([self._pos, cur[~known]])
+        seen = np.concatenate([self._seen, np.full(np.count_nonzero(~known), self.frame)])
+
+        keep = seen > self.frame - self.forget_after
+        order = np.argsort(ids[keep], kind='stable')
+        self._ids = ids[keep][order]
+        self._pos = pos[keep][order]
+        self._seen = seen[keep][order]
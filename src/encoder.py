@@ -0,0 +1,165 @@
+# src/encoder.py
+"""
+Annotated-video output encoded off the processing thread.
+
+VideoEncoder writes like cv2.VideoWriter, but write() only queues the frame
+and a background thread scales and encodes it. OpenCV releases the GIL while
+encoding, so a thread is enough for XVID/MJPG encoding to overlap detection
+and tracking. Overlays are drawn into a FramePool of preallocated frames that
+go back to the pool once encoded, so the annotated path allocates nothing per
+frame.
+"""
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from src.metrics import stage_histogram
+
+_END = object()  # end-of-stream marker for the encoder thread
+
+class FramePool:
+    """
+    Preallocated uint8 frames of one shape, shared by reference count.
+
+    acquire(users) hands out a free frame that users owners each give back
+    with release(); it returns to the pool once the last one has. If every
+    frame is in use a new one is allocated, so a consumer that falls behind
+    costs memory rather than a deadlock; allocated counts all frames made.
+    """
+
+    def __init__(self, shape, size):
+        self.shape = shape
+        self._free = deque(np.empty(shape, dtype=np.uint8) for _ in range(size))
+        self._users = {}  # id(frame) -> [frame, owners left]
+        self._lock = threading.Lock()
+        self.allocated = size
+
+    def acquire(self, users=1):
+        with self._lock:
+            if self._free:
+                frame = self._free.popleft()
+            else:
+                frame = np.empty(self.shape, dtype=np.uint8)
+                self.allocated += 1
+            self._users[id(frame)] = [frame, users]
+            return frame
+
+    def release(self, frame):
+        """Give back one owner's share of frame; frames not from this pool are ignored."""
+        with self._lock:
+            entry = self._users.get(id(frame))
+            if entry is None or entry[0] is not frame:
+                return
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._users[id(frame)]
+                self._free.append(frame)
+
+class VideoEncoder:
+    """
+    Video file writer with a bounded queue and a background encoding thread.
+
+    frame_size is the (width, height) of the frames written. scale resizes
+    them before encoding (0.5 halves each side) and every keeps one frame in
+    every, for short review clips; the output frame rate is divided by every
+    so the clip still plays in real time. Callers ask wants(index) before
+    drawing a frame and draw into buffer() frames, which write() returns to
+    the pool after encoding. write() blocks while queue_size frames are
+    waiting, so a slow encoder slows processing down instead of buffering
+    the whole video.
+    """
+
+    def __init__(self, path, fps, frame_size, codec='XVID', scale=1.0, every=1, queue_size=16):
+        self.every = max(1, int(every))
+        width, height = frame_size
+        self.size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        self._writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps / self.every, self.size)
+        if not self._writer.isOpened():
+            raise ValueError(f"Could not open {path} for writing with codec {codec}")
+        # Enough frames for a full queue plus the ones being drawn and encoded
+        self.pool = FramePool((height, width, 3), queue_size + 4)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self.frames_written = 0
+        self.encode_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.max_queue = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def wants(self, index):
+        """Whether frame index of the source goes into the output."""
+        return index % self.every == 0
+
+    def buffer(self, users=1):
+        """A pool frame to draw into; each of users owners passes it to write() or done()."""
+        return self.pool.acquire(users)
+
+    def done(self, frame):
+        """Give back a buffer() frame that is not (or no longer) needed by the caller."""
+        self.pool.release(frame)
+
+    def write(self, frame):
+        """
+        Queue frame for encoding.
+
+        buffer() frames are returned to the pool once encoded; any other
+        frame must not be modified after it has been written.
+        """
+        if self._error is not None:
+            raise self._error
+        start = time.perf_counter()
+        self._queue.put(frame)
+        self.blocked_seconds += time.perf_counter() - start
+        self.max_queue = max(self.max_queue, self._queue.qsize())
+
+    def _run(self):
+        seconds = stage_histogram('encode')
+        scaled = None
+        if self.size != (self.pool.shape[1], self.pool.shape[0]):
+            scaled = np.empty((self.size[1], self.size[0], 3), dtype=np.uint8)
+        while True:
+            frame = self._queue.get()
+            if frame is _END:
+                break
+            try:
+                if self._error is None:
+                    start = time.perf_counter()
+                    if scaled is not None:
+                        cv2.resize(frame, self.size, dst=scaled, interpolation=cv2.INTER_AREA)
+                    self._writer.write(frame if scaled is None else scaled)
+                    elapsed = time.perf_counter() - start
+                    seconds.observe(elapsed)
+                    self.encode_seconds += elapsed
+                    self.frames_written += 1
+            except Exception as e:
+                self._error = e  # raised to the caller by the next write() or release()
+            finally:
+                self.pool.release(frame)
+
+    def release(self):
+        """Encode everything still queued and close the file."""
+        self._queue.put(_END)
+        self._thread.join()
+        self._writer.release()
+        if self._error is not None:
+            raise self._error
+
+    def stats(self):
+        return {
+            'frames_written': self.frames_written,
+            'encode_seconds': round(self.encode_seconds, 3),
+            'blocked_seconds': round(self.blocked_seconds, 3),
+            'max_queue': self.max_queue,
+            'buffers': self.pool.allocated,
+        }
+
+    def report(self):
+        s = self.stats()
+        return (f"Encoder wrote {s['frames_written']} frames at {self.size[0]}x{self.size[1]} in "
+                f"{s['encode_seconds']:.2f}s on its own thread; processing waited {s['blocked_seconds']:.2f}s "
+                f"for it (queue max {s['max_queue']}, {s['buffers']} frame buffers)")
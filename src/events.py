@@ -0,0 +1,178 @@
+# src/events.py
+import json
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+
+BUCKETS = {'minute': 60, 'hour': 3600, 'day': 86400}
+
+# One file per column; every event adds one value to each
+_COLUMNS = {
+    'time': np.float64,  # seconds since the epoch
+    'camera': np.int32,  # index into names['cameras']
+    'place': np.int32,  # index into names['places'] (line or zone name)
+    'track': np.int64,
+    'direction': np.int8,  # 1 in, 0 out
+}
+
+@contextmanager
+def _locked(path, shared=False):
+    """Hold a lock on the file at path, across processes, for the duration of the block."""
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # exclusive only; retries for 10 s
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class EventLog:
+    """
+    Append-only, columnar log of crossing events with time-bucketed rollups.
+
+    Each column lives in its own raw binary file under directory, so appending
+    is a handful of small writes and reading a column back is one np.fromfile.
+    Camera and line/zone names are stored once in names.json and referenced by
+    index. Minute, hour and day rollups of in/out counts are rebuilt from the
+    log on open and kept up to date by append. Each bucket keeps totals per
+    camera and place, per camera, per place and overall, so counts() costs one
+    dictionary lookup per bucket however many events, cameras and places
+    there are. Safe to share between threads and between processes: each
+    append holds an exclusive lock on the directory's lock file and first
+    catches up with the names and events other writers added, so rows stay
+    aligned across columns. Readers follow other writers with refresh().
+    """
+
+    def __init__(self, directory='events'):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._names_path = os.path.join(directory, 'names.json')
+        self._lock_path = os.path.join(directory, 'lock')
+        self.names = {'cameras': [], 'places': []}
+        self._index = {kind: {} for kind in self.names}
+        # rollups[bucket][bucket index][(camera, place)] = [in, out], with None for any camera or place
+        self.rollups = {bucket: defaultdict(dict) for bucket in BUCKETS}
+        self.events = 0
+        with self._lock, _locked(self._lock_path):
+            self._catch_up(repair=True)
+
+    def _path(self, column):
+        return os.path.join(self.directory, f"{column}.bin")
+
+    def _catch_up(self, repair=False):
+        """
+        Load the names and roll up the events appended since the last look.
+
+        direction is written last, so its length counts complete events. With
+        repair, which needs the exclusive lock, columns left longer by a writer
+        that crashed mid-append are cut back to it.
+        """
+        if os.path.exists(self._names_path):
+            with open(self._names_path) as f:
+                self.names = json.load(f)
+            self._index = {kind: {name: i for i, name in enumerate(names)} for kind, names in self.names.items()}
+        path = self._path('direction')
+        n = os.path.getsize(path) if os.path.exists(path) else 0
+        if repair:
+            for column, dtype in _COLUMNS.items():
+                size = n * np.dtype(dtype).itemsize
+                if os.path.exists(self._path(column)) and os.path.getsize(self._path(column)) > size:
+                    with open(self._path(column), 'r+b') as f:
+                        f.truncate(size)
+        if n > self.events:
+            columns = {column: np.fromfile(self._path(column), dtype=dtype, count=n - self.events,
+                                           offset=self.events * np.dtype(dtype).itemsize)
+                       for column, dtype in _COLUMNS.items()}
+            self._roll_up(columns)
+
+    def _roll_up(self, columns):
+        """Add a batch of events (dict of column arrays) to every rollup."""
+        self.events += len(columns['time'])
+        if len(columns['time']) == 0:
+            return
+        for bucket, seconds in BUCKETS.items():
+            keys = np.stack([(columns['time'] // seconds).astype(np.int64), columns['camera'],
+                             columns['place'], columns['direction']], axis=1)
+            unique, counts = np.unique(keys, axis=0, return_counts=True)
+            rollup = self.rollups[bucket]
+            for (index, camera, place, direction), count in zip(unique.tolist(), counts.tolist()):
+                totals = rollup[index]
+                for key in ((camera, place), (camera, None), (None, place), (None, None)):
+                    totals.setdefault(key, [0, 0])[0 if direction else 1] += count
+
+    def _name_id(self, kind, name):
+        index = self._index[kind].get(name)
+        if index is None:
+            index = self._index[kind][name] = len(self.names[kind])
+            self.names[kind].append(name)
+            with open(self._names_path + '.tmp', 'w') as f:
+                json.dump(self.names, f)
+            os.replace(self._names_path + '.tmp', self._names_path)
+        return index
+
+    def append(self, camera, events):
+        """
+        Record crossing events of one camera.
+
+        events are dicts with 'time' (epoch seconds), 'track_id', 'direction'
+        ('in' or 'out') and 'line' (line or zone name).
+        """
+        if not events:
+            return
+        with self._lock, _locked(self._lock_path):
+            self._catch_up(repair=True)
+            columns = {
+                'time': np.array([e['time'] for e in events], dtype=np.float64),
+                'camera': np.full(len(events), self._name_id('cameras', camera), dtype=np.int32),
+                'place': np.array([self._name_id('places', e['line']) for e in events], dtype=np.int32),
+                'track': np.array([e['track_id'] for e in events], dtype=np.int64),
+                'direction': np.array([e['direction'] == 'in' for e in events], dtype=np.int8),
+            }
+            for column, values in columns.items():
+                with open(self._path(column), 'ab') as f:
+                    f.write(values.tobytes())
+            self._roll_up(columns)
+
+    def refresh(self):
+        """Roll up events other processes appended to the same directory since the last look."""
+        with self._lock, _locked(self._lock_path, shared=True):
+            self._catch_up()
+
+    def counts(self, start, end, bucket='hour', camera=None, place=None):
+        """
+        In/out counts per bucket for buckets overlapping [start, end) (epoch seconds).
+
+        Buckets are aligned to the epoch, so days run midnight to midnight
+        UTC, and are counted whole: the first and last bucket include events
+        just outside the range. camera and place optionally restrict the counts
+        to one camera and one line or zone. Returns a list of
+        (bucket start, count_in, count_out) tuples, empty buckets included.
+        """
+        seconds = BUCKETS[bucket]
+        with self._lock:
+            camera_id = self._index['cameras'].get(camera, -1) if camera is not None else None
+            place_id = self._index['places'].get(place, -1) if place is not None else None
+            key = (camera_id, place_id)
+            rollup = self.rollups[bucket]
+            rows = []
+            for index in range(int(start // seconds), int(np.ceil(end / seconds))):
+                count_in, count_out = rollup.get(index, {}).get(key, (0, 0))
+                rows.append((index * seconds, count_in, count_out))
+        return rows
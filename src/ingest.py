@@ -0,0 +1,248 @@
+# src/ingest.py
+"""
+Video capture in separate processes, handing frames over through shared memory.
+
+A CaptureProcess opens the source in its own process and decodes into a
+FrameRing, a ring of frame slots in multiprocessing.shared_memory. The
+process that counts reads each frame as a NumPy view of its slot, so frames
+are never pickled, and a slow detector call no longer stalls cap.read().
+
+Live sources (cameras, RTSP/HTTP streams) use latest-frame-wins: capture
+never waits, the oldest unread frame is overwritten and the reader always
+gets the newest one. Files are lossless: capture waits for a free slot. The
+frames a live reader never saw are reported with every frame as dropped, so
+the tracker can take one prediction step per lost frame.
+"""
+import multiprocessing
+import queue
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from src.pipeline import FramePacket, read_frames, request_size
+
+# int64 header fields, followed by the frame index held in each slot
+_WRITE, _READ, _LATEST_SLOT, _PINNED, _CLOSED, _STOP = range(6)
+_HEADER = 8
+
+READY_TIMEOUT = 60  # seconds to wait for a capture process to deliver its first frame
+
+def is_live(source):
+    """Whether source is a camera index or a network stream rather than a file."""
+    return str(source).isdigit() or '://' in str(source)
+
+class FrameRing:
+    """
+    Fixed-shape uint8 frames in a shared-memory ring, for one writer and one reader.
+
+    The writer put()s frames with their index; the reader get()s them as views
+    of the shared memory, valid until its next get() or release(). With
+    latest=False every frame is delivered in order and put() waits while all
+    slots are unread. With latest=True put() never waits: it writes to a slot
+    that is neither being read nor the newest, and get() skips straight to
+    the newest frame. cond is a multiprocessing Condition shared by both ends.
+    """
+
+    def __init__(self, shm, shape, slots, latest, cond, owner):
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.latest = latest
+        self._shm = shm
+        self._cond = cond
+        self._owner = owner
+        header_bytes = (_HEADER + slots) * 8
+        self._header = np.ndarray((_HEADER + slots,), dtype=np.int64, buffer=shm.buf)
+        self._frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=shm.buf, offset=header_bytes)
+        self._next_slot = 0  # writer's round-robin position for latest=True
+        self._seen = 0  # reader's count of published frames already looked at
+        self._last_index = -1
+
+    @classmethod
+    def create(cls, shape, slots, latest, cond):
+        size = (_HEADER + slots) * 8 + slots * int(np.prod(shape))
+        ring = cls(shared_memory.SharedMemory(create=True, size=size), shape, slots, latest, cond, owner=False)
+        ring._header[:] = 0
+        ring._header[[_LATEST_SLOT, _PINNED]] = -1
+        return ring
+
+    @classmethod
+    def attach(cls, name, shape, slots, latest, cond):
+        """Open a ring made by another process; this end unlinks it on close()."""
+        return cls(shared_memory.SharedMemory(name=name), shape, slots, latest, cond, owner=True)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def put(self, index, frame):
+        """Copy frame into a free slot; returns False once the reader has asked to stop."""
+        h = self._header
+        with self._cond:
+            if self.latest:
+                for _ in range(self.slots):
+                    slot = self._next_slot
+                    self._next_slot = (slot + 1) % self.slots
+                    if slot != h[_PINNED] and slot != h[_LATEST_SLOT]:
+                        break
+            else:
+                while h[_WRITE] - h[_READ] >= self.slots and not h[_STOP]:
+                    self._cond.wait()
+                slot = h[_WRITE] % self.slots
+            if h[_STOP]:
+                return False
+            h[_HEADER + slot] = -1  # being written
+        np.copyto(self._frames[slot], frame)
+        with self._cond:
+            h[_HEADER + slot] = index
+            h[_LATEST_SLOT] = slot
+            h[_WRITE] += 1
+            self._cond.notify_all()
+        return True
+
+    def close_writer(self):
+        """Tell the reader no more frames are coming."""
+        with self._cond:
+            self._header[_CLOSED] = 1
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """
+        The next frame as (index, view, dropped), or None once the writer has closed.
+
+        dropped is the number of frames skipped since the previous get() (always
+        0 unless latest). Raises queue.Empty if no frame arrives within timeout.
+        """
+        h = self._header
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._unpin()
+            while (h[_WRITE] <= self._seen) if self.latest else (h[_WRITE] <= h[_READ]):
+                if h[_CLOSED]:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self._cond.wait(remaining)
+            if self.latest:
+                slot = int(h[_LATEST_SLOT])
+                self._seen = int(h[_WRITE])
+            else:
+                slot = int(h[_READ] % self.slots)
+            h[_PINNED] = slot
+            index = int(h[_HEADER + slot])
+        dropped = max(0, index - self._last_index - 1)
+        self._last_index = index
+        return index, self._frames[slot], dropped
+
+    def release(self):
+        """Hand the slot of the last get() back to the writer."""
+        with self._cond:
+            self._unpin()
+
+    def _unpin(self):
+        if self._header[_PINNED] >= 0:
+            if not self.latest:
+                self._header[_READ] += 1
+            self._header[_PINNED] = -1
+            self._cond.notify_all()
+
+    def stop(self):
+        """Ask the writer to stop."""
+        with self._cond:
+            self._header[_STOP] = 1
+            self._cond.notify_all()
+
+    def close(self):
+        del self._header, self._frames  # views must go before the mapping can close
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+def _capture_main(source, resize, latest, slots, cond, replies, start, stop):
+    """Capture process: decode source into a new FrameRing until it ends or the reader stops."""
+    cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    ring = None
+    try:
+        if not cap.isOpened():
+            replies.put(('error', f"Couldn't open video source {source}"))
+            return
+        if resize and str(source).isdigit():
+            request_size(cap, resize)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        for index, frame in enumerate(read_frames(cap, resize, start=start, stop=stop)):
+            if ring is None:
+                ring = FrameRing.create(frame.shape, slots, latest, cond)
+                replies.put(('ready', ring.name, frame.shape, fps))
+            if not ring.put(index, frame):
+                break
+        if ring is None:
+            replies.put(('error', f"No frames in video source {source}"))
+    finally:
+        cap.release()
+        if ring is not None:
+            ring.close_writer()
+            ring.close()
+
+class CaptureProcess:
+    """
+    A video source decoded in its own process into a FrameRing.
+
+    latest defaults to True for live sources and False for files. Iterate
+    over packets() for FramePackets with copied frames (for a Pipeline), or
+    call get() and release() to work on the shared frames in place. resize,
+    start and stop are as for read_frames.
+    """
+
+    def __init__(self, source, latest=None, slots=4, resize=None, start=0, stop=None):
+        self.source = source
+        self.latest = is_live(source) if latest is None else latest
+        ctx = multiprocessing.get_context('spawn')
+        cond = ctx.Condition()
+        replies = ctx.Queue()
+        self.process = ctx.Process(target=_capture_main, daemon=True,
+                                   args=(source, resize, self.latest, slots, cond, replies, start, stop))
+        self.process.start()
+        try:
+            reply = replies.get(timeout=READY_TIMEOUT)
+        except queue.Empty:
+            self.process.terminate()
+            raise ValueError(f"Video source {source} delivered no frame within {READY_TIMEOUT}s")
+        if reply[0] == 'error':
+            self.process.join()
+            raise ValueError(reply[1])
+        _, name, shape, self.fps = reply
+        self.ring = FrameRing.attach(name, shape, slots, self.latest, cond)
+        self.shape = tuple(shape)
+        self.dropped = 0
+
+    def get(self, timeout=None):
+        """(index, frame view, dropped) of the next frame; None at the end. See FrameRing.get."""
+        item = self.ring.get(timeout)
+        if item is not None:
+            self.dropped += item[2]
+        return item
+
+    def release(self):
+        self.ring.release()
+
+    def packets(self, first_index=0):
+        """FramePackets of the source in order, each frame copied out of the ring, numbered from first_index."""
+        while True:
+            item = self.get()
+            if item is None:
+                return
+            index, frame, dropped = item
+            packet = FramePacket(first_index + index, frame.copy())
+            packet.dropped = dropped
+            self.release()
+            yield packet
+
+    def close(self):
+        """Stop capturing and free the shared memory."""
+        self.ring.stop()
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.ring.close()
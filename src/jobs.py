@@ -0,0 +1,463 @@
+# src/jobs.py
+import atexit
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from src.detector import PersonDetector
+from src.backends import IMAGE_SIZE, exported_model, fork_safe
+from src.tracker import ObjectTracker
+from src.counter import PersonCounter
+from src.motion import MotionGate
+from src.scheduler import DetectionScheduler, forget_after
+from src.pipeline import build_video_pipeline, crossing_events
+from src.encoder import VideoEncoder
+from src.visualization import Visualizer
+from src.metrics import REGISTRY, combine
+from src.checkpoint import Checkpointer, checkpoint_events, events_path, load_checkpoint, resume
+
+PROGRESS_EVERY = 25  # frames between progress reports
+
+_FIRST_FRAME = REGISTRY.histogram('footfall_time_to_first_frame_seconds',
+                                  'Seconds from a worker taking a job to its first processed frame')
+
+def process_video(video_path, job_id, detector, output_folder='output', counts_only=False,
+                  motion_gate=False, progress=None, detect_every=1, checkpoint=None, checkpoint_every=5.0,
+                  started=None):
+    """
+    Process video and count people, returning the job's results.
+
+    With counts_only nothing is drawn or encoded; the results carry the counts
+    and crossing events but no output video. With motion_gate static frames
+    skip the detector while nobody is tracked. progress, if given, is called
+    as progress(frames_processed, total_frames) every PROGRESS_EVERY frames;
+    total_frames is None when the source cannot tell (a streamed upload).
+    detect_every runs the detector on every Nth frame only; in a counts-only
+    job the frames in between are not even converted to images. checkpoint
+    is a path where tracker, counter and frame position are saved every
+    checkpoint_every seconds. If an interrupted run left a checkpoint there,
+    the job carries on from it, writing the rest of its video to a file of
+    its own; the checkpoint is deleted once the job has completed or failed.
+    The time from started (a time.perf_counter() value, by default the call)
+    to the first processed frame is reported as time_to_first_frame.
+    """
+    started = time.perf_counter() if started is None else started
+    first_frame = None
+    cap = out = packets = checkpointer = None
+    finished = False
+    try:
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError("Could not open video file")
+
+        # Initialize per-job components; the detector is shared
+        tracker = ObjectTracker()
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        line_y = int(height * 0.5)  # Line in the middle
+        counter = PersonCounter(line_y, forget_after=forget_after(detect_every))
+        gate = MotionGate() if motion_gate else None
+        scheduler = DetectionScheduler(detect_every) if detect_every > 1 else None
+
+        # Carry on where an interrupted run of this job stopped
+        resumed, first_index = None, 0
+        if checkpoint is not None:
+            resumed = load_checkpoint(checkpoint)
+            if resumed is not None:
+                if resumed['meta'] != {'video': video_path}:
+                    raise ValueError(f"Checkpoint {checkpoint} is not of {video_path}")
+                first_index = resume(resumed, tracker, counter)
+            checkpointer = Checkpointer(checkpoint, tracker, counter, interval=checkpoint_every,
+                                        meta={'video': video_path}, resumed=resumed)
+
+        # Process video
+        frame_count = first_index
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        if total_frames <= 0:
+            total_frames = None
+        events = checkpoint_events(checkpoint, resumed) if resumed is not None else []
+
+        # Prepare output video
+        output_video = f"processed_{job_id}_from{first_index}.avi" if first_index else f"processed_{job_id}.avi"
+        if not counts_only:
+            output_path = os.path.join(output_folder, output_video)
+            out = VideoEncoder(output_path, fps, (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                                                  int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))))
+
+        # Nothing is displayed, so frames go straight from the encoder's pool to its queue
+        pipeline = build_video_pipeline(cap, detector, tracker, counter, line_y, writer=out,
+                                        annotate=not counts_only, gate=gate, scheduler=scheduler,
+                                        keep_annotated=False, start=first_index, first_index=first_index,
+                                        checkpoint=checkpointer)
+        packets = iter(pipeline)
+        for packet in packets:
+            if first_frame is None:
+                first_frame = time.perf_counter() - started
+                _FIRST_FRAME.observe(first_frame)
+            events.extend(crossing_events(packet))
+            frame_count += 1
+            if progress is not None and frame_count % PROGRESS_EVERY == 0:
+                progress(frame_count, total_frames)
+
+        if out is not None:
+            out.release()
+        if checkpointer is not None:
+            checkpointer.close(remove=True)
+        finished = True
+
+        return {
+            'status': 'completed',
+            'count_in': counter.count_in,
+            'count_out': counter.count_out,
+            'net_occupancy': counter.count_in - counter.count_out,
+            'lines': counter.counts_by_name(),
+            'processed_frames': frame_count,
+            'total_frames': total_frames,
+            'fps': fps,
+            'output_video': None if counts_only else output_video,
+            'resumed_from': first_index if resumed is not None else None,
+            'time_to_first_frame': round(first_frame, 4) if first_frame is not None else None,
+            'events': events,
+            'pipeline': pipeline.stats(),
+            'motion_gate': gate.stats() if gate is not None else None,
+            'encoder': out.stats() if out is not None else None,
+            'completion_time': datetime.now().isoformat()
+        }
+
+    except Exception as e:
+        return {
+            'status': 'failed',
+            'error': str(e),
+            'completion_time': datetime.now().isoformat()
+        }
+
+    finally:
+        # Workers run many jobs, so a failed one must not leave its pipeline
+        # and encoder threads running or its capture and files open
+        if packets is not None:
+            packets.close()
+        if cap is not None:
+            cap.release()
+        if out is not None and not finished:
+            try:
+                out.release()
+            except Exception:
+                pass  # the job has already failed
+        if checkpointer is not None and not finished:
+            try:
+                checkpointer.close(remove=True)  # a failed job is not retried
+            except Exception:
+                pass
+
+def warm_up(detector):
+    """
+    Pay every one-off startup cost before the first job: one dummy inference,
+    two tracker updates (the second imports scipy for its association) and
+    one overlay, whose first drawing sets up OpenCV's colormap and fonts.
+    Returns the seconds it took.
+    """
+    start = time.perf_counter()
+    if detector is not None:
+        detector.warmup()
+    tracker = ObjectTracker()
+    for _ in range(2):
+        tracks = tracker.update([[0, 0, 10, 20, 0.9]])
+    frame = np.zeros((IMAGE_SIZE, IMAGE_SIZE, 3), dtype=np.uint8)  # large enough to start OpenCV's threads
+    Visualizer(frame.shape).draw_overlays(frame, tracks, IMAGE_SIZE // 2, 0, 0)
+    return time.perf_counter() - start
+
+def _run_job(detector, job, results, output_folder, motion_gate, checkpoint_dir, checkpoint_every, started):
+    """Process one queued job, reporting its status, progress and result on results."""
+    job_id, video_path, counts_only, detect_every = job
+    results.put((job_id, {'status': 'processing', 'start_time': datetime.now().isoformat()}))
+
+    def progress(frames, total):
+        results.put((job_id, {'progress': {'frames_processed': frames, 'total_frames': total}}))
+        results.put((None, {'worker': os.getpid(), 'metrics': REGISTRY.snapshot()}))
+
+    # Streamed uploads cannot be read again, so only files are checkpointed
+    checkpoint = None
+    if checkpoint_dir is not None and os.path.isfile(video_path):
+        checkpoint = os.path.join(checkpoint_dir, f"{job_id}.npz")
+    result = process_video(video_path, job_id, detector, output_folder, counts_only, motion_gate, progress,
+                           detect_every, checkpoint, checkpoint_every, started)
+    if result['status'] == 'completed':
+        result['progress'] = {'frames_processed': result['processed_frames'],
+                              'total_frames': result['processed_frames']}
+    results.put((job_id, result))
+
+def _worker_main(model_path, output_folder, jobs, results, motion_gate=False, backend='ultralytics', int8=False,
+                 checkpoint_dir=None, checkpoint_every=5.0):
+    """Worker process: load and warm up the model once, then process jobs until told to stop."""
+    detector = PersonDetector(model_path=model_path, backend=backend, int8=int8)
+    warm_up(detector)
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        _run_job(detector, job, results, output_folder, motion_gate, checkpoint_dir, checkpoint_every,
+                 time.perf_counter())
+        results.put((None, {'worker': os.getpid(), 'metrics': REGISTRY.snapshot()}))
+
+def _single_threaded():
+    """
+    Make OpenCV and PyTorch (if loaded) run on the calling thread alone, so
+    that no thread pools exist when the fork server forks; a lock held by a
+    pool thread at fork() would stay locked forever in the child. Returns
+    the previous thread counts, for _restore_threads in the children.
+    """
+    threads = {'cv2': cv2.getNumThreads()}
+    cv2.setNumThreads(0)
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        threads['torch'] = torch.get_num_threads()
+        torch.set_num_threads(1)
+    return threads
+
+def _restore_threads(threads):
+    cv2.setNumThreads(threads['cv2'])
+    if 'torch' in threads:
+        sys.modules['torch'].set_num_threads(threads['torch'])
+
+def _job_child(detector, job, results, output_folder, motion_gate, checkpoint_dir, checkpoint_every, started,
+               model_path, backend, int8, threads):
+    """A fork server's child: process one job with the server's warm detector, then exit."""
+    REGISTRY.reset()  # the server's warm-up and earlier jobs are not this process's work
+    _restore_threads(threads)  # pools started now belong to this process alone
+    if detector is None:
+        detector = PersonDetector(model_path=model_path, backend=backend, int8=int8)
+    _run_job(detector, job, results, output_folder, motion_gate, checkpoint_dir, checkpoint_every, started)
+    results.put((None, {'worker': os.getpid(), 'metrics': REGISTRY.snapshot(), 'final': True}))
+
+def _fork_server_main(model_path, output_folder, jobs, results, motion_gate=False, backend='ultralytics',
+                      int8=False, checkpoint_dir=None, checkpoint_every=5.0, max_children=2):
+    """
+    Fork server: load and warm up the model once, then fork a process per job.
+
+    Every child starts with the server's imports, loaded weights (shared
+    copy-on-write) and warmed-up runtime, so it reaches its first frame
+    without loading anything. At most max_children jobs run at a time.
+    Inference runs on the CPU: GPUs are hidden from the server, as CUDA
+    cannot be used after fork(). The server warms up single-threaded so
+    that it forks without thread pools; each child restores the thread
+    counts. ONNX Runtime and OpenVINO models are not loaded in the server
+    at all (see backends.fork_safe), but by each child.
+    """
+    os.environ['CUDA_VISIBLE_DEVICES'] = ''  # before the model's runtime is imported
+    detector = PersonDetector(model_path=model_path, backend=backend, int8=int8) if fork_safe(backend) else None
+    threads = _single_threaded()
+    warm_up(detector)
+    parent = multiprocessing.parent_process()
+    fork = multiprocessing.get_context('fork')
+    children = []
+    while parent.is_alive():
+        while len(children) >= max_children:
+            multiprocessing.connection.wait([child.sentinel for child in children])
+            children = [child for child in children if child.is_alive()]
+        try:
+            job = jobs.get(timeout=1)
+        except queue.Empty:
+            continue  # a pool that died without shutdown() stops the server
+        if job is None:
+            break
+        child = fork.Process(target=_job_child, daemon=True,
+                             args=(detector, job, results, output_folder, motion_gate, checkpoint_dir,
+                                   checkpoint_every, time.perf_counter(), model_path, backend, int8, threads))
+        child.start()
+        children.append(child)
+    for child in children:
+        child.join()
+
+class JobPool:
+    """
+    Fixed pool of worker processes, each holding a warm PersonDetector.
+
+    Jobs wait in a bounded queue; submit raises queue.Full once it holds
+    max_queued jobs, so a burst of uploads cannot create unbounded work.
+    Status updates from the workers are collected into self.results by a
+    background thread. motion_gate is passed on to every process_video call.
+    With an EventLog, the crossing events of every completed job are appended
+    to it, timed from the job's recorded_at (epoch seconds, given to submit)
+    or else its submit time. backend and int8 select the workers' inference
+    runtime (see PersonDetector). Workers send their metrics with every
+    progress report; metrics() adds them up.
+
+    With a checkpoint_dir, every uploaded file's job is recorded there until
+    it completes or fails, and workers checkpoint their progress next to it
+    every checkpoint_every seconds. start() queues the jobs an earlier pool
+    left unfinished again, and they resume from their last checkpoint.
+
+    With fork_server, a single server process loads and warms up the model
+    and forks a fresh process for every job, num_workers at a time, instead
+    of keeping num_workers long-lived workers. Each job starts in a clean
+    process with the warm model, in milliseconds. Workers are forked, so
+    this needs a POSIX server, and inference runs on the CPU (CUDA cannot
+    be used again in a forked process).
+    """
+
+    def __init__(self, num_workers=2, max_queued=8, model_path='yolov8n.pt', output_folder='output',
+                 motion_gate=False, event_log=None, backend='ultralytics', int8=False, checkpoint_dir=None,
+                 checkpoint_every=5.0, fork_server=False):
+        self.num_workers = num_workers
+        self.max_queued = max_queued
+        self.model_path = model_path
+        self.output_folder = output_folder
+        self.motion_gate = motion_gate
+        self.event_log = event_log
+        self.backend = backend
+        self.int8 = int8
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_every = checkpoint_every
+        self.fork_server = fork_server
+        self.results = {}
+        self._worker_metrics = {}  # pid -> latest REGISTRY snapshot of that worker
+        self._retired_metrics = {}  # combined final snapshots of exited fork server children
+        self._lock = threading.Lock()
+        # spawn: workers must not inherit the server's threads or torch state
+        self._ctx = multiprocessing.get_context('spawn')
+        self._jobs = self._ctx.Queue(maxsize=max_queued)
+        self._updates = self._ctx.Queue()
+        self._workers = []
+        self._collector = None
+
+    def start(self):
+        if self.backend != 'ultralytics':
+            # Export once here rather than racing to export in every worker
+            exported_model(self.model_path, self.backend, self.int8)
+        args = (self.model_path, self.output_folder, self._jobs, self._updates, self.motion_gate, self.backend,
+                self.int8, self.checkpoint_dir, self.checkpoint_every)
+        if self.fork_server:
+            # Not a daemon, as daemons may not have children; it exits with
+            # shutdown(), or by itself once this process has gone
+            server = self._ctx.Process(target=_fork_server_main, args=args + (self.num_workers,))
+            server.start()
+            self._workers.append(server)
+            atexit.register(self._stop_server, server)
+        for _ in range(0 if self.fork_server else self.num_workers):
+            worker = self._ctx.Process(target=_worker_main, args=args, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+        unfinished = self._unfinished_jobs()
+        if unfinished:
+            # The queue is bounded, so wait for room off the caller's thread
+            threading.Thread(target=self._requeue, args=(unfinished,), daemon=True).start()
+
+    def submit(self, job_id, video_path, counts_only=False, detect_every=1, **info):
+        """Queue a job; raises queue.Full when the pool is saturated. info is added to its status."""
+        with self._lock:
+            self._jobs.put_nowait((job_id, video_path, counts_only, detect_every))
+            self.results[job_id] = {'status': 'queued', 'submit_time': datetime.now().isoformat(),
+                                    'recorded_at': time.time(), **info}
+            if self.checkpoint_dir is not None and os.path.isfile(video_path):
+                with open(self._job_path(job_id), 'w') as f:
+                    json.dump({'job': [job_id, video_path, counts_only, detect_every],
+                               'status': self.results[job_id]}, f)
+
+    def update(self, job_id, **info):
+        """Add or replace fields of a job's status, such as upload progress."""
+        with self._lock:
+            self.results[job_id] = {**self.results.get(job_id, {}), **info}
+
+    def status(self, job_id):
+        with self._lock:
+            return self.results.get(job_id)
+
+    def pending(self):
+        """Number of jobs queued or being processed."""
+        with self._lock:
+            return sum(r['status'] in ('queued', 'processing') for r in self.results.values())
+
+    def metrics(self):
+        """Combined metrics snapshot of all workers, plus job counts by state."""
+        with self._lock:
+            snapshots = list(self._worker_metrics.values()) + [self._retired_metrics]
+            states = [r['status'] for r in self.results.values()]
+        jobs = {'type': 'gauge', 'help': 'API jobs by state',
+                'series': {(('state', state),): states.count(state)
+                           for state in ('queued', 'processing', 'completed', 'failed')}}
+        return {**combine(snapshots), 'footfall_jobs': jobs}
+
+    def _job_path(self, job_id):
+        return os.path.join(self.checkpoint_dir, f"{job_id}.json")
+
+    def _forget(self, job_id):
+        """Delete a finished job's record and any checkpoint it left."""
+        if self.checkpoint_dir is None:
+            return
+        checkpoint = os.path.join(self.checkpoint_dir, f"{job_id}.npz")
+        for path in (self._job_path(job_id), checkpoint, events_path(checkpoint)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _unfinished_jobs(self):
+        """Jobs recorded in checkpoint_dir by an earlier pool, oldest first, marked queued again."""
+        if self.checkpoint_dir is None:
+            return []
+        jobs = []
+        for name in os.listdir(self.checkpoint_dir):
+            if not name.endswith('.json'):
+                continue
+            with open(os.path.join(self.checkpoint_dir, name)) as f:
+                record = json.load(f)
+            job_id, video_path = record['job'][:2]
+            if not os.path.isfile(video_path):
+                self._forget(job_id)
+                continue
+            with self._lock:
+                self.results[job_id] = {**record['status'], 'status': 'queued', 'resumed': True}
+            jobs.append(tuple(record['job']))
+        return sorted(jobs, key=lambda job: self.results[job[0]]['submit_time'])
+
+    def _requeue(self, jobs):
+        for job in jobs:
+            self._jobs.put(job)
+
+    @staticmethod
+    def _stop_server(server):
+        """At exit, stop a fork server that shutdown() did not, rather than wait for it."""
+        if server.is_alive():
+            server.terminate()
+            server.join()
+
+    def shutdown(self):
+        for _ in self._workers:
+            self._jobs.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._updates.put(None)
+        self._collector.join()
+
+    def _collect(self):
+        while True:
+            update = self._updates.get()
+            if update is None:
+                break
+            job_id, result = update
+            if job_id is None:
+                with self._lock:
+                    if result.get('final'):
+                        # A fork server child has exited; keep its totals, not its series
+                        self._worker_metrics.pop(result['worker'], None)
+                        self._retired_metrics = combine([self._retired_metrics, result['metrics']])
+                    else:
+                        self._worker_metrics[result['worker']] = result['metrics']
+                continue
+            with self._lock:
+                job = self.results[job_id] = {**self.results.get(job_id, {}), **result}
+            if result.get('status') in ('completed', 'failed'):
+                self._forget(job_id)
+            if self.event_log is not None and result.get('status') == 'completed':
+                self.event_log.append(job.get('camera', 'upload'),
+                                      [{**event, 'time': job['recorded_at'] + event['frame'] / job['fps']}
+                                       for event in job['events']])
@@ -1,6 +1,10 @@
 # src/main.py
+import time
+STARTED = time.perf_counter()  # time to first frame is measured from here
+
 import cv2
 import argparse
+import json
 import os
 import sys
 
@@ -11,7 +15,18 @@ sys.path.append(project_root)
 from src.detector import PersonDetector
 from src.tracker import ObjectTracker
 from src.counter import PersonCounter
-from src.visualization import draw_overlays
+from src.scheduler import DetectionScheduler, forget_after
+from src.roi import RegionDetector
+from src.motion import MotionGate
+from src.cache import DetectionCache, video_key
+from src.events import EventLog
+from src.encoder import VideoEncoder
+from src.ingest import CaptureProcess
+from src.metrics import REGISTRY, stage_report
+from src.checkpoint import Checkpointer, checkpoint_events, load_checkpoint, resume
+from src.pipeline import build_video_pipeline, crossing_events, replay_detections, request_size
+
+IMPORTED = time.perf_counter()
 
 def ensure_dir(path):
     if not os.path.exists(path):
@@ -28,57 +43,272 @@ def main(args):
         print(f"Error: Couldn't open video source {args.input}")
         return
 
+    # Cameras can often deliver the smaller size directly instead of it being resized
+    resize = (640, 480) if args.resize else None
+    if resize and args.input.isdigit():
+        request_size(cap, resize)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    start_frame = int(args.start * fps)
+    stop_frame = int(args.end * fps) if args.end else None
+    live = args.input.isdigit() or '://' in args.input
+
+    # Carry on from the last checkpoint of an interrupted run of the same video
+    resumed, first_index = None, 0
+    run_info = {'input': args.input, 'start': start_frame}
+    if args.resume and not args.checkpoint:
+        print("Error: --resume needs --checkpoint PATH")
+        return
+    if args.resume:
+        try:
+            resumed = load_checkpoint(args.checkpoint)
+        except (OSError, ValueError) as e:
+            print(f"Error: Couldn't read checkpoint {args.checkpoint}: {e}")
+            return
+        if resumed is None:
+            print(f"No checkpoint at {args.checkpoint}, starting from the beginning")
+        elif resumed['meta'] != run_info:
+            print(f"Error: {args.checkpoint} is a checkpoint of {resumed['meta']}, not of {run_info}")
+            return
+        else:
+            first_index = resumed['frame']
+    # Files seek to the first unprocessed frame; live sources just carry on
+    seek_frame = start_frame + (0 if live else first_index)
+
+    # Decode in a separate process, handing frames over through shared memory
+    ingest = None
+    if args.ingest_process:
+        cap.release()  # the capture process opens the source itself
+        try:
+            ingest = CaptureProcess(args.input, resize=resize, start=seek_frame, stop=stop_frame)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+
+    # Reuse detections from an earlier run of the same video, model and threshold
+    cached, cache_writer = None, None
+    if args.cache and args.input.isdigit():
+        print("Warning: --cache needs a video file and is ignored for cameras")
+    elif args.cache and (args.start or args.end or resumed is not None):
+        print("Warning: --cache covers whole videos and is ignored with --start/--end or when resuming")
+    elif args.cache:
+        cache = DetectionCache(args.cache, max_bytes=args.cache_size * 1024 * 1024)
+        key = video_key(args.input, args.model, args.conf, resize, args.backend, args.int8)
+        cached = cache.get(key)
+        if cached is not None:
+            print(f"Using {len(cached)} cached frames of detections")
+        elif args.detect_every > 1 or args.motion_gate or args.roi:
+            print("Note: detections are only cached by runs that detect on every full frame")
+        else:
+            cache_writer = cache.writer(key)
+
     # Initialize components
-    detector = PersonDetector(model_path=args.model)
+    model_start = time.perf_counter()
+    detector = PersonDetector(model_path=args.model, conf_threshold=args.conf, backend=args.backend,
+                              int8=args.int8) if cached is None else None
+    model_seconds = time.perf_counter() - model_start
     tracker = ObjectTracker()
     
-    # Set line position
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    line_y = args.line if args.line else int(height * 0.5)
-    counter = PersonCounter(line_y)
+    # Set line position; extra segments/zones replace the default middle line
+    if ingest is not None:
+        height = ingest.shape[0]
+    else:
+        height = resize[1] if resize else int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    segments = [((x1, y1), (x2, y2)) for x1, y1, x2, y2 in args.segment or []]
+    zones = [[tuple(int(v) for v in point.split(',')) for point in zone] for zone in args.zone or []]
+    if args.line:
+        line_y = args.line
+    elif segments or zones:
+        line_y = None
+    else:
+        line_y = int(height * 0.5)
+    if args.adaptive_stride and line_y is None:
+        print("Error: --adaptive-stride needs a horizontal counting line (--line)")
+        return
+    counter = PersonCounter(line_y, lines=segments, zones=zones, forget_after=forget_after(args.detect_every))
+    if resumed is not None:
+        try:
+            resume(resumed, tracker, counter)
+        except ValueError as e:
+            print(f"Error: {args.checkpoint} was taken with other counting lines: {e}")
+            return
+        print(f"Resuming from frame {first_index} of {args.checkpoint}: "
+              f"In {counter.count_in}, Out {counter.count_out}, {len(tracker.trackers)} tracks")
+    event_log = EventLog(args.event_log) if args.event_log else None
+    checkpointer = None
+    if args.checkpoint:
+        log_start = None
+        if event_log is not None:
+            log_start = event_log.events
+            if resumed is not None and resumed['log_start'] is not None:
+                log_start = resumed['log_start']
+        checkpointer = Checkpointer(args.checkpoint, tracker, counter, interval=args.checkpoint_every,
+                                    meta=run_info, resumed=resumed, log_start=log_start)
+    if args.roi and detector is not None:
+        detector = RegionDetector(detector, counter, margin=args.roi_margin)
+    scheduler = DetectionScheduler(args.detect_every, adaptive=args.adaptive_stride, line_y=line_y)
+    gate = None
+    if args.motion_gate and cached is None:
+        gate = MotionGate(threshold=args.motion_threshold, min_area=args.motion_area,
+                          heartbeat=args.heartbeat)
+
+    if args.counts_only and args.save:
+        print("Warning: --save is ignored with --counts-only")
+        args.save = False
 
     # Prepare output video
     if args.save:
         ensure_dir('output')
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        out = cv2.VideoWriter(args.output, fourcc, 30.0, (width, height))
-
-    print("Press 'q' to quit")
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        if args.resize:
-            frame = cv2.resize(frame, (640, 480))
-
-        # Process frame
-        detections = detector.detect(frame)
-        tracks = tracker.update(detections)
-        count_in, count_out = counter.update_counts(tracks)
-        annotated = draw_overlays(frame, tracks, line_y, count_in, count_out)
-
-        # Display and save
-        cv2.imshow('Footfall Counter', annotated)
+        if ingest is not None:
+            size = (ingest.shape[1], ingest.shape[0])
+        else:
+            size = resize or (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        output = args.output
+        if first_index:
+            # The video up to the checkpoint is already in args.output
+            root, ext = os.path.splitext(args.output)
+            output = f"{root}_from{first_index}{ext}"
+            print(f"Saving the resumed part of the video to {output}")
+        out = VideoEncoder(output, fps, size, codec=args.codec, scale=args.output_scale,
+                           every=args.output_every)
+
+    if not args.counts_only:
+        print("Press 'q' to quit")
+    if cached is not None and args.counts_only:
+        # Nothing to draw, so the video need not even be decoded
+        pipeline = None
+        packets = replay_detections(cached, tracker, counter)
+    else:
+        pipeline = packets = build_video_pipeline(cap, detector, tracker, counter, line_y,
+                                                  writer=out if args.save else None,
+                                                  resize=resize,
+                                                  queue_size=args.queue_size,
+                                                  scheduler=scheduler if cached is None else None,
+                                                  annotate=not args.counts_only,
+                                                  gate=gate,
+                                                  detections=cached,
+                                                  start=seek_frame,
+                                                  stop=stop_frame,
+                                                  live_fps=fps if live and ingest is None else None,
+                                                  source=ingest.packets(first_index) if ingest is not None else None,
+                                                  first_index=first_index,
+                                                  checkpoint=checkpointer)
+    # Live sources are timed by the wall clock, files from the start of the run
+    started_at = time.time() + start_frame / fps
+    camera = args.camera or args.input
+
+    # Only --counts-only keeps the events, for its JSON output
+    events = []
+    if args.counts_only and resumed is not None:
+        events = checkpoint_events(args.checkpoint, resumed)
+    # The interrupted run logged crossings as they reached this loop, which
+    # trails the checkpoints taken in the track stage: it may have logged
+    # crossings of frames that are processed again now, or not yet logged
+    # some that the checkpoint counted. Skip the first or log the second.
+    skip_logged = 0
+    if event_log is not None and checkpointer is not None and resumed is not None:
+        unlogged = resumed['events'] - (event_log.events - checkpointer.log_start)
+        if unlogged > 0:
+            event_log.append(camera, [{**event, 'time': time.time() if live else started_at + event['frame'] / fps}
+                                      for event in checkpoint_events(args.checkpoint, resumed,
+                                                                     start=resumed['events'] - unlogged)])
+        elif not live:  # a live source does not show the same crossings again
+            skip_logged = -unlogged
+    first_frame = None
+    frame_count = 0
+    stopped = False
+    start = time.perf_counter()
+    for packet in packets:
+        if first_frame is None:
+            first_frame = time.perf_counter() - STARTED
+        if args.counts_only:
+            events.extend(crossing_events(packet))
+        if event_log is not None and packet.events:
+            at = time.time() if live else started_at + packet.index / fps
+            logged = crossing_events(packet)
+            if skip_logged:
+                skipped = min(skip_logged, len(logged))
+                logged, skip_logged = logged[skipped:], skip_logged - skipped
+            event_log.append(camera, [{**event, 'time': at} for event in logged])
+        frame_count += 1
+        if cache_writer is not None:
+            cache_writer.append(packet.detections)
+        if args.counts_only:
+            continue
+
+        # Display
+        cv2.imshow('Footfall Counter', packet.annotated)
         if args.save:
-            out.write(annotated)
+            out.done(packet.annotated)  # the frame can go back to the encoder's pool
 
         if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+            stopped = True
+            pipeline.stop()  # loop ends once the pipeline has shut down
+    elapsed = time.perf_counter() - start
+
+    # Only a complete run is worth caching
+    if cache_writer is not None and not stopped:
+        cache_writer.commit()
+        print(f"Cached detections for {len(cache_writer)} frames in {args.cache}")
+
+    # A finished run leaves nothing to resume; a stopped one can carry on later
+    if checkpointer is not None:
+        checkpointer.close(remove=not stopped)
 
     # Cleanup
     cap.release()
+    if ingest is not None:
+        ingest.close()
     if args.save:
         out.release()
-    cv2.destroyAllWindows()
+    if not args.counts_only:
+        cv2.destroyAllWindows()
+
+    if args.counts_only:
+        ensure_dir(os.path.dirname(args.events) or '.')
+        with open(args.events, 'w') as f:
+            json.dump({
+                'count_in': counter.count_in,
+                'count_out': counter.count_out,
+                'net_occupancy': counter.count_in - counter.count_out,
+                'processed_frames': first_index + frame_count,
+                'resumed_from': first_index if resumed is not None else None,
+                'lines': counter.counts_by_name(),
+                'events': events
+            }, f, indent=2)
+        print(f"Counts and events written to {args.events}")
 
     # Print final counts
     print(f"\nFinal Counts:")
     print(f"Entries: {counter.count_in}")
     print(f"Exits: {counter.count_out}")
     print(f"Currently Inside: {counter.count_in - counter.count_out}")
+    if len(counter.counts_by_name()) > 1:
+        for name, counts in counter.counts_by_name().items():
+            print(f"  {name}: In {counts['in']}  Out {counts['out']}")
+    print()
+    if first_frame is not None:
+        print(f"Time to first frame: {first_frame:.3f}s (imports {IMPORTED - STARTED:.3f}s, "
+              f"model load {model_seconds:.3f}s, first inference and the rest "
+              f"{first_frame - (IMPORTED - STARTED) - model_seconds:.3f}s)")
+    if pipeline is None:
+        print(f"Replayed {frame_count} cached frames in {elapsed:.3f}s ({frame_count / max(elapsed, 1e-9):.0f} fps)")
+        return
+    print(pipeline.report())
+    if args.save:
+        print(out.report())
+    if checkpointer is not None:
+        print(checkpointer.report())
+    if args.profile:
+        print("\nPer-stage time per frame (stages overlap on their own threads):")
+        print(stage_report(REGISTRY.snapshot()))
+    if cached is not None:
+        return
+    detected = scheduler.detected - (gate.skipped if gate is not None else 0)
+    print(f"Detector ran on {detected} of {scheduler.detected + scheduler.skipped} frames")
+    if gate is not None:
+        print(gate.report())
+    if args.roi and detector.pixel_fraction() is not None:
+        print(f"Detector saw {detector.pixel_fraction():.0%} of each frame's pixels")
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Footfall Counter')
@@ -86,14 +316,79 @@ if __name__ == '__main__':
                       help='Path to video file or camera index (default: 0 for webcam)')
     parser.add_argument('--model', type=str, default='yolov8n.pt',
                       help='Path to YOLOv8 model file (default: yolov8n.pt)')
+    parser.add_argument('--conf', type=float, default=0.4,
+                      help='Detection confidence threshold (default: 0.4)')
+    parser.add_argument('--backend', choices=['ultralytics', 'onnx', 'openvino'], default='ultralytics',
+                      help='Inference runtime; onnx and openvino export the model to models/ on first use '
+                           '(default: ultralytics)')
+    parser.add_argument('--int8', action='store_true',
+                      help='Run an INT8-quantized export of the model (onnx and openvino backends)')
     parser.add_argument('--line', type=int,
                       help='Y-coordinate of counting line (default: middle of frame)')
+    parser.add_argument('--segment', type=int, nargs=4, action='append', metavar=('X1', 'Y1', 'X2', 'Y2'),
+                      help='Extra counting line from (X1, Y1) to (X2, Y2); crossing to its right when '
+                           'facing X2, Y2 is "in". Repeat for several lines')
+    parser.add_argument('--zone', type=str, nargs='+', action='append', metavar='X,Y',
+                      help='Polygon zone given as X,Y vertices; entering is "in". Repeat for several zones')
     parser.add_argument('--save', action='store_true',
                       help='Save output video')
     parser.add_argument('--output', type=str, default='output/processed_video.avi',
                       help='Output video path (default: output/processed_video.avi)')
+    parser.add_argument('--codec', type=str, default='XVID',
+                      help='FourCC of the saved video, e.g. XVID, MJPG or mp4v (default: XVID)')
+    parser.add_argument('--output-scale', type=float, default=1.0,
+                      help='Scale the saved video by this factor, e.g. 0.5 (default: 1.0)')
+    parser.add_argument('--output-every', type=int, default=1,
+                      help='Save only every Nth frame, for a short review clip (default: 1)')
     parser.add_argument('--resize', action='store_true',
                       help='Resize frames to 640x480')
+    parser.add_argument('--start', type=float, default=0.0,
+                      help='Seek to this many seconds into a video file before processing (default: 0)')
+    parser.add_argument('--end', type=float,
+                      help='Stop at this many seconds into the video (default: the end)')
+    parser.add_argument('--ingest-process', action='store_true',
+                      help='Decode in a separate process feeding a shared-memory ring; cameras and streams '
+                           'then always deliver their newest frame and drop the rest')
+    parser.add_argument('--checkpoint', type=str, metavar='PATH',
+                      help='Save tracker, counter and frame position to PATH every --checkpoint-every seconds; '
+                           'deleted once the video has been processed completely')
+    parser.add_argument('--checkpoint-every', type=float, default=5.0,
+                      help='Seconds between checkpoints (default: 5)')
+    parser.add_argument('--resume', action='store_true',
+                      help='Continue an interrupted run from its --checkpoint, if there is one')
+    parser.add_argument('--queue-size', type=int, default=8,
+                      help='Maximum frames waiting between pipeline stages (default: 8)')
+    parser.add_argument('--detect-every', type=int, default=1,
+                      help='Run the detector on every Nth frame and coast tracks in between (default: 1)')
+    parser.add_argument('--adaptive-stride', action='store_true',
+                      help='Vary the stride up to --detect-every, detecting every frame near the line')
+    parser.add_argument('--roi', action='store_true',
+                      help='Only run the detector on regions around the counting lines and zones')
+    parser.add_argument('--roi-margin', type=int, default=100,
+                      help='Pixels kept on each side of a line or zone with --roi (default: 100)')
+    parser.add_argument('--motion-gate', action='store_true',
+                      help='Skip the detector on static frames while nobody is tracked')
+    parser.add_argument('--motion-threshold', type=int, default=25,
+                      help='Gray-level change that counts as motion with --motion-gate (default: 25)')
+    parser.add_argument('--motion-area', type=float, default=0.002,
+                      help='Fraction of changed pixels that makes a frame moving (default: 0.002)')
+    parser.add_argument('--heartbeat', type=int, default=30,
+                      help='With --motion-gate, detect at least every Nth frame anyway (default: 30)')
+    parser.add_argument('--cache', type=str, metavar='DIR',
+                      help='Reuse detections cached in DIR for the same video, model, --conf and --resize; '
+                           'a complete run on a new video fills the cache')
+    parser.add_argument('--cache-size', type=int, default=1024,
+                      help='Size in MB above which the least recently used cache entries are evicted (default: 1024)')
+    parser.add_argument('--event-log', type=str, metavar='DIR',
+                      help='Append every crossing to the event log in DIR (see /counts in the API)')
+    parser.add_argument('--camera', type=str,
+                      help='Camera name recorded in the event log (default: the --input value)')
+    parser.add_argument('--profile', action='store_true',
+                      help='Print per-stage latency percentiles and time shares at the end of the run')
+    parser.add_argument('--counts-only', action='store_true',
+                      help='Only count: no drawing, display or video output; writes counts and events to --events')
+    parser.add_argument('--events', type=str, default='output/counts.json',
+                      help='Counts/events JSON path for --counts-only (default: output/counts.json)')
     
     args = parser.parse_args()
     main(args)
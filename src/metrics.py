@@ -0,0 +1,200 @@
+# src/metrics.py
+"""
+Always-on latency histograms, counters and gauges for the processing hot path.
+
+Every pipeline stage records its per-frame time into a histogram of the
+process-wide REGISTRY; an observation is a bisect over fixed bucket bounds
+and a few additions, well under a microsecond, so the hooks stay enabled in
+production. Snapshots are plain dicts, so worker processes can send theirs
+to the API, which adds them up and serves them in the Prometheus text format
+at /metrics. stage_report() turns a snapshot into main.py --profile's table.
+"""
+import bisect
+import threading
+
+# Bucket upper bounds in seconds: 0.1 ms doubling up to about 6.5 s
+LATENCY_BUCKETS = tuple(0.0001 * 2 ** i for i in range(17))
+
+STAGE_SECONDS = 'footfall_stage_seconds'
+
+class Histogram:
+    """Counts of observed values per bucket, with their sum and count."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value, n=1):
+        """Record value n times (n frames that took value seconds each)."""
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += n
+            self.sum += value * n
+            self.count += n
+
+    def snapshot(self):
+        with self._lock:
+            return {'counts': list(self.counts), 'sum': self.sum, 'count': self.count}
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * len(self.counts)
+            self.sum = 0.0
+            self.count = 0
+
+class Counter:
+    """A monotonically increasing total."""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+    def snapshot(self):
+        return self.value
+
+    def reset(self):
+        with self._lock:
+            self.value = 0
+
+class Gauge:
+    """A value that goes up and down, such as a queue depth."""
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def snapshot(self):
+        return self.value
+
+    def reset(self):
+        self.value = 0
+
+_KINDS = {'histogram': Histogram, 'counter': Counter, 'gauge': Gauge}
+
+class Registry:
+    """
+    Named metrics, one series per set of label values.
+
+    histogram(), counter() and gauge() return the series for the given labels,
+    creating it on first use; hot code looks its series up once and keeps it.
+    """
+
+    def __init__(self):
+        self._metrics = {}  # name -> (kind, help, {labels: series})
+        self._lock = threading.Lock()
+
+    def _series(self, kind, name, help, labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            metric = self._metrics.setdefault(name, (kind, help, {}))
+            if metric[0] != kind:
+                raise ValueError(f"{name} is a {metric[0]}, not a {kind}")
+            series = metric[2].get(key)
+            if series is None:
+                series = metric[2][key] = _KINDS[kind]()
+            return series
+
+    def histogram(self, name, help, **labels):
+        return self._series('histogram', name, help, labels)
+
+    def counter(self, name, help, **labels):
+        return self._series('counter', name, help, labels)
+
+    def gauge(self, name, help, **labels):
+        return self._series('gauge', name, help, labels)
+
+    def snapshot(self):
+        """{name: {'type', 'help', 'series': {labels: value}}}, picklable for sending between processes."""
+        with self._lock:
+            metrics = {name: (kind, help, dict(series)) for name, (kind, help, series) in self._metrics.items()}
+        return {name: {'type': kind, 'help': help,
+                       'series': {labels: s.snapshot() for labels, s in series.items()}}
+                for name, (kind, help, series) in metrics.items()}
+
+    def reset(self):
+        """Zero every series in place, e.g. in a process forked from one that already recorded some."""
+        with self._lock:
+            series = [s for _, _, by_labels in self._metrics.values() for s in by_labels.values()]
+        for s in series:
+            s.reset()
+
+REGISTRY = Registry()
+
+def stage_histogram(stage):
+    """The per-frame latency histogram of a pipeline stage in REGISTRY."""
+    return REGISTRY.histogram(STAGE_SECONDS, 'Seconds spent per frame in each processing stage', stage=stage)
+
+def combine(snapshots):
+    """Add up snapshots of several processes: histograms and counters sum, and so do gauges."""
+    combined = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = combined.setdefault(name, {'type': metric['type'], 'help': metric['help'], 'series': {}})
+            for labels, value in metric['series'].items():
+                current = target['series'].get(labels)
+                if metric['type'] != 'histogram':
+                    target['series'][labels] = (current or 0) + value
+                elif current is None:
+                    target['series'][labels] = {**value, 'counts': list(value['counts'])}
+                else:
+                    current['counts'] = [a + b for a, b in zip(current['counts'], value['counts'])]
+                    current['sum'] += value['sum']
+                    current['count'] += value['count']
+    return combined
+
+def _labels(pairs):
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}' if pairs else ''
+
+def render(snapshot, buckets=LATENCY_BUCKETS):
+    """Prometheus text exposition format of a snapshot."""
+    lines = []
+    for name, metric in sorted(snapshot.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for labels, value in sorted(metric['series'].items()):
+            if metric['type'] != 'histogram':
+                lines.append(f"{name}{_labels(labels)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], value['counts']):
+                cumulative += count
+                le = bound if bound == '+Inf' else f"{bound:.6g}"
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {value['sum']:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {value['count']}")
+    return '\n'.join(lines) + '\n'
+
+def quantile(value, q, buckets=LATENCY_BUCKETS):
+    """Approximate q-quantile of a histogram snapshot: the upper bound of the bucket it falls in."""
+    target, cumulative = q * value['count'], 0
+    for bound, count in zip(buckets, value['counts']):
+        cumulative += count
+        if cumulative >= target:
+            return bound
+    return float('inf')
+
+def stage_report(snapshot):
+    """Per-stage time breakdown of a snapshot, for main.py --profile."""
+    series = snapshot.get(STAGE_SECONDS, {}).get('series', {})
+    total = sum(value['sum'] for value in series.values()) or 1.0
+    lines = [f"{'stage':<10} {'frames':>8} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'total s':>9} {'share':>6}"]
+    for labels, value in sorted(series.items(), key=lambda item: -item[1]['sum']):
+        if not value['count']:
+            continue
+        lines.append(f"{dict(labels)['stage']:<10} {value['count']:>8} {value['sum'] / value['count'] * 1000:>9.3f} "
+                     f"{quantile(value, 0.5) * 1000:>8.2f} {quantile(value, 0.95) * 1000:>8.2f} "
+                     f"{value['sum']:>9.3f} {value['sum'] / total:>6.0%}")
+    for name, metric in sorted(snapshot.items()):
+        if name != STAGE_SECONDS:
+            for labels, value in sorted(metric['series'].items()):
+                lines.append(f"{name}{_labels(labels)} {value}")
+    return '\n'.join(lines)
@@ -0,0 +1,88 @@
+# src/motion.py
+import threading
+import time
+
+import cv2
+import numpy as np
+
+class MotionGate:
+    """
+    Cheap motion check that lets static frames bypass the detector.
+
+    Each frame is shrunk to `width` pixels wide, converted to gray, blurred and
+    compared with a running-average background. The frame counts as moving when
+    more than min_area of its pixels differ from the background by more than
+    threshold gray levels. A frame is sent to the detector when it moves, when
+    the tracker still has live tracks, or every heartbeat frames regardless, so
+    someone standing still since before the gate started is found eventually.
+    Frames must be checked in order.
+    """
+
+    def __init__(self, threshold=25, min_area=0.002, heartbeat=30, width=160, learning_rate=0.1):
+        if heartbeat < 1:
+            raise ValueError("heartbeat must be at least 1")
+        self.threshold = threshold
+        self.min_area = min_area
+        self.heartbeat = heartbeat
+        self.width = width
+        self.learning_rate = learning_rate
+        self.checked = 0
+        self.moving_frames = 0
+        self.skipped = 0
+        self.check_seconds = 0.0
+        self.detector_frames = 0
+        self.detector_seconds = 0.0
+        self._background = None
+        self._lock = threading.Lock()
+
+    def moving(self, frame):
+        """True if frame differs enough from the background; updates the background."""
+        start = time.perf_counter()
+        height = max(1, round(frame.shape[0] * self.width / frame.shape[1]))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        small = cv2.GaussianBlur(small, (5, 5), 0).astype(np.float32)
+
+        if self._background is None:
+            self._background = small
+            moving = True
+        else:
+            changed = np.count_nonzero(cv2.absdiff(small, self._background) > self.threshold)
+            moving = bool(changed > self.min_area * small.size)
+            cv2.accumulateWeighted(small, self._background, self.learning_rate)
+
+        self.checked += 1
+        self.moving_frames += moving
+        self.check_seconds += time.perf_counter() - start
+        return moving
+
+    def passes(self, index, moving):
+        """True if a frame goes to the detector whatever the tracker holds."""
+        return moving or index % self.heartbeat == 0
+
+    def record_detection(self, frames, seconds):
+        """Account detector time, to estimate what the skipped frames saved."""
+        with self._lock:
+            self.detector_frames += frames
+            self.detector_seconds += seconds
+
+    def stats(self):
+        per_frame = self.detector_seconds / self.detector_frames if self.detector_frames else 0.0
+        saved = self.skipped * per_frame
+        return {
+            'checked_frames': self.checked,
+            'moving_frames': self.moving_frames,
+            'skipped_frames': self.skipped,
+            'skip_ratio': round(self.skipped / self.checked, 3) if self.checked else None,
+            'check_seconds': round(self.check_seconds, 3),
+            'detector_seconds_per_frame': round(per_frame, 4),
+            'saved_seconds': round(saved - self.check_seconds, 3),
+        }
+
+    def report(self):
+        """Human-readable version of stats()."""
+        s = self.stats()
+        return (f"Motion gate skipped {s['skipped_frames']} of {s['checked_frames']} frames "
+                f"({(s['skip_ratio'] or 0):.0%}), saving about {s['saved_seconds']}s of detector time "
+                f"after {s['check_seconds']}s of motion checks")
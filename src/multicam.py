@@ -0,0 +1,256 @@
+# src/multicam.py
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+import cv2
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+from src.detector import PersonDetector
+from src.tracker import ObjectTracker
+from src.counter import PersonCounter
+from src.visualization import Visualizer
+from src.pipeline import FramePacket, read_frames
+from src.encoder import VideoEncoder
+from src.ingest import CaptureProcess
+
+_END = object()
+
+class CameraStream:
+    """
+    One camera's state in a multi-camera run.
+
+    Every stream owns its tracker, counter and visualizer, so track IDs,
+    crossings and heatmaps never mix between cameras. Only the detector is
+    shared. With an ingest CaptureProcess instead of a cap, frames are read
+    in place from its shared-memory ring rather than decoded on a thread.
+    """
+
+    def __init__(self, name, cap, line_y, writer=None, annotate=False, queue_size=4, ingest=None):
+        self.name = name
+        self.cap = cap
+        self.ingest = ingest
+        self.line_y = line_y
+        self.writer = writer
+        self.annotate = annotate or writer is not None
+        self.tracker = ObjectTracker()
+        self.counter = PersonCounter(line_y)
+        self.visualizer = None
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.finished = False
+        self.processed = 0
+
+    def process(self, packet, detections):
+        """Track, count and (optionally) draw one frame with its detections."""
+        packet.detections = detections
+        for _ in range(packet.dropped):
+            self.tracker.coast()
+        packet.tracks = self.tracker.update(detections)
+        packet.count_in, packet.count_out = self.counter.update_counts(packet.tracks)
+        if self.annotate:
+            if self.visualizer is None:
+                self.visualizer = Visualizer(packet.frame.shape)
+            packet.annotated = self.visualizer.draw_overlays(packet.frame, packet.tracks, self.line_y,
+                                                             packet.count_in, packet.count_out)
+            if self.writer is not None:
+                self.writer.write(packet.annotated)
+        self.processed += 1
+        return packet
+
+class MultiCameraRunner:
+    """
+    Count people on several cameras in one process with one shared detector.
+
+    Each camera is decoded on its own thread into a small bounded queue. The
+    main loop takes the next waiting frame from every camera, runs them through
+    the detector as one batch, and hands each result back to its own stream in
+    frame order.
+    """
+
+    def __init__(self, streams, detector):
+        self.streams = streams
+        self.detector = detector
+        self.batches = 0
+        self.elapsed = 0.0
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def __iter__(self):
+        """Yield (stream, packet) for every processed frame."""
+        threads = [threading.Thread(target=self._decode, args=(s,), daemon=True)
+                   for s in self.streams if s.ingest is None]
+        # Shared-memory streams are polled, so don't sleep long waiting for decode threads
+        wait = 0.002 if any(s.ingest is not None for s in self.streams) else 0.05
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        try:
+            while not self._stop.is_set() and not all(s.finished for s in self.streams):
+                self._ready.clear()
+                batch = []
+                for stream in self.streams:
+                    if stream.finished:
+                        continue
+                    if stream.ingest is not None:
+                        packet = self._get_shared(stream)
+                        if packet is not None:
+                            batch.append((stream, packet))
+                        continue
+                    try:
+                        packet = stream.frames.get_nowait()
+                    except queue.Empty:
+                        continue
+                    if packet is _END:
+                        stream.finished = True
+                    else:
+                        batch.append((stream, packet))
+
+                if not batch:
+                    self._ready.wait(wait)
+                    continue
+
+                detections = self.detector.detect_batch([p.frame for _, p in batch])
+                self.batches += 1
+                for (stream, packet), dets in zip(batch, detections):
+                    yield stream, stream.process(packet, dets)
+                    if stream.ingest is not None:
+                        stream.ingest.release()  # packet.frame was a view of the ring slot
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            self.elapsed = time.perf_counter() - start
+
+    def run(self):
+        for _ in self:
+            pass
+
+    def _get_shared(self, stream):
+        """A packet viewing the next frame in stream's ring, or None if none is waiting yet."""
+        try:
+            item = stream.ingest.get(timeout=0)
+        except queue.Empty:
+            return None
+        if item is None:
+            stream.finished = True
+            return None
+        index, frame, dropped = item
+        packet = FramePacket(index, frame)
+        packet.dropped = dropped
+        return packet
+
+    def _decode(self, stream):
+        for index, frame in enumerate(read_frames(stream.cap)):
+            if not self._put(stream, FramePacket(index, frame)):
+                return
+        self._put(stream, _END)
+
+    def _put(self, stream, item):
+        while not self._stop.is_set():
+            try:
+                stream.frames.put(item, timeout=0.1)
+                self._ready.set()
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def report(self):
+        frames = sum(s.processed for s in self.streams)
+        fps = frames / self.elapsed if self.elapsed > 0 else 0.0
+        mean_batch = frames / self.batches if self.batches else 0.0
+        lines = [f"{len(self.streams)} cameras: {frames} frames in {self.elapsed:.2f}s "
+                 f"({fps:.1f} fps aggregate, mean batch {mean_batch:.1f})"]
+        for s in self.streams:
+            lines.append(f"  {s.name}: In {s.counter.count_in}  Out {s.counter.count_out}  "
+                         f"Inside {s.counter.count_in - s.counter.count_out}  ({s.processed} frames)")
+        return '\n'.join(lines)
+
+def main(args):
+    if args.line and len(args.line) != len(args.input):
+        print("Error: give one --line per --input (or none for the middle of each frame)")
+        return
+
+    streams = []
+    for i, source in enumerate(args.input):
+        cap = ingest = None
+        if args.ingest_processes:
+            try:
+                ingest = CaptureProcess(source)
+            except ValueError as e:
+                print(f"Error: {e}")
+                return
+            (height, width), fps = ingest.shape[:2], ingest.fps
+        else:
+            cap = cv2.VideoCapture(int(source) if source.isdigit() else source)
+            if not cap.isOpened():
+                print(f"Error: Couldn't open video source {source}")
+                return
+            height, width = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        line_y = args.line[i] if args.line else int(height * 0.5)
+
+        writer = None
+        if args.save:
+            os.makedirs(args.output_dir, exist_ok=True)
+            writer = VideoEncoder(os.path.join(args.output_dir, f"processed_camera{i}.avi"), fps, (width, height))
+        streams.append(CameraStream(f"camera{i}", cap, line_y, writer=writer, annotate=args.display, ingest=ingest))
+
+    detector = PersonDetector(model_path=args.model, batch_size=args.batch_size)
+    runner = MultiCameraRunner(streams, detector)
+
+    if args.display:
+        print("Press 'q' to quit")
+    for stream, packet in runner:
+        if args.display:
+            cv2.imshow(f'Footfall Counter - {stream.name}', packet.annotated)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                runner.stop()  # loop ends once decoding has shut down
+
+    # Cleanup
+    for stream in streams:
+        if stream.ingest is not None:
+            stream.ingest.close()
+            if stream.ingest.dropped:
+                print(f"{stream.name}: {stream.ingest.dropped} frames dropped by latest-frame-wins capture")
+        else:
+            stream.cap.release()
+        if stream.writer is not None:
+            stream.writer.release()
+    if args.display:
+        cv2.destroyAllWindows()
+
+    print(f"\nFinal Counts:")
+    print(runner.report())
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Footfall Counter - several cameras, one shared detector')
+    parser.add_argument('--input', type=str, nargs='+', required=True,
+                      help='Video files or camera indices, one per camera')
+    parser.add_argument('--line', type=int, nargs='+',
+                      help='Y-coordinate of the counting line for each camera (default: middle of each frame)')
+    parser.add_argument('--model', type=str, default='yolov8n.pt',
+                      help='Path to YOLOv8 model file (default: yolov8n.pt)')
+    parser.add_argument('--batch-size', type=int, default=16,
+                      help='Maximum frames per inference call (default: 16)')
+    parser.add_argument('--save', action='store_true',
+                      help='Save an annotated video per camera')
+    parser.add_argument('--output-dir', type=str, default='output',
+                      help='Directory for saved videos (default: output)')
+    parser.add_argument('--display', action='store_true',
+                      help='Show a window per camera')
+    parser.add_argument('--ingest-processes', action='store_true',
+                      help='Decode each camera in its own process and read frames from shared memory')
+
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,250 @@
+# src/parallel.py
+"""
+Count a long recording on several cores.
+
+The video is cut into time segments that overlap by a couple of seconds.
+Every segment is detected and tracked in its own worker process, each with a
+warm detector, and the tracks are stitched across the cuts before a single
+PersonCounter replays them in frame order.
+
+Away from the cuts this is exactly the serial computation. Near a cut, the
+later segment's tracker starts cold and may split or merge people differently
+in a crowd, so the merged count_in/count_out can differ from a serial run by
+at most about one per direction per cut; with the default two-second overlap
+they usually match exactly. --serial runs both and prints the difference:
+
+    python src/parallel.py --input recording.mp4 --workers 8 --serial
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+from src.detector import PersonDetector
+from src.tracker import ObjectTracker, iou_batch
+from src.counter import PersonCounter
+from src.pipeline import Pipeline, read_frames, detect_stage, track_stage, build_video_pipeline, crossing_events
+
+_detector = None  # one per worker process
+
+def _init_worker(model_path, conf_threshold, threads):
+    global _detector
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _detector = PersonDetector(model_path=model_path, conf_threshold=conf_threshold)
+
+def _track_segment(task):
+    """
+    Detect and track frames [start, stop) of a video (stop None: to the end).
+
+    Returns (start, frames read, rows) where rows is an (R, 6) array of
+    [frame, x1, y1, x2, y2, id] for every reported track.
+    """
+    video_path, start, stop, resize = task
+    cap = cv2.VideoCapture(video_path)
+    pipeline = Pipeline(read_frames(cap, resize, start=start, stop=stop), [detect_stage(_detector),
+                                 track_stage(ObjectTracker(), PersonCounter(), release_frames=True)])
+    rows = [np.column_stack([np.full(len(p.tracks), start + p.index), p.tracks]) for p in pipeline]
+    cap.release()
+    rows = np.concatenate(rows) if rows else np.zeros((0, 6))
+    return start, pipeline.stats()['frames'], rows
+
+def plan_segments(total_frames, count, overlap):
+    """(start, stop) frame ranges of count segments, each reaching overlap frames into the next."""
+    bounds = np.linspace(0, total_frames, count + 1).astype(int)
+    segments = [(int(bounds[i]), int(bounds[i + 1]) + overlap) for i in range(count - 1)]
+    return segments + [(int(bounds[-2]), None)]  # the last one reads to the end of the file
+
+def _match_ids(before, after, min_iou=0.5, min_votes=3):
+    """
+    Pair track IDs of two segments from their boxes in the frames both tracked.
+
+    A pair gets a vote for every shared frame in which its boxes overlap by at
+    least min_iou; pairs are then assigned one to one by votes.
+    """
+    votes = Counter()
+    for frame in np.intersect1d(before[:, 0], after[:, 0]):
+        a, b = before[before[:, 0] == frame], after[after[:, 0] == frame]
+        for i, j in zip(*np.nonzero(iou_batch(a[:, 1:5], b[:, 1:5]) >= min_iou)):
+            votes[a[i, 5], b[j, 5]] += 1
+    if not votes:
+        return {}
+
+    ids_a = sorted({a for a, _ in votes})
+    ids_b = sorted({b for _, b in votes})
+    matrix = np.zeros((len(ids_a), len(ids_b)))
+    for (a, b), n in votes.items():
+        matrix[ids_a.index(a), ids_b.index(b)] = n
+    rows, cols = linear_sum_assignment(-matrix)
+    return {ids_b[j]: ids_a[i] for i, j in zip(rows, cols) if matrix[i, j] >= min_votes}
+
+def stitch(results, overlap):
+    """
+    Merge per-segment tracks into one (R, 6) stream with IDs consistent across cuts.
+
+    Each cut is moved to the middle of its overlap, so the later segment's
+    tracker has had half the overlap to warm up. Later-segment tracks that
+    match an earlier track keep its ID; the rest get fresh IDs.
+    """
+    results = sorted(results, key=lambda result: result[0])
+    merged, ids, next_id = [], {}, 1
+    for k, (start, frames, rows) in enumerate(results):
+        own_start = 0 if k == 0 else start + overlap // 2
+        own_stop = results[k + 1][0] + overlap // 2 if k + 1 < len(results) else start + frames
+
+        local = {}
+        if k > 0:
+            for b, a in _match_ids(previous, rows).items():
+                local[b] = ids[a]
+        for track_id in np.unique(rows[:, 5]):
+            if track_id not in local:
+                local[track_id] = next_id
+                next_id += 1
+
+        own = rows[(rows[:, 0] >= own_start) & (rows[:, 0] < own_stop)].copy()
+        own[:, 5] = [local[track_id] for track_id in own[:, 5]]
+        merged.append(own)
+        previous, ids = rows, local
+    return np.concatenate(merged) if merged else np.zeros((0, 6))
+
+def count_tracks(rows, total_frames, counter):
+    """Replay stitched [frame, x1, y1, x2, y2, id] rows through counter; returns crossing events."""
+    events = []
+    rows = rows[np.argsort(rows[:, 0], kind='stable')]
+    bounds = np.searchsorted(rows[:, 0], np.arange(total_frames + 1))
+    for frame in range(total_frames):
+        counter.update_counts(rows[bounds[frame]:bounds[frame + 1], 1:])
+        events.extend({'frame': frame, 'track_id': track_id, 'direction': direction, 'line': line}
+                      for track_id, direction, line in counter.last_events)
+    return events
+
+def count_parallel(video_path, counter, workers=None, segments=None, overlap_seconds=2.0,
+                   model_path='yolov8n.pt', conf_threshold=0.4, resize=None):
+    """
+    Count a video file in parallel segments; returns the results and crossing events.
+
+    Segments are seeked to with CAP_PROP_POS_FRAMES, so the file's container
+    must support frame-accurate seeking (MP4/AVI written by OpenCV or ffmpeg do).
+    """
+    workers = workers or os.cpu_count()
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError("Could not open video file")
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+
+    overlap = int(round(overlap_seconds * fps))
+    count = max(1, min(segments or workers, total_frames // max(2 * overlap, 1)))
+    tasks = [(video_path, start, stop, resize) for start, stop in plan_segments(total_frames, count, overlap)]
+
+    start = time.perf_counter()
+    # spawn: workers must not inherit torch state from the parent
+    ctx = multiprocessing.get_context('spawn')
+    threads = max(1, os.cpu_count() // workers)
+    with ctx.Pool(min(workers, count), initializer=_init_worker,
+                  initargs=(model_path, conf_threshold, threads)) as pool:
+        results = pool.map(_track_segment, tasks, chunksize=1)
+    processed = results[-1][0] + results[-1][1]
+    events = count_tracks(stitch(results, overlap), processed, counter)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'count_in': counter.count_in,
+        'count_out': counter.count_out,
+        'net_occupancy': counter.count_in - counter.count_out,
+        'lines': counter.counts_by_name(),
+        'processed_frames': processed,
+        'segments': count,
+        'overlap_frames': overlap,
+        'elapsed_seconds': round(elapsed, 3),
+        'fps': round(processed / elapsed, 2) if elapsed > 0 else None,
+    }, events
+
+def count_serial(video_path, counter, model_path='yolov8n.pt', conf_threshold=0.4, resize=None):
+    """The same counts from one counts-only pipeline, for comparison."""
+    cap = cv2.VideoCapture(video_path)
+    detector = PersonDetector(model_path=model_path, conf_threshold=conf_threshold)
+    pipeline = build_video_pipeline(cap, detector, ObjectTracker(), counter, counter.line_y,
+                                    resize=resize, annotate=False)
+    events = [event for packet in pipeline for event in crossing_events(packet)]
+    cap.release()
+    stats = pipeline.stats()
+    return {
+        'count_in': counter.count_in,
+        'count_out': counter.count_out,
+        'processed_frames': stats['frames'],
+        'elapsed_seconds': stats['elapsed_seconds'],
+        'fps': stats['fps'],
+    }, events
+
+def main(args):
+    cap = cv2.VideoCapture(args.input)
+    if not cap.isOpened():
+        print(f"Error: Couldn't open video source {args.input}")
+        return
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    resize = (640, 480) if args.resize else None
+    line_y = args.line if args.line else int((480 if resize else height) * 0.5)
+
+    results, events = count_parallel(args.input, PersonCounter(line_y), args.workers, args.segments,
+                                     args.overlap, args.model, args.conf, resize)
+    print(f"Parallel: in {results['count_in']} out {results['count_out']} over {results['processed_frames']} "
+          f"frames in {results['segments']} segments, {results['elapsed_seconds']}s ({results['fps']} fps)")
+
+    if args.serial:
+        serial, _ = count_serial(args.input, PersonCounter(line_y), args.model, args.conf, resize)
+        results['serial'] = serial
+        print(f"Serial:   in {serial['count_in']} out {serial['count_out']} over {serial['processed_frames']} "
+              f"frames, {serial['elapsed_seconds']}s ({serial['fps']} fps)")
+        print(f"Speedup {serial['elapsed_seconds'] / results['elapsed_seconds']:.2f}x, count difference "
+              f"in {results['count_in'] - serial['count_in']:+d} out {results['count_out'] - serial['count_out']:+d}")
+
+    output_dir = os.path.dirname(args.events)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(args.events, 'w') as f:
+        json.dump({**results, 'events': events}, f, indent=2)
+    print(f"Counts and events written to {args.events}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parallel offline footfall counting')
+    parser.add_argument('--input', type=str, required=True,
+                      help='Path to video file')
+    parser.add_argument('--model', type=str, default='yolov8n.pt',
+                      help='Path to YOLOv8 model file (default: yolov8n.pt)')
+    parser.add_argument('--conf', type=float, default=0.4,
+                      help='Detection confidence threshold (default: 0.4)')
+    parser.add_argument('--line', type=int,
+                      help='Y-coordinate of counting line (default: middle of frame)')
+    parser.add_argument('--resize', action='store_true',
+                      help='Resize frames to 640x480')
+    parser.add_argument('--workers', type=int,
+                      help='Worker processes (default: one per core)')
+    parser.add_argument('--segments', type=int,
+                      help='Number of time segments (default: one per worker)')
+    parser.add_argument('--overlap', type=float, default=2.0,
+                      help='Seconds each segment overlaps the next, for stitching tracks (default: 2.0)')
+    parser.add_argument('--serial', action='store_true',
+                      help='Also count serially and report the speedup and count difference')
+    parser.add_argument('--events', type=str, default='output/parallel_counts.json',
+                      help='Counts/events JSON path (default: output/parallel_counts.json)')
+
+    args = parser.parse_args()
+    main(args)
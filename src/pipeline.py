@@ -0,0 +1,506 @@
+# src/pipeline.py
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from src.visualization import Visualizer
+from src.metrics import REGISTRY, stage_histogram
+
+_END = object()
+
+# Always-on metrics of every pipeline in this process (see src/metrics.py)
+_LIVE_TRACKS = REGISTRY.gauge('footfall_live_tracks', 'Tracks currently held by the tracker')
+_DROPPED = REGISTRY.counter('footfall_frames_dropped_total',
+                            'Frames a live source produced while the pipeline was too busy to read them')
+_SKIPPED = {reason: REGISTRY.counter('footfall_detector_skipped_frames_total',
+                                     'Frames tracked without running the detector', reason=reason)
+            for reason in ('stride', 'motion')}
+_CROSSINGS = {direction: REGISTRY.counter('footfall_crossings_total', 'Line and zone crossings counted',
+                                          direction=direction)
+              for direction in ('in', 'out')}
+
+class FramePacket:
+    """One frame and everything computed for it as it moves through the pipeline."""
+    __slots__ = ('index', 'frame', 'detections', 'tracks', 'count_in', 'count_out', 'events', 'annotated',
+                 'moving', 'gated', 'dropped')
+
+    def __init__(self, index, frame):
+        self.index = index
+        self.frame = frame
+        self.detections = None
+        self.tracks = None
+        self.count_in = 0
+        self.count_out = 0
+        self.events = []
+        self.annotated = None
+        self.moving = True  # set by a motion gate in the detect stage
+        self.gated = False  # wanted by the scheduler, held back by the motion gate
+        self.dropped = 0  # frames the source lost just before this one
+
+class Stage:
+    """
+    A pipeline step that runs on its own thread.
+
+    fn takes a list of up to batch_size packets and returns the packets to pass
+    on, in order. The stage also keeps its own throughput and input-queue stats,
+    and publishes its queue depth as a gauge.
+    """
+
+    def __init__(self, name, fn, batch_size=1):
+        self.name = name
+        self.fn = fn
+        self.batch_size = batch_size
+        self.frames = 0
+        self.busy = 0.0
+        self.max_queue = 0
+        self._queue_total = 0
+        self._queue_samples = 0
+        self._queue_gauge = REGISTRY.gauge('footfall_queue_depth', 'Frames waiting for each pipeline stage',
+                                           stage=name)
+
+    def record_queue(self, depth):
+        self._queue_gauge.set(depth)
+        self.max_queue = max(self.max_queue, depth)
+        self._queue_total += depth
+        self._queue_samples += 1
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'busy_seconds': round(self.busy, 3),
+            'fps': round(self.frames / self.busy, 2) if self.busy > 0 else None,
+            'mean_queue': round(self._queue_total / self._queue_samples, 2) if self._queue_samples else 0.0,
+            'max_queue': self.max_queue,
+        }
+
+class Pipeline:
+    """
+    Run frames from source through stages, each on its own thread.
+
+    Stages are joined by bounded queues, so a slow stage blocks the ones before
+    it instead of letting frames pile up in memory. Every stage is a single
+    thread reading its queue in FIFO order, so packets come out of the pipeline
+    in the order the source produced them. Iterate over the pipeline to receive
+    finished packets on the calling thread. The source yields frames, or
+    FramePackets that carry their own index and dropped count (see
+    CaptureProcess). For a live source running at live_fps, frames it produced
+    faster than the pipeline read them are counted as dropped. Frames are
+    numbered from first_index, e.g. the frame a resumed run continues from.
+    """
+
+    def __init__(self, source, stages, queue_size=8, live_fps=None, first_index=0):
+        self.source = source
+        self.live_fps = live_fps
+        self.first_index = first_index
+        self.decode = Stage('decode', None)
+        self.stages = stages
+        self.queue_size = queue_size
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._error = None
+
+    def stop(self):
+        """Ask all stages to finish early; iteration ends after the current frame."""
+        self._stop.set()
+
+    def __iter__(self):
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self._run_source, args=(queues[0],), daemon=True)]
+        for i, stage in enumerate(self.stages):
+            threads.append(threading.Thread(target=self._run_stage,
+                                            args=(stage, queues[i], queues[i + 1]), daemon=True))
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                packet = self._get(queues[-1])
+                if packet is None or packet is _END:
+                    break
+                yield packet
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            self.elapsed = time.perf_counter() - start
+            # An idle pipeline holds no frames or tracks
+            for stage in self.stages:
+                stage._queue_gauge.set(0)
+            _LIVE_TRACKS.set(0)
+
+        if self._error is not None:
+            raise self._error
+
+    def run(self):
+        """Drain the pipeline without looking at the packets; returns the last one."""
+        packet = None
+        for packet in self:
+            pass
+        return packet
+
+    def stats(self):
+        """Per-stage throughput and queue depth, plus overall frames per second."""
+        frames = self.decode.frames
+        return {
+            'frames': frames,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'fps': round(frames / self.elapsed, 2) if self.elapsed > 0 else None,
+            'stages': {stage.name: stage.stats() for stage in [self.decode] + self.stages},
+        }
+
+    def report(self):
+        """Human-readable version of stats()."""
+        stats = self.stats()
+        lines = [f"Pipeline: {stats['frames']} frames in {stats['elapsed_seconds']}s ({stats['fps']} fps)"]
+        for name, s in stats['stages'].items():
+            lines.append(f"  {name:<10} {s['fps'] or 0:>8.1f} fps busy {s['busy_seconds']:>8.3f}s"
+                         f"  queue mean {s['mean_queue']:>5.2f} max {s['max_queue']}")
+        return '\n'.join(lines)
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _run_source(self, outbox):
+        try:
+            frames = iter(self.source)
+            index, dropped = self.first_index, 0
+            seconds = stage_histogram('decode')
+            started = time.perf_counter()
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                frame = next(frames, _END)
+                if frame is _END:
+                    break
+                elapsed = time.perf_counter() - start
+                seconds.observe(elapsed)
+                self.decode.busy += elapsed
+                self.decode.frames += 1
+                if self.live_fps:
+                    behind = int((start - started) * self.live_fps) - (index - self.first_index)
+                    if behind > dropped:
+                        _DROPPED.inc(behind - dropped)
+                        dropped = behind
+                packet = frame if isinstance(frame, FramePacket) else FramePacket(index, frame)
+                if not self._put(outbox, packet):
+                    return
+                index += 1
+            self._put(outbox, _END)
+        except Exception as e:
+            self._fail(e)
+
+    def _run_stage(self, stage, inbox, outbox):
+        try:
+            while True:
+                packet = self._get(inbox)
+                if packet is None:
+                    return
+                if packet is _END:
+                    self._put(outbox, _END)
+                    return
+
+                # Take whatever else is already waiting, up to the batch size
+                stage.record_queue(inbox.qsize())
+                batch, ended = [packet], False
+                while len(batch) < stage.batch_size:
+                    try:
+                        packet = inbox.get_nowait()
+                    except queue.Empty:
+                        break
+                    if packet is _END:
+                        ended = True
+                        break
+                    batch.append(packet)
+
+                start = time.perf_counter()
+                batch = stage.fn(batch)
+                stage.busy += time.perf_counter() - start
+                stage.frames += len(batch)
+
+                for packet in batch:
+                    if not self._put(outbox, packet):
+                        return
+                if ended:
+                    self._put(outbox, _END)
+                    return
+        except Exception as e:
+            self._fail(e)
+
+def request_size(cap, size):
+    """
+    Ask the capture backend to deliver frames of size (width, height).
+
+    Cameras on V4L2, DirectShow or MSMF can usually switch resolution, which
+    saves decoding and resizing full frames; video files ignore the request.
+    Returns True if the backend now reports that size.
+    """
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+    return (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))) == tuple(size)
+
+def read_frames(cap, resize=None, retrieve=None, start=0, stop=None):
+    """
+    Yield frames from an open cv2.VideoCapture, optionally resized to (width, height).
+
+    retrieve(index) decides which frames are needed as images; the others are
+    only grabbed, which advances the stream without converting the frame,
+    and are yielded as None. start seeks straight to that frame and stop ends
+    before it; indices passed to retrieve count from start.
+    """
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    index = 0
+    while cap.isOpened() and (stop is None or start + index < stop):
+        if retrieve is not None and not retrieve(index):
+            if not cap.grab():
+                break
+            yield None
+        else:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if resize and frame.shape[1::-1] != tuple(resize):
+                frame = cv2.resize(frame, resize)
+            yield frame
+        index += 1
+
+_DETECT_SECONDS = stage_histogram('detect')
+
+def _detect_timed(detector, frames, gate):
+    """detector.detect_batch, timed per frame and for the motion gate's savings estimate."""
+    start = time.perf_counter()
+    detections = detector.detect_batch(frames)
+    elapsed = time.perf_counter() - start
+    _DETECT_SECONDS.observe(elapsed / len(frames), len(frames))
+    if gate is not None:
+        gate.record_detection(len(frames), elapsed)
+    return detections
+
+def detect_stage(detector, scheduler=None, gate=None):
+    """
+    Batched detection of each packet's frame.
+
+    With a fixed-stride scheduler only the selected frames are sent to the
+    detector; the rest leave detections as None for the track stage to coast.
+    Adaptive scheduling is decided in the track stage instead, since it depends
+    on tracker state. A motion gate checks every frame here; selected frames
+    that are static (and not due a heartbeat) are marked gated and left for the
+    track stage, which detects on them only if tracks are still live.
+    """
+    def detect(packets):
+        if gate is not None:
+            for packet in packets:
+                if packet.frame is not None:
+                    packet.moving = gate.moving(packet.frame)
+
+        if scheduler is None:
+            selected = packets
+        elif scheduler.adaptive:
+            return packets
+        else:
+            selected = [p for p in packets if scheduler.should_detect(p.index)]
+
+        if gate is not None:
+            for packet in selected:
+                packet.gated = not gate.passes(packet.index, packet.moving)
+            selected = [p for p in selected if not p.gated]
+
+        if selected:
+            detections = _detect_timed(detector, [p.frame for p in selected], gate)
+            for packet, dets in zip(selected, detections):
+                packet.detections = dets
+        return packets
+
+    return Stage('detect', detect, batch_size=detector.batch_size)
+
+def cached_detect_stage(detections):
+    """Detections looked up by frame index in a CachedDetections instead of running the model."""
+    def detect(packets):
+        for packet in packets:
+            packet.detections = detections[packet.index]
+        return packets
+
+    return Stage('detect', detect, batch_size=32)
+
+def track_stage(tracker, counter, detector=None, scheduler=None, release_frames=False, gate=None,
+                checkpoint=None):
+    """
+    Tracking and counting, strictly in frame order.
+
+    Frames without detections only advance the tracker's predictions. For an
+    adaptive scheduler, the detector is run here on the frames it selects.
+    Frames held back by a motion gate are detected on only while the tracker
+    has live tracks; otherwise the tracker is updated with no detections, just
+    as if the detector had found nobody. Frames the source dropped before a
+    packet are coasted over first, one prediction step each, so track motion
+    keeps real time. With release_frames the image is dropped once it has
+    been detected on, for pipelines that never draw. A Checkpointer is given
+    every counted frame, so its checkpoints match the tracker and counter.
+    """
+    track_seconds, count_seconds = stage_histogram('track'), stage_histogram('count')
+
+    def track(packets):
+        for packet in packets:
+            if scheduler is not None and scheduler.adaptive and \
+                    scheduler.should_detect(packet.index, tracker):
+                packet.gated = gate is not None and not gate.passes(packet.index, packet.moving)
+                if not packet.gated:
+                    packet.detections = _detect_timed(detector, [packet.frame], gate)[0]
+
+            if packet.gated:
+                if len(tracker.trackers) > 0:
+                    packet.detections = _detect_timed(detector, [packet.frame], gate)[0]
+                else:
+                    packet.detections = np.empty((0, 5))
+                    gate.skipped += 1
+                    _SKIPPED['motion'].inc()
+
+            start = time.perf_counter()
+            if packet.dropped:
+                _DROPPED.inc(packet.dropped)
+                for _ in range(packet.dropped):
+                    tracker.coast()
+            if packet.detections is None:
+                packet.tracks = tracker.coast()
+                _SKIPPED['stride'].inc()
+            else:
+                packet.tracks = tracker.update(packet.detections)
+            counted = time.perf_counter()
+            packet.count_in, packet.count_out = counter.update_counts(packet.tracks)
+            packet.events = counter.last_events
+            track_seconds.observe(counted - start)
+            count_seconds.observe(time.perf_counter() - counted)
+            _LIVE_TRACKS.set(len(tracker.trackers))
+            for _, direction, _ in packet.events:
+                _CROSSINGS[direction].inc()
+            if checkpoint is not None:
+                checkpoint.record(packet)
+            if release_frames:
+                packet.frame = None
+        return packets
+
+    return Stage('track', track)
+
+def annotate_stage(line_y, writer=None, counter=None, keep_annotated=True):
+    """
+    Draw overlays (with counter's extra lines and zones) and, if a writer is given, encode the frame.
+
+    With a VideoEncoder, overlays are drawn into its frame pool and encoded on
+    its thread, and frames it does not want are not drawn at all. Drawn frames
+    stay in packet.annotated when keep_annotated is set; the consumer then
+    hands each one back with writer.done(packet.annotated) once shown.
+    """
+    lines = list(counter.lines.values()) if counter is not None else []
+    zones = list(counter.zones.values()) if counter is not None else []
+    pooled = hasattr(writer, 'buffer')
+    visualizer = None
+    draw_seconds, write_seconds = stage_histogram('draw'), stage_histogram('write')
+
+    def annotate(packets):
+        # One Visualizer per pipeline, so heatmaps and trajectories never leak
+        # between videos handled by the same long-lived process
+        nonlocal visualizer
+        for packet in packets:
+            if visualizer is None:
+                visualizer = Visualizer(packet.frame.shape)
+            wanted = writer is not None and (not pooled or writer.wants(packet.index))
+            if not (wanted or keep_annotated):
+                visualizer.skip(packet.tracks)
+                continue
+            out = None
+            if pooled:
+                out = writer.buffer(users=wanted + keep_annotated)
+            start = time.perf_counter()
+            annotated = visualizer.draw_overlays(packet.frame, packet.tracks, line_y, packet.count_in,
+                                                 packet.count_out, lines, zones, out=out)
+            draw_seconds.observe(time.perf_counter() - start)
+            if keep_annotated:
+                packet.annotated = annotated
+            if wanted:
+                start = time.perf_counter()
+                writer.write(annotated)
+                write_seconds.observe(time.perf_counter() - start)
+        return packets
+
+    return Stage('annotate', annotate)
+
+def build_video_pipeline(cap, detector, tracker, counter, line_y, writer=None, resize=None,
+                         queue_size=8, scheduler=None, annotate=True, gate=None, detections=None,
+                         start=0, stop=None, keep_annotated=True, live_fps=None, source=None, first_index=0,
+                         checkpoint=None):
+    """
+    decode -> detect -> track/count -> annotate/encode pipeline over a video capture.
+
+    Tracking and counting see frames strictly in order, so counts match running
+    the same components one frame at a time. With annotate=False the pipeline
+    only counts: nothing is drawn or encoded and frames are freed as soon as
+    they have been detected on. A MotionGate lets static frames skip the
+    detector while no one is being tracked. Given cached detections, frames
+    are still decoded (to draw on) but the detector is never run.
+
+    When nothing is drawn, frames a fixed-stride scheduler skips are only
+    grabbed from the capture, never converted to images. start and stop
+    select a range of frames, seeking directly to start. Pass a live source's
+    frame rate as live_fps to count the frames it drops while processing lags.
+    source replaces reading cap, e.g. with a CaptureProcess's packets().
+    To resume a run, restore the tracker and counter, seek start to the
+    frame to continue from and number frames from it with first_index; a
+    Checkpointer takes checkpoints to resume from.
+    """
+    retrieve = None
+    if not annotate and detections is None and scheduler is not None and \
+            not scheduler.adaptive and scheduler.every > 1:
+        retrieve = lambda index: (first_index + index) % scheduler.every == 0
+    stages = [
+        detect_stage(detector, scheduler, gate) if detections is None else cached_detect_stage(detections),
+        track_stage(tracker, counter, detector, scheduler, release_frames=not annotate, gate=gate,
+                    checkpoint=checkpoint),
+    ]
+    if annotate:
+        stages.append(annotate_stage(line_y, writer, counter, keep_annotated))
+    if source is None:
+        source = read_frames(cap, resize, retrieve, start, stop)
+    return Pipeline(source, stages, queue_size=queue_size, live_fps=live_fps, first_index=first_index)
+
+def replay_detections(detections, tracker, counter):
+    """
+    Track and count cached detections without decoding a single frame.
+
+    Yields a FramePacket per frame, with frame left as None, just as a
+    counts-only pipeline would. Its cost is that of tracking and counting
+    alone, so it grows with the number of people in view.
+    """
+    for index, dets in enumerate(detections):
+        packet = FramePacket(index, None)
+        packet.detections = dets
+        packet.tracks = tracker.update(dets)
+        packet.count_in, packet.count_out = counter.update_counts(packet.tracks)
+        packet.events = counter.last_events
+        yield packet
+
+def crossing_events(packet):
+    """JSON-ready crossing events recorded for a processed packet."""
+    return [{'frame': packet.index, 'track_id': track_id, 'direction': direction, 'line': line}
+            for track_id, direction, line in packet.events]
@@ -0,0 +1,90 @@
+# src/roi.py
+import numpy as np
+
+def counting_regions(counter, frame_shape, margin):
+    """
+    Rectangles (x1, y1, x2, y2) around every line and zone of a PersonCounter.
+
+    The horizontal line_y becomes a full-width band margin pixels above and
+    below it; segments and zones become their bounding box grown by margin.
+    Overlapping rectangles are merged and all are clipped to the frame.
+    """
+    height, width = frame_shape[:2]
+    regions = []
+    if counter.line_y is not None:
+        regions.append([0, counter.line_y - margin, width, counter.line_y + margin])
+    for points in list(counter.lines.values()) + list(counter.zones.values()):
+        points = np.asarray(points, dtype=float)
+        x1, y1 = points.min(axis=0) - margin
+        x2, y2 = points.max(axis=0) + margin
+        regions.append([x1, y1, x2, y2])
+
+    regions = np.array(regions, dtype=float).reshape(-1, 4)
+    regions[:, [0, 2]] = regions[:, [0, 2]].clip(0, width)
+    regions[:, [1, 3]] = regions[:, [1, 3]].clip(0, height)
+    return merge_regions(regions.astype(int))
+
+def merge_regions(regions):
+    """Replace overlapping rectangles by their bounding box until none overlap."""
+    regions = [list(r) for r in regions if r[2] > r[0] and r[3] > r[1]]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    regions[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return np.array(regions, dtype=int).reshape(-1, 4)
+
+class RegionDetector:
+    """
+    Runs a detector only on the parts of the frame that can change the counts.
+
+    Wraps a PersonDetector (same detect/detect_batch interface). Each frame is
+    cropped to the regions around the counter's lines and zones, all crops go
+    through the wrapped detector as one batch, and the boxes are shifted back
+    to full-frame coordinates before they reach the tracker.
+    """
+
+    def __init__(self, detector, counter, margin=100):
+        self.detector = detector
+        self.counter = counter
+        self.margin = margin
+        self.regions = None
+        self._frame_area = None
+
+    @property
+    def batch_size(self):
+        return self.detector.batch_size
+
+    def detect(self, frame):
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames, batch_size=None):
+        if self.regions is None:
+            self.regions = counting_regions(self.counter, frames[0].shape, self.margin)
+            self._frame_area = frames[0].shape[0] * frames[0].shape[1]
+
+        crops = [frame[y1:y2, x1:x2] for frame in frames for x1, y1, x2, y2 in self.regions]
+        detections = self.detector.detect_batch(crops, batch_size and batch_size * len(self.regions))
+
+        results = []
+        for i in range(len(frames)):
+            boxes = []
+            for (x1, y1, _, _), dets in zip(self.regions, detections[i * len(self.regions):]):
+                boxes.append(dets + [x1, y1, x1, y1, 0])
+            results.append(np.concatenate(boxes) if boxes else np.empty((0, 5)))
+        return results
+
+    def pixel_fraction(self):
+        """Share of each frame's pixels that is sent to the detector."""
+        if self.regions is None:
+            return None
+        area = np.sum((self.regions[:, 2] - self.regions[:, 0]) * (self.regions[:, 3] - self.regions[:, 1]))
+        return area / float(self._frame_area)
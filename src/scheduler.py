@@ -0,0 +1,80 @@
+# src/scheduler.py
+import numpy as np
+
+def forget_after(every):
+    """
+    How many frames a PersonCounter should remember an unseen track for, when
+    the detector runs on every `every`-th frame (the longest gap if adaptive).
+
+    A new track is only reported after min_hits detections and a lost one
+    for max_age more, so with the tracker's defaults a live track can go
+    4 detections, 4 * every frames, without a centroid.
+    """
+    return max(30, 4 * every)
+
+class DetectionScheduler:
+    """
+    Decide which frames the detector runs on.
+
+    With a fixed stride the detector runs on every `every`-th frame. In adaptive
+    mode `every` is the longest allowed gap; the gap shrinks as tracked people
+    approach the counting line, based on each track's Kalman position and
+    vertical velocity, so the detector runs on every frame while someone is
+    crossing and rarely while the scene is empty or far from the line.
+    Frames in between are handled by ObjectTracker.coast.
+    """
+
+    def __init__(self, every=1, adaptive=False, line_y=None):
+        if every < 1:
+            raise ValueError("every must be at least 1")
+        if adaptive and line_y is None:
+            raise ValueError("adaptive stride needs the counting line position")
+        self.every = every
+        self.adaptive = adaptive
+        self.line_y = line_y
+        self.detected = 0
+        self.skipped = 0
+        self._last = None
+
+    def should_detect(self, index, tracker=None):
+        """
+        True if the detector should run on frame index.
+
+        Fixed strides depend only on the index. Adaptive mode also needs the
+        ObjectTracker as it stands before this frame, and must be asked about
+        frames in order.
+        """
+        if self.adaptive:
+            detect = self._last is None or index - self._last >= self._stride(tracker)
+        else:
+            detect = index % self.every == 0
+
+        if detect:
+            self._last = index
+            self.detected += 1
+        else:
+            self.skipped += 1
+        return detect
+
+    def _stride(self, tracker):
+        """Frames until the first live track could reach the line, within [1, every]."""
+        x = tracker.trackers.x
+        if len(x) == 0:
+            return self.every
+
+        cy, vy = x[:, 1], x[:, 5]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            h = np.sqrt(x[:, 2] / x[:, 3])
+            dist = self.line_y - cy
+            frames = np.where(dist * vy > 0, np.abs(dist) / np.abs(vy), np.inf)
+        # Anyone already straddling the line needs every frame
+        frames[np.abs(dist) <= h / 2] = 0
+        return int(np.clip(np.nan_to_num(np.min(frames), nan=0.0, posinf=self.every), 1, self.every))
+
+    def stats(self):
+        total = self.detected + self.skipped
+        return {
+            'detected_frames': self.detected,
+            'skipped_frames': self.skipped,
+            'detect_ratio': round(self.detected / total, 3) if total else None,
+        }
@@ -0,0 +1,185 @@
+# src/sweep.py
+"""
+Count crossings for many candidate lines (and tracker settings) in one run.
+
+Detections come from the cache when available, otherwise the detector runs
+once over the video. For every combination of iou_threshold and min_hits the
+tracker makes a single pass, and all candidate lines are then tested against
+every centroid step at once:
+
+    python src/sweep.py --input input/test_video.mp4 --lines 100 400 10 --min-hits 1 3 --expected 12 9
+"""
+import argparse
+import csv
+import os
+import sys
+
+import cv2
+import numpy as np
+
+# Add project root to Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+from src.detector import PersonDetector
+from src.tracker import ObjectTracker
+from src.counter import _FAR, segment_crossings
+from src.cache import DetectionCache, video_key
+from src.pipeline import Pipeline, read_frames, detect_stage
+
+CHUNK_BYTES = 64 * 1024 * 1024  # memory for the temporaries of one chunk of count_crossings
+_TEMPORARIES = 6  # (steps, lines) float64 arrays segment_crossings holds at its peak
+
+def track_steps(detections, tracker, forget_after=30):
+    """
+    Centroid steps (prev, cur), two (M, 2) arrays, of the tracks reported for detections.
+
+    A step joins a track's consecutive centroids, as PersonCounter sees them:
+    only when they are at most forget_after frames apart.
+    """
+    frames, ids, centroids = [], [], []
+    for index, dets in enumerate(detections):
+        tracks = tracker.update(dets)
+        frames.append(np.full(len(tracks), index))
+        ids.append(tracks[:, 4].astype(np.int64))
+        centroids.append(np.stack([((tracks[:, 0] + tracks[:, 2]) / 2).astype(int),
+                                   ((tracks[:, 1] + tracks[:, 3]) / 2).astype(int)], axis=1))
+    if not frames:
+        return np.zeros((0, 2)), np.zeros((0, 2))
+
+    frames, ids = np.concatenate(frames), np.concatenate(ids)
+    centroids = np.concatenate(centroids).astype(float)
+    order = np.lexsort((frames, ids))
+    frames, ids, centroids = frames[order], ids[order], centroids[order]
+    step = (ids[1:] == ids[:-1]) & (frames[1:] - frames[:-1] <= forget_after)
+    return centroids[:-1][step], centroids[1:][step]
+
+def horizontal_lines(ys):
+    """(L, 2, 2) segments for horizontal counting lines at ys, like PersonCounter's line_y."""
+    ys = np.asarray(ys, dtype=float)
+    return np.stack([np.stack([np.full_like(ys, -_FAR), ys], axis=1),
+                     np.stack([np.full_like(ys, _FAR), ys], axis=1)], axis=1)
+
+def count_crossings(prev, cur, segments, budget=CHUNK_BYTES):
+    """
+    (L, 2) [in, out] counts of the steps prev -> cur for each of L segments.
+
+    Steps are tested in chunks small enough that segment_crossings' (steps, L)
+    temporaries stay within budget bytes, however many lines are swept.
+    """
+    counts = np.zeros((len(segments), 2), dtype=int)
+    chunk = max(1, budget // (len(segments) * np.dtype(float).itemsize * _TEMPORARIES))
+    for start in range(0, len(prev), chunk):
+        crossed_in, crossed_out = segment_crossings(prev[start:start + chunk], cur[start:start + chunk], segments)
+        counts[:, 0] += crossed_in.sum(axis=0)
+        counts[:, 1] += crossed_out.sum(axis=0)
+    return counts
+
+def sweep(detections, segments, names, iou_thresholds=(0.3,), min_hits_values=(3,), forget_after=30):
+    """One row per tracker setting and candidate line, with its in/out counts."""
+    rows = []
+    for iou_threshold in iou_thresholds:
+        for min_hits in min_hits_values:
+            tracker = ObjectTracker(min_hits=min_hits, iou_threshold=iou_threshold)
+            prev, cur = track_steps(detections, tracker, forget_after)
+            counts = count_crossings(prev, cur, segments)
+            for name, (count_in, count_out) in zip(names, counts):
+                rows.append({'iou_threshold': iou_threshold, 'min_hits': min_hits, 'line': name,
+                             'in': int(count_in), 'out': int(count_out)})
+    return rows
+
+def load_detections(args):
+    """Every frame's detections, from the cache or from one detector pass (which fills the cache)."""
+    resize = (640, 480) if args.resize else None
+    cache, key = None, None
+    if args.cache:
+        cache = DetectionCache(args.cache, max_bytes=args.cache_size * 1024 * 1024)
+        key = video_key(args.input, args.model, args.conf, resize)
+        cached = cache.get(key)
+        if cached is not None:
+            print(f"Using {len(cached)} cached frames of detections")
+            return cached
+
+    cap = cv2.VideoCapture(args.input)
+    if not cap.isOpened():
+        raise SystemExit(f"Error: Couldn't open video source {args.input}")
+    detector = PersonDetector(model_path=args.model, conf_threshold=args.conf)
+    pipeline = Pipeline(read_frames(cap, resize), [detect_stage(detector)])
+    writer = cache.writer(key) if cache is not None else None
+    detections = []
+    for packet in pipeline:
+        detections.append(packet.detections)
+        if writer is not None:
+            writer.append(packet.detections)
+    cap.release()
+    if writer is not None:
+        writer.commit()
+    print(f"Detected on {len(detections)} frames ({pipeline.stats()['fps']} fps)")
+    return detections
+
+def main(args):
+    candidates, names = [], []
+    if args.lines:
+        start, stop, step = args.lines
+        ys = np.arange(start, stop + 1, step)
+        candidates.append(horizontal_lines(ys))
+        names.extend(f"y={y}" for y in ys)
+    for x1, y1, x2, y2 in args.segment or []:
+        candidates.append(np.array([[[x1, y1], [x2, y2]]], dtype=float))
+        names.append(f"{x1},{y1}->{x2},{y2}")
+    if not candidates:
+        raise SystemExit("Error: give candidate lines with --lines and/or --segment")
+
+    detections = load_detections(args)
+    rows = sweep(detections, np.concatenate(candidates), names, args.iou_thresholds, args.min_hits)
+
+    if args.expected:
+        expected_in, expected_out = args.expected
+        for row in rows:
+            row['error'] = abs(row['in'] - expected_in) + abs(row['out'] - expected_out)
+        rows.sort(key=lambda row: row['error'])
+
+    output_dir = os.path.dirname(args.output)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(args.output, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print(f"{len(rows)} candidates written to {args.output}")
+    print(f"{'iou':>5} {'hits':>5} {'line':>22} {'in':>5} {'out':>5}")
+    for row in rows[:args.top]:
+        print(f"{row['iou_threshold']:>5} {row['min_hits']:>5} {row['line']:>22} {row['in']:>5} {row['out']:>5}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Counting line and tracker parameter sweep')
+    parser.add_argument('--input', type=str, required=True,
+                      help='Path to video file')
+    parser.add_argument('--model', type=str, default='yolov8n.pt',
+                      help='Path to YOLOv8 model file (default: yolov8n.pt)')
+    parser.add_argument('--conf', type=float, default=0.4,
+                      help='Detection confidence threshold (default: 0.4)')
+    parser.add_argument('--resize', action='store_true',
+                      help='Resize frames to 640x480')
+    parser.add_argument('--lines', type=int, nargs=3, metavar=('START', 'STOP', 'STEP'),
+                      help='Horizontal candidate lines at y = START, START + STEP, ... STOP')
+    parser.add_argument('--segment', type=int, nargs=4, action='append', metavar=('X1', 'Y1', 'X2', 'Y2'),
+                      help='Candidate segment, as in main.py. Repeat for several')
+    parser.add_argument('--iou-thresholds', type=float, nargs='+', default=[0.3],
+                      help='Tracker IoU thresholds to try (default: 0.3)')
+    parser.add_argument('--min-hits', type=int, nargs='+', default=[3],
+                      help='Tracker min_hits values to try (default: 3)')
+    parser.add_argument('--expected', type=int, nargs=2, metavar=('IN', 'OUT'),
+                      help='Hand-counted entries and exits; candidates are ranked by their error')
+    parser.add_argument('--cache', type=str, metavar='DIR',
+                      help='Read detections from (or write them to) the detection cache in DIR')
+    parser.add_argument('--cache-size', type=int, default=1024,
+                      help='Cache size limit in MB (default: 1024)')
+    parser.add_argument('--output', type=str, default='output/sweep.csv',
+                      help='CSV table of counts per candidate (default: output/sweep.csv)')
+    parser.add_argument('--top', type=int, default=10,
+                      help='Rows of the table to print (default: 10)')
+
+    args = parser.parse_args()
+    main(args)
@@ -1,7 +1,9 @@
 # src/tracker.py
 import numpy as np
-from filterpy.kalman import KalmanFilter
-from scipy.optimize import linear_sum_assignment
+
+# scipy takes longer to import than the rest of the tracker's dependencies
+# together, so it is imported on the first association rather than with
+# this module (see jobs.warm_up, which does it before the first job).
 
 def convert_bbox_to_z(bbox):
     """Convert bounding box to KF state [x,y,s,r]."""
@@ -22,138 +24,326 @@ def convert_x_to_bbox(x, score=None):
     else:
         return np.array([x[0]-w/2., x[1]-h/2., x[0]+w/2., x[1]+h/2., score]).reshape((1,5))
 
+def convert_bboxes_to_z(bboxes):
+    """Convert (N, 4+) bounding boxes to (N, 4) KF measurements [x,y,s,r]."""
+    bboxes = np.asarray(bboxes, dtype=float)
+    w = bboxes[:, 2] - bboxes[:, 0]
+    h = bboxes[:, 3] - bboxes[:, 1]
+    return np.stack([bboxes[:, 0] + w/2., bboxes[:, 1] + h/2., w * h, w / h], axis=1)
+
+def convert_x_to_bboxes(x):
+    """Convert (N, 7) KF states to (N, 4) bounding boxes [x1,y1,x2,y2]."""
+    with np.errstate(invalid='ignore'):
+        w = np.sqrt(x[:, 2] * x[:, 3])
+        h = x[:, 2] / w
+    return np.stack([x[:, 0]-w/2., x[:, 1]-h/2., x[:, 0]+w/2., x[:, 1]+h/2.], axis=1)
+
 class KalmanBoxTracker(object):
-    count = 0
-    def __init__(self, bbox):
-        self.kf = KalmanFilter(dim_x=7, dim_z=4)
-        self.kf.F = np.array([[1,0,0,0,1,0,0], [0,1,0,0,0,1,0], [0,0,1,0,0,0,1], 
-                             [0,0,0,1,0,0,0], [0,0,0,0,1,0,0], [0,0,0,0,0,1,0],
-                             [0,0,0,0,0,0,1]])
-        self.kf.H = np.array([[1,0,0,0,0,0,0], [0,1,0,0,0,0,0], [0,0,1,0,0,0,0],
-                             [0,0,0,1,0,0,0]])
-
-        self.kf.R[2:,2:] *= 10.
-        self.kf.P[4:,4:] *= 1000.
-        self.kf.P *= 10.
-        self.kf.Q[-1,-1] *= 0.01
-        self.kf.Q[4:,4:] *= 0.01
-
-        self.kf.x[:4] = convert_bbox_to_z(bbox)
-        self.time_since_update = 0
-        self.id = KalmanBoxTracker.count
-        KalmanBoxTracker.count += 1
-        self.history = []
-        self.hits = 0
-        self.hit_streak = 0
-        self.age = 0
-
-    def update(self, bbox):
-        self.time_since_update = 0
-        self.history = []
-        self.hits += 1
-        self.hit_streak += 1
-        self.kf.update(convert_bbox_to_z(bbox))
-
-    def predict(self):
-        if((self.kf.x[6]+self.kf.x[2])<=0):
-            self.kf.x[6] *= 0.0
-        self.kf.predict()
+    """
+    Constant-velocity Kalman filters for a set of boxes, stored struct-of-arrays.
+
+    Every track's state, covariance and bookkeeping counters live in contiguous
+    arrays indexed by track slot, so predict and update run as one batched
+    operation over all live tracks instead of one small filter per person.
+    Track order is insertion order, matching the list of per-track filters
+    this replaces. IDs are numbered per instance, so separate trackers (one per
+    camera, or one per job in a long-lived worker) never share an ID sequence.
+    """
+
+    F = np.array([[1,0,0,0,1,0,0], [0,1,0,0,0,1,0], [0,0,1,0,0,0,1],
+                  [0,0,0,1,0,0,0], [0,0,0,0,1,0,0], [0,0,0,0,0,1,0],
+                  [0,0,0,0,0,0,1]], dtype=float)
+    H = np.array([[1,0,0,0,0,0,0], [0,1,0,0,0,0,0], [0,0,1,0,0,0,0],
+                  [0,0,0,1,0,0,0]], dtype=float)
+    R = np.diag([1., 1., 10., 10.])
+    Q = np.diag([1., 1., 1., 1., 0.01, 0.01, 0.0001])
+    P0 = np.diag([10., 10., 10., 10., 10000., 10000., 10000.])
+    _ARRAYS = ('x', 'P', 'time_since_update', 'id', 'hits', 'hit_streak', 'age')
+
+    def __init__(self):
+        self.count = 0
+        self.x = np.zeros((0, 7))
+        self.P = np.zeros((0, 7, 7))
+        self.time_since_update = np.zeros(0, dtype=int)
+        self.id = np.zeros(0, dtype=int)
+        self.hits = np.zeros(0, dtype=int)
+        self.hit_streak = np.zeros(0, dtype=int)
+        self.age = np.zeros(0, dtype=int)
+
+    def __len__(self):
+        return len(self.x)
+
+    def add(self, bboxes):
+        """Start a new track for each row of bboxes, assigning sequential IDs."""
+        n = len(bboxes)
+        if n == 0:
+            return
+        x = np.zeros((n, 7))
+        x[:, :4] = convert_bboxes_to_z(bboxes)
+        ids = np.arange(self.count, self.count + n)
+        self.count += n
+
+        self.x = np.concatenate([self.x, x])
+        self.P = np.concatenate([self.P, np.broadcast_to(self.P0, (n, 7, 7))])
+        self.time_since_update = np.concatenate([self.time_since_update, np.zeros(n, dtype=int)])
+        self.id = np.concatenate([self.id, ids])
+        self.hits = np.concatenate([self.hits, np.zeros(n, dtype=int)])
+        self.hit_streak = np.concatenate([self.hit_streak, np.zeros(n, dtype=int)])
+        self.age = np.concatenate([self.age, np.zeros(n, dtype=int)])
+
+    def keep(self, mask):
+        """Drop every track whose entry in the boolean mask is False."""
+        self.x = self.x[mask]
+        self.P = self.P[mask]
+        self.time_since_update = self.time_since_update[mask]
+        self.id = self.id[mask]
+        self.hits = self.hits[mask]
+        self.hit_streak = self.hit_streak[mask]
+        self.age = self.age[mask]
+
+    def predict(self, coast=False):
+        """
+        Advance all tracks one step and return their (N, 4) predicted boxes.
+
+        With coast=True the step is for a frame the detector did not look at, so
+        it does not count as a missed detection.
+        """
+        self.x[(self.x[:, 6] + self.x[:, 2]) <= 0, 6] = 0.
+        self.x = self.x @ self.F.T
+        self.P = self.F @ self.P @ self.F.T + self.Q
         self.age += 1
-        if(self.time_since_update>0):
-            self.hit_streak = 0
-        self.time_since_update += 1
-        self.history.append(convert_x_to_bbox(self.kf.x))
-        return self.history[-1]
+        if not coast:
+            self.hit_streak[self.time_since_update > 0] = 0
+            self.time_since_update += 1
+        return self.get_state()
+
+    def update(self, idx, bboxes):
+        """Correct the tracks at slots idx with their matched bboxes."""
+        if len(idx) == 0:
+            return
+        self.time_since_update[idx] = 0
+        self.hits[idx] += 1
+        self.hit_streak[idx] += 1
+
+        x = self.x[idx]
+        P = self.P[idx]
+        y = convert_bboxes_to_z(bboxes) - x[:, :4]
+        PHT = P @ self.H.T
+        S = self.H @ PHT + self.R
+        K = PHT @ np.linalg.inv(S)
+        x = x + (K @ y[:, :, None])[:, :, 0]
+        I_KH = np.eye(7) - K @ self.H
+        # Joseph form, as filterpy's KalmanFilter.update
+        self.P[idx] = I_KH @ P @ I_KH.transpose(0, 2, 1) + K @ self.R @ K.transpose(0, 2, 1)
+        self.x[idx] = x
 
     def get_state(self):
-        return convert_x_to_bbox(self.kf.x)
+        return convert_x_to_bboxes(self.x)
+
+    def snapshot(self):
+        """Copies of every track's arrays and the next ID to assign, for a checkpoint."""
+        state = {name: getattr(self, name).copy() for name in self._ARRAYS}
+        state['count'] = self.count
+        return state
+
+    def restore(self, state):
+        """Replace all tracks with those of a snapshot()."""
+        for name in self._ARRAYS:
+            setattr(self, name, np.array(state[name], dtype=getattr(self, name).dtype))
+        self.count = int(state['count'])
+
+def _iou(a, b):
+    """Elementwise IoU of boxes a and b; broadcasts over leading dimensions."""
+    xA = np.maximum(a[..., 0], b[..., 0])
+    yA = np.maximum(a[..., 1], b[..., 1])
+    xB = np.minimum(a[..., 2], b[..., 2])
+    yB = np.minimum(a[..., 3], b[..., 3])
+
+    interArea = np.maximum(0., xB - xA) * np.maximum(0., yB - yA)
+    boxAArea = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    boxBArea = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    union = boxAArea + boxBArea - interArea
+
+    return np.divide(interArea, union, out=np.zeros_like(interArea), where=union > 0)
+
+def iou_batch(dets, trks):
+    """(N, M) IoU matrix between (N, 4+) detections and (M, 4+) tracks."""
+    dets = np.asarray(dets, dtype=float)
+    trks = np.asarray(trks, dtype=float)
+    return _iou(dets[:, None, :4], trks[None, :, :4])
+
+def _overlapping_pairs(dets, trks):
+    """
+    Candidate (det, trk) index pairs whose boxes overlap, via sorted-interval pruning.
+
+    Tracks are sorted by x1; a detection can only overlap tracks whose x1 lies in
+    (det.x1 - widest track, det.x2), which is a contiguous run of the sorted order.
+    """
+    order = np.argsort(trks[:, 0], kind='stable')
+    xs = trks[order, 0]
+    max_w = np.max(trks[:, 2] - trks[:, 0])
+    lo = np.searchsorted(xs, dets[:, 0] - max_w, side='right')
+    hi = np.searchsorted(xs, dets[:, 2], side='left')
+    counts = np.maximum(hi - lo, 0)
+
+    d_idx = np.repeat(np.arange(len(dets)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    t_idx = order[np.repeat(lo, counts) + offsets]
+
+    iou = _iou(dets[d_idx, :4], trks[t_idx, :4])
+    overlap = iou > 0
+    return d_idx[overlap], t_idx[overlap], iou[overlap]
+
+def _gated_assignment(dets, trks, iou_threshold):
+    """
+    Solve the assignment separately for each connected component of the overlap graph.
+
+    Detections and tracks with no overlapping partner cannot be matched, and pairs
+    in different components have zero IoU, so the maximum-IoU assignment of the
+    whole frame is the union of the per-component optima.
+    """
+    from scipy.optimize import linear_sum_assignment
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    n = len(dets)
+    d_idx, t_idx, iou = _overlapping_pairs(dets, trks)
+    if len(d_idx) == 0:
+        return np.empty((0, 2), dtype=int)
+
+    graph = coo_matrix((np.ones(len(d_idx)), (d_idx, n + t_idx)), shape=(n + len(trks),) * 2)
+    n_comp, labels = connected_components(graph, directed=False)
+    comp = labels[d_idx]
+    comp_dets = np.bincount(labels[:n], minlength=n_comp)
+    comp_trks = np.bincount(labels[n:], minlength=n_comp)
+
+    # One detection overlapping one track: nothing to solve
+    single = (comp_dets[comp] == 1) & (comp_trks[comp] == 1)
+    matched = [np.stack([d_idx[single], t_idx[single]], axis=1)[iou[single] >= iou_threshold]]
+
+    # Position of every box within its component, so each component's matrix
+    # can be filled without searching for its members
+    d_order = np.argsort(labels[:n], kind='stable')
+    t_order = np.argsort(labels[n:], kind='stable')
+    d_start = np.cumsum(comp_dets) - comp_dets
+    t_start = np.cumsum(comp_trks) - comp_trks
+    d_local = np.empty(n, dtype=int)
+    d_local[d_order] = np.arange(n) - d_start[labels[:n][d_order]]
+    t_local = np.empty(len(trks), dtype=int)
+    t_local[t_order] = np.arange(len(trks)) - t_start[labels[n:][t_order]]
+
+    multi = np.flatnonzero(~single)
+    multi = multi[np.argsort(comp[multi], kind='stable')]
+    bounds = np.flatnonzero(np.diff(comp[multi])) + 1
+    for edges in np.split(multi, bounds):
+        if len(edges) == 0:
+            continue
+        c = comp[edges[0]]
+        iou_matrix = np.zeros((comp_dets[c], comp_trks[c]))
+        iou_matrix[d_local[d_idx[edges]], t_local[t_idx[edges]]] = iou[edges]
+        mr, mc = linear_sum_assignment(-iou_matrix)
+        ok = iou_matrix[mr, mc] >= iou_threshold
+        rows = d_order[d_start[c] + mr[ok]]
+        cols = t_order[t_start[c] + mc[ok]]
+        matched.append(np.stack([rows, cols], axis=1))
+
+    return np.concatenate(matched, axis=0)
+
+def associate_detections_to_trackers(dets, trks, iou_threshold=0.3, gate_min_size=200):
+    """
+    Assign detections to tracked boxes by maximum total IoU.
+
+    Once either side has at least gate_min_size boxes, the problem is split into
+    independent spatial components that are solved separately instead of running
+    one dense solve over the whole frame.
+
+    Returns:
+        (matched, unmatched_dets, unmatched_trks) where matched is a (K, 2)
+        array of [det_index, trk_index] pairs
+    """
+    # Use length check to support numpy arrays and lists
+    if len(dets) == 0 or len(trks) == 0:
+        return np.empty((0, 2), dtype=int), range(len(dets)), range(len(trks))
+
+    dets = np.asarray(dets, dtype=float)
+    trks = np.asarray(trks, dtype=float)
+    if max(len(dets), len(trks)) >= gate_min_size:
+        matched = _gated_assignment(dets, trks, iou_threshold)
+    else:
+        from scipy.optimize import linear_sum_assignment
+        iou_matrix = iou_batch(dets, trks)
+        rows, cols = linear_sum_assignment(-iou_matrix)
+        ok = iou_matrix[rows, cols] >= iou_threshold
+        matched = np.stack([rows[ok], cols[ok]], axis=1)
+
+    unmatched_dets = list(set(range(len(dets))) - set(matched[:, 0]))
+    unmatched_trks = list(set(range(len(trks))) - set(matched[:, 1]))
+    return matched, unmatched_dets, unmatched_trks
 
 class ObjectTracker:
-    def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3):
+    def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3, gate_min_size=200):
         self.max_age = max_age
         self.min_hits = min_hits
         self.iou_threshold = iou_threshold
-        self.trackers = []
+        self.gate_min_size = gate_min_size
+        self.trackers = KalmanBoxTracker()
         self.frame_count = 0
 
-    def _compute_iou(self, boxA, boxB):
-        xA = max(boxA[0], boxB[0])
-        yA = max(boxA[1], boxB[1])
-        xB = min(boxA[2], boxB[2])
-        yB = min(boxA[3], boxB[3])
-        
-        interArea = max(0, xB - xA) * max(0, yB - yA)
-        boxAArea = (boxA[2] - boxA[0]) * (boxA[3] - boxA[1])
-        boxBArea = (boxB[2] - boxB[0]) * (boxB[3] - boxB[1])
-        
-        return interArea / float(boxAArea + boxBArea - interArea)
-
     def update(self, dets):
         self.frame_count += 1
-        
+
         # Get predicted locations from existing trackers
-        trks = np.zeros((len(self.trackers), 5))
-        to_del = []
-        ret = []
-        for t, trk in enumerate(trks):
-            pos = self.trackers[t].predict()[0]
-            trk[:] = [pos[0], pos[1], pos[2], pos[3], 0]
-            if np.any(np.isnan(pos)):
-                to_del.append(t)
-        trks = np.ma.compress_rows(np.ma.masked_invalid(trks))
-        for t in reversed(to_del):
-            self.trackers.pop(t)
-            
-        # Calculate IoU between predictions and detections
-        matched, unmatched_dets, unmatched_trks = [], [], []
-        # Use length check to support numpy arrays and lists
-        if len(dets) > 0 and len(self.trackers) > 0:
-            iou_matrix = np.zeros((len(dets), len(trks)))
-            for d, det in enumerate(dets):
-                for t, trk in enumerate(trks):
-                    iou_matrix[d, t] = self._compute_iou(det, trk)
-
-            matched_indices = linear_sum_assignment(-iou_matrix)
-            matched_indices = np.asarray(matched_indices)
-            matched_indices = np.transpose(matched_indices)
-
-            for m in matched_indices:
-                if iou_matrix[m[0], m[1]] < self.iou_threshold:
-                    unmatched_dets.append(m[0])
-                    unmatched_trks.append(m[1])
-                else:
-                    matched.append(m.reshape(1, 2))
-
-            if len(matched) == 0:
-                matched = np.empty((0, 2), dtype=int)
-            else:
-                matched = np.concatenate(matched, axis=0)
-
-            unmatched_dets = list(set(range(len(dets))) - set(matched[:, 0]))
-            unmatched_trks = list(set(range(len(trks))) - set(matched[:, 1]))
-        else:
-            matched = np.empty((0, 2), dtype=int)
-            unmatched_dets = range(len(dets))
-            unmatched_trks = range(len(trks))
-            
+        trks = self.trackers.predict()
+        valid = ~np.any(np.isnan(trks), axis=1)
+        if not valid.all():
+            self.trackers.keep(valid)
+            trks = trks[valid]
+
+        # Associate detections to predicted boxes by IoU
+        matched, unmatched_dets, unmatched_trks = associate_detections_to_trackers(
+            dets, trks, self.iou_threshold, self.gate_min_size)
+
         # Update matched trackers with assigned detections
-        for m in matched:
-            self.trackers[m[1]].update(dets[m[0]])
-            
+        dets = np.asarray(dets)
+        self.trackers.update(matched[:, 1], dets[matched[:, 0]])
+
         # Create and initialize new trackers for unmatched detections
-        for i in unmatched_dets:
-            trk = KalmanBoxTracker(dets[i])
-            self.trackers.append(trk)
-            
-        i = len(self.trackers)
-        for trk in reversed(self.trackers):
-            d = trk.get_state()[0]
-            if (trk.time_since_update < self.max_age) and (trk.hit_streak >= self.min_hits or self.frame_count <= self.min_hits):
-                ret.append(np.concatenate((d, [trk.id+1])).reshape(1,-1))
-            i -= 1
-            if trk.time_since_update > self.max_age:
-                self.trackers.pop(i)
-                
+        self.trackers.add(dets[list(unmatched_dets)])
+
+        # Report confirmed tracks newest-first, then age out stale ones
+        ret = self._confirmed_tracks()
+        self.trackers.keep(self.trackers.time_since_update <= self.max_age)
+        return ret
+
+    def snapshot(self):
+        """Kalman state of every track plus the frame count, as NumPy arrays and ints."""
+        return {'frame_count': self.frame_count, 'trackers': self.trackers.snapshot()}
+
+    def restore(self, state):
+        """Continue from a snapshot(), as if every frame since it had never happened."""
+        self.frame_count = int(state['frame_count'])
+        self.trackers.restore(state['trackers'])
+
+    def coast(self):
+        """
+        Advance tracks by prediction alone, for a frame the detector skipped.
+
+        Skipped frames are not misses, so tracks are neither aged out nor lose
+        their hit streak; the returned boxes are the Kalman predictions.
+        """
+        trks = self.trackers.predict(coast=True)
+        valid = ~np.any(np.isnan(trks), axis=1)
+        if not valid.all():
+            self.trackers.keep(valid)
+        return self._confirmed_tracks()
+
+    def _confirmed_tracks(self):
+        """(N, 5) [x1, y1, x2, y2, id] rows for tracks to report, newest first."""
+        trk = self.trackers
+        show = (trk.time_since_update < self.max_age) & \
+               ((trk.hit_streak >= self.min_hits) | (self.frame_count <= self.min_hits))
+        ret = np.concatenate((trk.get_state(), (trk.id + 1)[:, None]), axis=1)[show][::-1]
+
         if len(ret) > 0:
-            return np.concatenate(ret)
+            return ret
         return np.empty((0, 5))
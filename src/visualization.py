@@ -3,13 +3,35 @@ import cv2
 import numpy as np
 
 class Visualizer:
-    def __init__(self, frame_shape, max_trajectory_len=30):
+    """
+    Draws tracks, trajectories, counts and an occupancy heatmap onto frames.
+
+    The heatmap lives on a grid heatmap_scale times smaller than the frame.
+    Its per-frame fade is applied lazily through a single scale factor rather
+    than to every cell, and the blurred, colorized, full-size layer is rebuilt
+    only every heatmap_refresh frames and reused in between.
+    """
+
+    HEAT_VALUE = 0.05
+    HEAT_DECAY = 0.99
+
+    def __init__(self, frame_shape, max_trajectory_len=30, heatmap_scale=4, heatmap_refresh=5):
         self.frame_shape = frame_shape
         self.max_trajectory_len = max_trajectory_len
         self.trajectories = {}  # {track_id: [(x, y), ...]}
-        self.heatmap = np.zeros((frame_shape[0], frame_shape[1]), dtype=np.float32)
         self.color_map = {}  # {track_id: color}
 
+        self.heatmap_scale = heatmap_scale
+        self.heatmap_refresh = heatmap_refresh
+        grid = (-(-frame_shape[0] // heatmap_scale), -(-frame_shape[1] // heatmap_scale))
+        self.heatmap = np.zeros(grid, dtype=np.float32)  # heat divided by _heat_gain
+        self._heat_gain = 1.0
+        self._heat_radius = max(1, round(20 / heatmap_scale))
+        blur = max(3, round(15 / heatmap_scale)) | 1
+        self._heat_blur = (blur, blur)
+        self._heatmap_layer = None
+        self._frames_since_refresh = 0
+
     def update_trajectories(self, tracks):
         # Update trajectories
         current_tracks = set()
@@ -34,7 +56,8 @@ class Visualizer:
                 self.trajectories[track_id] = self.trajectories[track_id][-self.max_trajectory_len:]
             
             # Update heatmap
-            cv2.circle(self.heatmap, (cx, cy), 20, 0.05, -1)
+            cv2.circle(self.heatmap, (cx // self.heatmap_scale, cy // self.heatmap_scale),
+                       self._heat_radius, self.HEAT_VALUE / self._heat_gain, -1)
 
         # Remove old trajectories
         current_tracks = set(current_tracks)
@@ -43,12 +66,21 @@ class Visualizer:
             del self.trajectories[track_id]
             del self.color_map[track_id]
 
-    def draw_overlays(self, frame, tracks, line_y, count_in, count_out):
-        # Create copy of frame for drawing
-        output = frame.copy()
+    def draw_overlays(self, frame, tracks, line_y, count_in, count_out, lines=(), zones=(), out=None):
+        # Draw on a copy of frame: into out (a preallocated frame of the same shape) if given
+        if out is None:
+            output = frame.copy()
+        else:
+            output = out
+            np.copyto(output, frame)
 
-        # Draw counting line
-        cv2.line(output, (0, line_y), (frame.shape[1], line_y), (0, 0, 255), 2)
+        # Draw counting lines and zones
+        if line_y is not None:
+            cv2.line(output, (0, line_y), (frame.shape[1], line_y), (0, 0, 255), 2)
+        for (x1, y1), (x2, y2) in lines:
+            cv2.line(output, (int(x1), int(y1)), (int(x2), int(y2)), (0, 0, 255), 2)
+        for zone in zones:
+            cv2.polylines(output, [np.asarray(zone, dtype=np.int32)], True, (0, 0, 255), 2)
 
         # Update and draw trajectories
         self.update_trajectories(tracks)
@@ -74,22 +106,43 @@ class Visualizer:
                     (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
 
         # Apply heatmap
-        heatmap_color = cv2.applyColorMap(
-            np.uint8(255 * cv2.GaussianBlur(self.heatmap, (15, 15), 0)), 
-            cv2.COLORMAP_JET
-        )
-        
+        heatmap_color = self._heatmap_color()
+
         # Fade heatmap gradually
-        self.heatmap *= 0.99
-        
+        self._fade_heatmap()
+
         # Blend heatmap with output
         alpha = 0.3
-        output = cv2.addWeighted(output, 1.0, heatmap_color, alpha, 0)
+        cv2.addWeighted(output, 1.0, heatmap_color, alpha, 0, dst=output)
 
         return output
 
+    def skip(self, tracks):
+        """Advance trajectories and heatmap by one frame without drawing it."""
+        self.update_trajectories(tracks)
+        self._frames_since_refresh += 1
+        self._fade_heatmap()
+
+    def _heatmap_color(self):
+        """Full-size colorized heatmap, rebuilt every heatmap_refresh frames."""
+        if self._heatmap_layer is None or self._frames_since_refresh >= self.heatmap_refresh:
+            heat = cv2.GaussianBlur(self.heatmap * self._heat_gain, self._heat_blur, 0)
+            small = cv2.applyColorMap(np.uint8(255 * heat), cv2.COLORMAP_JET)
+            self._heatmap_layer = cv2.resize(small, (self.frame_shape[1], self.frame_shape[0]),
+                                             interpolation=cv2.INTER_LINEAR)
+            self._frames_since_refresh = 0
+        self._frames_since_refresh += 1
+        return self._heatmap_layer
+
+    def _fade_heatmap(self):
+        """Decay all heat by lowering the shared gain; fold it into the grid when tiny."""
+        self._heat_gain *= self.HEAT_DECAY
+        if self._heat_gain < 1e-6:
+            self.heatmap *= self._heat_gain
+            self._heat_gain = 1.0
+
 def draw_overlays(frame, tracks, line_y, count_in, count_out):
-    """Legacy function for compatibility"""
+    """Legacy function for compatibility; shares one Visualizer per process, so use a Visualizer per stream"""
     if not hasattr(draw_overlays, 'visualizer'):
         draw_overlays.visualizer = Visualizer(frame.shape)
     return draw_overlays.visualizer.draw_overlays(frame, tracks, line_y, count_in, count_out)
@@ -0,0 +1,57 @@
+# test_events.py
+"""
+EventLog shared by several writing processes: every row must keep its
+camera, line and track together, and the rollups must add up.
+"""
+import multiprocessing
+
+import numpy as np
+
+from src.events import EventLog
+
+WRITERS = 4
+APPENDS = 200
+
+def write_events(directory, writer):
+    log = EventLog(directory)
+    for i in range(APPENDS):
+        log.append(f"cam{writer}", [{'time': 1000.0 + i, 'track_id': writer * 100000 + i,
+                                     'direction': 'in' if j % 2 else 'out', 'line': f"line{writer}_{i % 7}"}
+                                    for j in range(1 + i % 3)])
+
+def test_concurrent_writers(tmp_path):
+    directory = str(tmp_path)
+    ctx = multiprocessing.get_context('spawn')
+    processes = [ctx.Process(target=write_events, args=(directory, writer)) for writer in range(WRITERS)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    log = EventLog(directory)
+    per_writer = sum(1 + i % 3 for i in range(APPENDS))
+    assert log.events == WRITERS * per_writer
+
+    tracks = np.fromfile(tmp_path / 'track.bin', dtype=np.int64)
+    cameras = np.fromfile(tmp_path / 'camera.bin', dtype=np.int32)
+    places = np.fromfile(tmp_path / 'place.bin', dtype=np.int32)
+    for track, camera, place in zip(tracks.tolist(), cameras.tolist(), places.tolist()):
+        writer, i = divmod(track, 100000)
+        assert log.names['cameras'][camera] == f"cam{writer}"
+        assert log.names['places'][place] == f"line{writer}_{i % 7}"
+
+    for writer in range(WRITERS):
+        rows = log.counts(0, 2000, 'day', camera=f"cam{writer}")
+        assert sum(n_in + n_out for _, n_in, n_out in rows) == per_writer
+    rows = log.counts(0, 2000, 'day', camera='cam0', place='line0_3')
+    assert sum(n_in + n_out for _, n_in, n_out in rows) == sum(1 + i % 3 for i in range(3, APPENDS, 7))
+
+def test_refresh_follows_another_writer(tmp_path):
+    reader, writer = EventLog(str(tmp_path)), EventLog(str(tmp_path))
+    writer.append('door', [{'time': 30.0, 'track_id': 1, 'direction': 'in', 'line': 'line'}])
+    assert reader.counts(0, 60, 'minute') == [(0, 0, 0)]
+    reader.refresh()
+    assert reader.counts(0, 60, 'minute') == [(0, 1, 0)]
+    assert reader.counts(0, 60, 'minute', camera='door', place='line') == [(0, 1, 0)]
+    assert reader.counts(0, 60, 'minute', camera='elsewhere') == [(0, 0, 0)]
@@ -0,0 +1,66 @@
+# test_jobs.py
+"""
+A job that fails partway through must leave nothing behind in the worker
+that ran it: no pipeline, encoder or checkpoint threads, and no checkpoint.
+"""
+import os
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from src.jobs import process_video
+
+FRAMES = 60
+
+class FailingDetector:
+    """Finds nobody, and raises on its fail_at-th call."""
+
+    batch_size = 1
+
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+        self.calls = 0
+
+    def detect_batch(self, frames, batch_size=None):
+        self.calls += 1
+        if self.calls == self.fail_at:
+            raise RuntimeError("detector failed")
+        return [np.zeros((0, 5)) for _ in frames]
+
+@pytest.fixture
+def video(tmp_path):
+    path = str(tmp_path / 'clip.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, (160, 120))
+    for i in range(FRAMES):
+        writer.write(np.full((120, 160, 3), i * 4, dtype=np.uint8))
+    writer.release()
+    return path
+
+def fail_progress(frames, total):
+    raise RuntimeError("progress failed")
+
+@pytest.mark.parametrize('counts_only', [False, True])
+@pytest.mark.parametrize('fail_at, progress, error', [
+    (10, None, "detector failed"),  # in a pipeline stage
+    (None, fail_progress, "progress failed"),  # in the job's own loop over the packets
+])
+def test_failed_job_releases_everything(tmp_path, video, counts_only, fail_at, progress, error):
+    threads = set(threading.enumerate())
+    checkpoint = str(tmp_path / 'job.npz')
+    result = process_video(video, 'job', FailingDetector(fail_at), output_folder=str(tmp_path),
+                           counts_only=counts_only, progress=progress, checkpoint=checkpoint,
+                           checkpoint_every=0.0)
+
+    assert result['status'] == 'failed'
+    assert result['error'] == error
+    assert set(threading.enumerate()) <= threads
+    assert not [name for name in os.listdir(tmp_path) if name.startswith('job.npz')]
+
+def test_job_completes(tmp_path, video):
+    result = process_video(video, 'job', FailingDetector(), output_folder=str(tmp_path),
+                           checkpoint=str(tmp_path / 'job.npz'))
+    assert result['status'] == 'completed'
+    assert result['processed_frames'] == FRAMES
+    assert result['encoder']['frames_written'] == FRAMES
@@ -0,0 +1,36 @@
+# test_tracker.py
+"""
+Regression test of ObjectTracker against a recorded trajectory.
+
+test_tracker_baseline.json holds 90 frames of detections of eight walkers
+crossing the frame, with noise, missed detections and overlapping paths,
+and the tracks the original filterpy-based SORT tracker returned for them.
+The batched tracker must return the same IDs and boxes on every frame, with
+both the dense and the gated association.
+"""
+import json
+import os
+
+import numpy as np
+import pytest
+
+from src.tracker import ObjectTracker
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_tracker_baseline.json')
+
+with open(BASELINE) as f:
+    baseline = json.load(f)
+
+@pytest.mark.parametrize('settings, options', [
+    ('default', {}),
+    ('max_age=3,min_hits=1', {'max_age': 3, 'min_hits': 1}),
+])
+@pytest.mark.parametrize('gate_min_size', [200, 0])  # dense association, gated association
+def test_tracker_matches_baseline(settings, options, gate_min_size):
+    tracker = ObjectTracker(gate_min_size=gate_min_size, **options)
+    for frame, (detections, expected) in enumerate(zip(baseline['detections'], baseline[settings])):
+        tracks = tracker.update(np.array(detections, dtype=float).reshape(-1, 5))
+        expected = np.array(expected, dtype=float).reshape(-1, 5)
+        assert tracks.shape == expected.shape, f"frame {frame}"
+        np.testing.assert_array_equal(tracks[:, 4], expected[:, 4], err_msg=f"IDs of frame {frame}")
+        np.testing.assert_allclose(tracks[:, :4], expected[:, :4], atol=1e-3, err_msg=f"boxes of frame {frame}")